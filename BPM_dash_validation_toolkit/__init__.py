@@ -1,5 +1,39 @@
 # This is so that you can import ppack or import average from ppack
 # in stead of from ppack.functions import average
 
-from .functions import check_1_1, check_1_2, check_2_1, check_2_2, check_2_3, check_2_4, check_3_1, check_3_2, check_3_3, check_3_4, check_3_5, check_3_6, stage_1_driver, stage_2_driver, stage_3_driver
-from .utility import set_up_client, output_client_validation_results
+# the functions are loaded lazily (PEP 562) - importing the package is cheap, and each module (with pandas, pyathena, requests etc.) is only
+# imported when one of its functions is first used, e.g. from BPM_dash_validation_toolkit import stage_1_driver only loads what stage 1 needs
+import importlib
+# query_cache is imported up front (it is light) - the class has the same name as its module, which would otherwise replace it on the package
+from .query_cache import query_cache
+
+exports = {"functions": ["incremental_slice", "union_region_counts", "check_1_1", "check_1_2", "profile_2_table", "fingerprint_2_table", "incremental_2_table", "check_2_1", "check_2_2", "check_2_3", "check_2_4", "pathway_overlap_counts", "dashboard_table_sums", "check_3_1", "check_3_2", "check_3_3", "check_3_4", "check_3_5", "check_3_6", "stage_1_driver", "stage_2_driver", "stage_3_driver"],
+           "utility": ["set_up_client", "output_client_validation_results"],
+           "catalog": ["schema_cache", "shared_schema_cache", "client_databases", "set_shared_schema_ttl"],
+           "execution": ["run_query", "set_query_cache", "run_scalar_queries", "set_fetch_mode", "set_max_in_flight_queries"],
+           "watermarks": ["watermark_store"],
+           "runner": ["run_client", "run_clients"],
+           "scheduler": ["build_check_dag", "run_check_dag"],
+           "instrumentation": ["query_recorder", "set_query_recorder", "check_scope"],
+           "backends": ["athena_backend", "duckdb_backend"],
+           "report": ["report_records", "render_report", "slack_sink"],
+           "history": ["history_store", "record_outcome"],
+           "planner": ["plan_checks", "format_plan", "budget_plan", "run_within_budget"],
+           "table_statistics": ["glue_row_counts"]}
+
+export_modules = {name: module for module, names in exports.items() for name in names}
+
+__all__ = list(export_modules) + ["query_cache"]
+
+
+def __getattr__(name):
+    if name not in export_modules:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + export_modules[name], __name__), name)
+    # kept on the package, so later lookups do not come back here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,209 @@
+# The code base for the execution backends queries are run on - athena (any DB-API connection, pyathena by default) or a local DuckDB database
+# reading parquet exports of the client databases. Every toolkit query is written in athena's (presto) sql, so a backend handles any dialect differences --
+
+# import required packages
+import os
+import re
+import sys
+import threading
+from . import instrumentation
+
+# presto/athena functions used by the toolkit which duckdb does not have, defined as duckdb macros
+duckdb_macros = ["CREATE OR REPLACE MACRO to_utf8(x) AS x",
+                 "CREATE OR REPLACE MACRO xxhash64(x) AS hash(x)",
+                 "CREATE OR REPLACE MACRO from_big_endian_64(x) AS (x::HUGEINT - 9223372036854775808)::BIGINT",
+                 "CREATE OR REPLACE MACRO approx_distinct(x) AS approx_count_distinct(x)",
+                 "CREATE OR REPLACE MACRO bitwise_and(a, b) AS (a & b)"]
+
+
+# Creating sql backend class - a backend running queries on a DB-API connection
+class sql_backend:
+    dialect = "athena"
+
+    def __init__(self, connection):
+        """ Inputs:
+                connection - DB-API connection object the queries are run on
+        """
+        self.connection = connection
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def query_errors(self):
+        """ Gives the exception types raised for a query the engine could not run (e.g. sql it does not support) - the DB-API DatabaseError of the
+            connection (or its driver module, e.g. pyathena.DatabaseError), or none if the driver has no DatabaseError
+        """
+        error = getattr(self.connection, "DatabaseError", None)
+        if error is None:
+            error = getattr(sys.modules.get(type(self.connection).__module__.split(".")[0]), "DatabaseError", None)
+        return (error,) if isinstance(error, type) and issubclass(error, Exception) else ()
+
+    def fetch(self, query, arrow=True, unload=False):
+        """ Runs a query & fetches the whole result - columnar (arrow backed DataFrame) if arrow and the cursor gives arrow tables, otherwise as python rows
+            Output: (DataFrame, cursor statistics - see instrumentation.cursor_statistics)
+        """
+        cursor = self.cursor()
+        cursor.execute(query)
+        if arrow and hasattr(cursor, "to_arrow_table"):
+            arrow_table = cursor.to_arrow_table()
+        elif arrow and hasattr(cursor, "fetch_arrow_table"):
+            arrow_table = cursor.fetch_arrow_table()
+        else:
+            return fetch_rows(cursor)
+        return arrow_frame(arrow_table), instrumentation.cursor_statistics(cursor)
+
+
+def arrow_frame(arrow_table):
+    """ Gives the DataFrame of an arrow table (a fetched or cached query result), with NULLs as pd.read_sql gives them
+        Comments:
+            1. columns without NULLs are arrow backed - the arrow buffers are used as is rather than copied into numpy/python objects
+            2. columns with NULLs are converted as pd.read_sql would - numbers (decimals too, as coerce_float) to float with NaN, other types to
+               None - rather than pd.NA, which the checks cannot compare (e.g. a SUM over no rows in check 3.5/3.6), and a column of only NULLs to None
+    """
+    import pandas as pd
+    import pyarrow as pa
+    frame = arrow_table.to_pandas(types_mapper=pd.ArrowDtype)
+    for index, column in enumerate(arrow_table.columns):
+        if column.null_count == 0:
+            continue
+        if column.null_count == len(column):
+            frame.isetitem(index, pd.Series([None] * len(column), index=frame.index, dtype=object))
+        else:
+            if pa.types.is_decimal(column.type):
+                column = column.cast(pa.float64())
+            frame.isetitem(index, pd.Series(column.to_pandas().values, index=frame.index))
+    return frame
+
+
+def fetch_rows(cursor):
+    """ Fetches the result of an executed cursor as python rows built into a DataFrame (as pd.read_sql), with the cursor statistics """
+    import pandas as pd
+    columns = [column[0] for column in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True), instrumentation.cursor_statistics(cursor)
+
+
+# Creating athena backend class - the default backend, for pyathena (or any other DB-API) connections
+class athena_backend(sql_backend):
+    def fetch(self, query, arrow=True, unload=False):
+        """ As sql_backend.fetch - pyathena connections use pyathena's ArrowCursor for arrow fetches, which reads the athena result files directly
+            (as parquet if unload, for very large results)
+        """
+        if arrow and type(self.connection).__module__.startswith("pyathena"):
+            from pyathena.arrow.cursor import ArrowCursor
+            cursor = self.connection.cursor(ArrowCursor, unload=unload)
+            cursor.execute(query)
+            return arrow_frame(cursor.as_arrow()), instrumentation.cursor_statistics(cursor)
+        return sql_backend.fetch(self, query, arrow, unload)
+
+
+# Creating duckdb backend class - runs the toolkit's athena sql locally on duckdb, over parquet exports of the client databases
+class duckdb_backend(sql_backend):
+    dialect = "duckdb"
+
+    def __init__(self, root=None, database=":memory:"):
+        """ Inputs:
+                root - optional directory of parquet exports laid out as <root>/<database>/<table> - each table a parquet file (<table>.parquet) or a
+                       directory of parquet files (hive partition directories, e.g. region=eu-west-2/, become columns as in athena)
+                       e.g. exports/jj_prod_union/fact_encounter/*.parquet
+                database - duckdb database file path, or ":memory:" (default) - tables can also be created in this directly
+        """
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("duckdb_backend needs duckdb - pip install duckdb (or BPM_dash_validation_toolkit[duckdb])")
+
+        self.root = root
+        self.database = duckdb.connect(database)
+        self.connection = self
+        # athena's information_schema - upper case TABLES columns, lower case COLUMNS columns
+        self.database.execute("CREATE SCHEMA IF NOT EXISTS athena_information_schema")
+        self.database.execute("""CREATE OR REPLACE VIEW athena_information_schema.tables AS
+                                 SELECT table_schema AS "TABLE_SCHEMA", table_name AS "TABLE_NAME" FROM information_schema.tables
+                                 WHERE table_schema <> 'athena_information_schema'""")
+        self.database.execute("""CREATE OR REPLACE VIEW athena_information_schema.columns AS
+                                 SELECT table_schema, table_name, column_name, ordinal_position, data_type FROM information_schema.columns""")
+        for macro in duckdb_macros:
+            self.database.execute(macro)
+        self.lock = threading.Lock()
+        if root is not None:
+            self.register_exports(root)
+
+    def register_exports(self, root):
+        """ Creates a view of every parquet export under root (<root>/<database>/<table>), in a schema of the database's name """
+        for database in sorted(os.listdir(root)):
+            database_path = os.path.join(root, database)
+            if not os.path.isdir(database_path):
+                continue
+            self.database.execute('CREATE SCHEMA IF NOT EXISTS "{}"'.format(database))
+            for export in sorted(os.listdir(database_path)):
+                export_path = os.path.join(database_path, export)
+                if os.path.isdir(export_path):
+                    source = "read_parquet('{}', hive_partitioning = true, union_by_name = true)".format(os.path.join(export_path, "**", "*.parquet").replace("'", "''"))
+                elif export.endswith(".parquet"):
+                    source = "read_parquet('{}')".format(export_path.replace("'", "''"))
+                else:
+                    continue
+                table = export[:-len(".parquet")] if export.endswith(".parquet") else export
+                self.database.execute('CREATE OR REPLACE VIEW "{}"."{}" AS SELECT * FROM {}'.format(database, table, source))
+
+    def translate(self, query):
+        """ Translates athena sql to duckdb sql - athena's information_schema views (functions are covered by the duckdb_macros) """
+        query = re.sub(r"information_schema\.tables\b", "athena_information_schema.tables", query, flags=re.IGNORECASE)
+        return re.sub(r"information_schema\.columns\b", "athena_information_schema.columns", query, flags=re.IGNORECASE)
+
+    def execute(self, query):
+        """ Runs duckdb sql directly on the database (not translated) - e.g. for creating tables """
+        self.database.execute(query)
+
+    def query_errors(self):
+        import duckdb
+        return (duckdb.DatabaseError,)
+
+    def cursor(self, *args, **kwargs):
+        return duckdb_cursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.database.close()
+
+
+class duckdb_cursor:
+    """ DB-API cursor of a duckdb_backend - translates athena sql & names unnamed columns _col0, _col1, ... as athena does """
+    def __init__(self, backend):
+        self.backend = backend
+        # each cursor has its own duckdb cursor, so cursors can be used from several threads at once
+        self.cursor = backend.database.cursor()
+
+    def execute(self, query, *args):
+        self.cursor.execute(self.backend.translate(query))
+        return self
+
+    @property
+    def description(self):
+        description = self.cursor.description
+        if description is None:
+            return None
+        return [(column[0] if re.match(r"^[A-Za-z_]\w*$", column[0]) else "_col{}".format(index),) + tuple(column[1:]) for index, column in enumerate(description)]
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self.cursor.fetchmany(size)
+
+    def to_arrow_table(self):
+        # duckdb 1.4+ names this to_arrow_table (fetch_arrow_table is deprecated)
+        arrow_table = self.cursor.to_arrow_table() if hasattr(self.cursor, "to_arrow_table") else self.cursor.fetch_arrow_table()
+        return arrow_table.rename_columns([column[0] for column in self.description])
+
+    def close(self):
+        self.cursor.close()
+
+
+def as_backend(connection):
+    """ Gives the backend for a connection input - a backend as is, otherwise an athena_backend over the (pyathena or other DB-API) connection """
+    if isinstance(connection, sql_backend):
+        return connection
+    return athena_backend(connection)
@@ -0,0 +1,163 @@
+# The code base for caching athena catalog metadata (tables & columns), so checks never need to read table data to find out a table's schema --
+
+# import required packages
+import json
+import os
+import threading
+import time
+from .execution import run_query, is_null
+from .instrumentation import check_scope
+
+
+def client_databases(clients, validation_client):
+    """ Gives every database a client's checks look at - regional prod databases, then the prod union, base tables & dashboard tables databases """
+    client_str = clients[validation_client].client
+    return list(clients[validation_client].prod_databases) + [client_str + "_prod_union", client_str + "_base_tables", client_str + "_dashboard_tables"]
+
+
+# Creating schema cache class for loading information_schema.TABLES & COLUMNS once per database and sharing it between checks
+class schema_cache:
+    def __init__(self, snapshot_path=None, ttl_seconds=None):
+        """ Inputs:
+                snapshot_path - optional json file path for keeping a snapshot of the catalog on disk between runs/stages (None keeps it in memory only)
+                ttl_seconds - optional no. of seconds a loaded database is trusted for before being re-read from information_schema (None never expires)
+        """
+        # database -> {table name: [column names in ordinal order]}
+        self.databases = dict()
+        # database -> time (epoch seconds) the database was read from information_schema
+        self.loaded_at = dict()
+        self.snapshot_path = snapshot_path
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.RLock()
+        self.read_snapshot()
+
+    def is_fresh(self, database):
+        """ Checks whether a database is cached and still within the ttl """
+        if database not in self.databases:
+            return False
+        return self.ttl_seconds is None or time.time() - self.loaded_at[database] <= self.ttl_seconds
+
+    def read_snapshot(self):
+        """ Reads the on disk snapshot (if there is one) into the cache - any expired databases are skipped """
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path, "r", encoding="utf-8") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        with self.lock:
+            for database, entry in snapshot.get("databases", dict()).items():
+                self.databases[database] = entry["tables"]
+                self.loaded_at[database] = entry["loaded_at"]
+                if not self.is_fresh(database):
+                    self.databases.pop(database)
+                    self.loaded_at.pop(database)
+
+    def write_snapshot(self):
+        """ Writes the cache to the on disk snapshot (if a snapshot path was given) """
+        if self.snapshot_path is None:
+            return
+        with self.lock:
+            snapshot = {"databases": {database: {"loaded_at": self.loaded_at[database], "tables": self.databases[database]} for database in self.databases}}
+        snapshot_directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        os.makedirs(snapshot_directory, exist_ok=True)
+        # write to a temp file and swap in, so a crashed run never leaves a half written snapshot
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temp_path, self.snapshot_path)
+
+    def load_databases(self, databases, connection):
+        """ Loads the tables & columns for all given databases not already cached (or expired), in one batched information_schema query
+            Inputs:
+                databases - list of string database names - e.g. ['jj_prod', 'jj_prod_union']
+                connection - the athena aws connection object
+            Comments:
+                1. tables are listed from information_schema.TABLES (as stage 1 always has) and their columns from information_schema.COLUMNS, so a
+                   table whose columns are not in COLUMNS (e.g. a view athena can not describe) is still listed, with no columns
+        """
+        with self.lock:
+            stale_databases = sorted(set(database for database in databases if not self.is_fresh(database)))
+            if len(stale_databases) == 0:
+                return
+
+            with check_scope(check="catalog", table=", ".join(stale_databases)):
+                database_list = ", ".join("'{}'".format(database) for database in stale_databases)
+                columns_query = run_query("""
+                                    SELECT
+                                        table_schema, table_name, column_name, ordinal_position
+                                    FROM information_schema.COLUMNS
+                                    WHERE TABLE_SCHEMA IN ({})
+                                    UNION ALL
+                                    SELECT
+                                        table_schema, table_name, CAST(NULL AS VARCHAR), CAST(NULL AS BIGINT)
+                                    FROM information_schema.TABLES
+                                    WHERE TABLE_SCHEMA IN ({})
+                                    ORDER BY table_schema, table_name, ordinal_position ;""".format(database_list, database_list), connection, use_cache=False)
+
+            # databases with no tables still get an (empty) entry, so they are not re-queried
+            loaded = {database: dict() for database in stale_databases}
+            for database, table, column in zip(columns_query["table_schema"], columns_query["table_name"], columns_query["column_name"]):
+                columns = loaded[database].setdefault(table, list())
+                # the TABLES row of each table has no column
+                if not is_null(column):
+                    columns.append(column)
+
+            loaded_time = time.time()
+            for database in loaded:
+                self.databases[database] = loaded[database]
+                self.loaded_at[database] = loaded_time
+            self.write_snapshot()
+
+    def load_client(self, clients, validation_client, connection):
+        """ Loads every database of a client (see client_databases) in one batched query """
+        self.load_databases(client_databases(clients, validation_client), connection)
+
+    def load(self, database, connection):
+        """ Loads the tables & columns for a database from information_schema, if not already loaded
+            Inputs:
+                database - string database name - e.g. jj_dashboard_tables
+                connection - the athena aws connection object
+            Output:
+                dict - table name -> list of column names in ordinal order
+        """
+        with self.lock:
+            self.load_databases([database], connection)
+            return self.databases[database]
+
+    def tables(self, database, connection):
+        """ Gives the set of table names in a database """
+        return set(self.load(database, connection))
+
+    def table_columns(self, database, table, connection):
+        """ Gives the list of column names (in ordinal order) of a table - empty list if table is not in the database """
+        return list(self.load(database, connection).get(table, list()))
+
+    def has_column(self, database, table, column, connection):
+        """ Checks whether a table has a column (athena column names are lower case, so this is case insensitive) """
+        return column.lower() in set(table_column.lower() for table_column in self.table_columns(database, table, connection))
+
+    def invalidate(self, database=None):
+        """ Drops a database (or all databases if None) from the cache & snapshot, so it is re-loaded on next use """
+        with self.lock:
+            if database is None:
+                self.databases.clear()
+                self.loaded_at.clear()
+            else:
+                self.databases.pop(database, None)
+                self.loaded_at.pop(database, None)
+            self.write_snapshot()
+
+
+# no. of seconds the shared schema cache trusts a database for - long enough to share the catalog between the stages of a run, short enough that a
+# long lived process (e.g. a scheduled runner) picks up added/dropped tables & columns on its next run
+shared_schema_ttl_seconds = 15 * 60
+
+# schema cache shared by all checks & drivers when one is not passed in
+shared_schema_cache = schema_cache(ttl_seconds=shared_schema_ttl_seconds)
+
+
+def set_shared_schema_ttl(ttl_seconds=shared_schema_ttl_seconds):
+    """ Sets the no. of seconds the shared schema cache trusts a database for (None never expires) - e.g. set_shared_schema_ttl(60), so the drivers
+        of a long run re-read the catalog at most a minute old, picking up tables created during the run (a ttl of 0 re-reads it for every lookup)
+    """
+    shared_schema_cache.ttl_seconds = ttl_seconds
+    return ttl_seconds
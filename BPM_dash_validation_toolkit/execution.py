@@ -0,0 +1,241 @@
+# The code base for defining how the toolkit runs its checks/queries against athena (or another execution backend - see backends.py) --
+
+# import required packages
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import threading
+import time
+from .query_cache import normalise_query
+from . import instrumentation
+from .backends import as_backend
+
+# query result cache (query_cache.query_cache) used by run_query - None (default) runs every query against athena
+active_query_cache = None
+
+# how run_query fetches results - "auto" (columnar arrow fetch when pyarrow is installed, otherwise python rows), "arrow" or "pandas" (python rows, as pd.read_sql)
+fetch_settings = {"mode": "auto", "unload": False}
+
+
+# cap on the no. of athena queries in flight at once over all threads (e.g. several clients run by runner.run_clients) - None (default) is no cap
+in_flight_queries = None
+
+
+def set_max_in_flight_queries(max_queries=None):
+    """ Sets the max no. of queries run at once over all threads & clients - e.g. set_max_in_flight_queries(20), or None for no cap """
+    global in_flight_queries
+    in_flight_queries = threading.BoundedSemaphore(max_queries) if max_queries is not None else None
+    return max_queries
+
+
+# shared worker pool the concurrent checks are run on (set by runner.run_clients for a run, so every client's checks share one pool) - None (default)
+# gives each run_checks call a pool of its own
+check_pool = None
+
+
+def set_check_pool(executor=None):
+    """ Sets the worker pool (concurrent.futures executor) concurrent checks are run on over all threads & clients - or None for a pool per run_checks call """
+    global check_pool
+    check_pool = executor
+    return executor
+
+
+class query_slot:
+    """ Context manager holding one of the in flight query slots (if capped) while a query runs """
+    def __enter__(self):
+        self.semaphore = in_flight_queries
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.semaphore is not None:
+            self.semaphore.release()
+        return False
+
+
+def set_query_cache(cache):
+    """ Sets the query result cache used for all toolkit queries - e.g. set_query_cache(query_cache("/tmp/bpm_query_cache")), or None to turn caching off """
+    global active_query_cache
+    active_query_cache = cache
+    return cache
+
+
+def set_fetch_mode(mode="auto", unload=False):
+    """ Sets how query results are fetched by run_query
+        Inputs:
+            mode - "auto" (default - arrow if pyarrow is installed, otherwise pandas), "arrow" (columnar fetch, results are arrow backed DataFrames
+                   with NULLs as pd.read_sql gives them - see backends.arrow_frame)
+                   or "pandas" (python row tuples built into a DataFrame, as pd.read_sql)
+            unload - bool, for pyathena connections in arrow mode, if True results are written by athena as parquet (UNLOAD) and read directly
+                     - faster for very large results such as primary key pulls, but UNLOAD does not support every query
+    """
+    if mode not in ["auto", "arrow", "pandas"]:
+        raise ValueError("fetch mode must be one of auto, arrow or pandas - not {}".format(mode))
+    fetch_settings["mode"] = mode
+    fetch_settings["unload"] = unload
+
+
+def is_null(value):
+    """ Checks if a value fetched from a query is NULL - None, NaN or pd.NA (arrow backed results) """
+    import pandas as pd
+    return value is None or bool(pd.isna(value))
+
+
+def fetch_arrow(query, connection):
+    """ Utility function for running a query and fetching the result as a columnar arrow backed DataFrame (no python row tuples) - see backends.sql_backend.fetch
+        Output: (DataFrame, cursor statistics - see instrumentation.cursor_statistics)
+    """
+    return as_backend(connection).fetch(query, arrow=True, unload=fetch_settings["unload"])
+
+
+def fetch_records(query, connection):
+    """ Utility function for running a query and fetching the result as python rows built into a DataFrame (as pd.read_sql)
+        Output: (DataFrame, cursor statistics - see instrumentation.cursor_statistics)
+    """
+    return as_backend(connection).fetch(query, arrow=False)
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def run_query(query, connection, use_cache=True):
+    """ Utility function which all toolkit queries go through - runs a query on the connection and gives the result as a DataFrame (as pd.read_sql)
+        Inputs:
+            query - string sql query
+            connection - the athena aws connection object, or an execution backend (backends.py) - e.g. duckdb_backend("exports/")
+            use_cache - bool, if False the query result cache is skipped for this query (e.g. for catalog queries, which have their own cache)
+        Output:
+            DataFrame of query result
+    """
+    # results of a dry run backend (planner.planning_backend) are placeholders, so are never cached
+    cache = active_query_cache if use_cache and getattr(connection, "cacheable", True) else None
+    arrow = fetch_settings["mode"] == "arrow" or (fetch_settings["mode"] == "auto" and arrow_available())
+    if cache is not None:
+        start = time.perf_counter()
+        result = cache.get(query, connection, arrow=arrow)
+        if result is not None:
+            if instrumentation.active_recorder is not None:
+                instrumentation.active_recorder.record(query, time.time(), time.perf_counter() - start, cache_hit=True)
+            return result
+
+    fetch = fetch_arrow if arrow else fetch_records
+    with query_slot():
+        result = instrumentation.timed_query(lambda: fetch(query, connection), query)
+
+    if cache is not None:
+        cache.put(query, connection, result)
+    return result
+
+
+def run_checks(check_calls, max_concurrent_queries=1):
+    """ Utility function for running a list of check function calls, either one after another (serial) or concurrently over a thread pool
+        Inputs:
+            check_calls - list of (key, check function, keyword argument dict) tuples - e.g. (("1.1", region, table), check_1_1, {...})
+            max_concurrent_queries - int max no. of checks being run at once, 1 (default) runs each check serially as before
+                                     note: each check runs its own queries one after another, so this is also the max no. of athena queries in flight
+        Output:
+            dict - key -> check output (bool, string), with keys in the same order as check_calls
+        Comments:
+            1. if a shared check pool is set (set_check_pool - e.g. by runner.run_clients), concurrent checks are run on it, so the pool's size caps the
+               checks running at once over every caller - the calling thread runs any of its checks no worker has started yet, rather than waiting, so
+               callers running on the pool themselves (e.g. a client's stage pipeline) can not take every worker & leave their checks unrun
+    """
+    results = dict()
+
+    # serial run - no thread pool needed
+    if max_concurrent_queries is None or max_concurrent_queries <= 1:
+        for key, check_function, check_kwargs in check_calls:
+            results[key] = check_function(**check_kwargs)
+        return results
+
+    # concurrent run - submit every check to the pool, then collect in submission order so output matches a serial run
+    # each check runs in a copy of the caller's context, so its queries keep the caller's check labels (instrumentation)
+    pool = check_pool
+    if pool is not None:
+        futures = [(key, check_function, check_kwargs, pool.submit(contextvars.copy_context().run, check_function, **check_kwargs)) for key, check_function, check_kwargs in check_calls]
+        for key, check_function, check_kwargs, future in futures:
+            # a check no worker has started yet is taken back & run by the caller
+            if future.cancel():
+                results[key] = contextvars.copy_context().run(check_function, **check_kwargs)
+            else:
+                results[key] = future.result()
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_queries) as executor:
+        futures = [(key, executor.submit(contextvars.copy_context().run, check_function, **check_kwargs)) for key, check_function, check_kwargs in check_calls]
+        for key, future in futures:
+            results[key] = future.result()
+    return results
+
+
+def iter_query(query, connection, chunksize=100000):
+    """ Utility function for running a query and reading its result a chunk of rows at a time, rather than all at once
+        Inputs:
+            query - string sql query
+            connection - the athena aws connection object
+            chunksize - int no. of rows in each chunk
+        Output:
+            generator of DataFrames of up to chunksize rows (results are not kept in the query cache)
+    """
+    import pandas as pd
+    cursor = as_backend(connection).cursor()
+    # only the query run holds an in flight slot - the chunks are read from the finished result
+    with query_slot():
+        instrumentation.timed_query(lambda: (cursor.execute(query), instrumentation.cursor_statistics(cursor)), query)
+    columns = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if len(rows) == 0:
+            break
+        yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+def run_scalar_queries(queries, connection, max_batch_size=50):
+    """ Utility function for running many single value (one row, one column) queries in as few athena round trips as possible
+        Inputs:
+            queries - list of string sql queries, each giving a single value - e.g. SELECT COUNT(*) FROM ... (duplicates are only run once)
+            connection - the athena aws connection object
+            max_batch_size - int max no. of queries packed into one SELECT (q1) AS q1, (q2) AS q2, ... statement
+        Output:
+            dict - normalised sql (query_cache.normalise_query) -> value, for use as scalar_results in the stage 3 checks
+                   note: if a batch fails (e.g. a query gives more than one row/column), it is split in half & each half run again, down to single
+                   queries - a query failing on its own is left out, so its check runs the query itself as before
+    """
+    # removing duplicate queries (same sql once normalised) - the original sql is batched (so -- comments still end at their line end), keyed by the normalised sql:
+    unique_queries = dict()
+    for query in queries:
+        unique_queries.setdefault(normalise_query(query), query)
+    unique_queries = list(unique_queries.items())
+
+    scalar_results = dict()
+    for batch_start in range(0, len(unique_queries), max_batch_size):
+        run_scalar_batch(unique_queries[batch_start:batch_start + max_batch_size], connection, scalar_results)
+    return scalar_results
+
+
+def run_scalar_batch(batch, connection, scalar_results):
+    """ Runs a batch of (normalised sql, sql) single value queries as one statement, adding their values to scalar_results - a failed batch is split in half """
+    batch_query = "SELECT " + ",\n       ".join("(\n{}\n) AS q{}".format(query.strip().rstrip(";").rstrip(), index) for index, (_, query) in enumerate(batch))
+    try:
+        batch_result = run_query(batch_query, connection)
+    except Exception as error:
+        if len(batch) == 1:
+            print("Scalar query failed, it will be run by its check: ", error)
+            return
+        run_scalar_batch(batch[:len(batch) // 2], connection, scalar_results)
+        run_scalar_batch(batch[len(batch) // 2:], connection, scalar_results)
+        return
+    for index, (normalised_query, _) in enumerate(batch):
+        scalar_results[normalised_query] = list(batch_result["q{}".format(index)])[0]
+
+
+def scalar_result(query, column, connection, scalar_results=None):
+    """ Gives the single value of a query - taken from scalar_results (from run_scalar_queries) if there, otherwise by running the query and taking the first row of column """
+    if scalar_results is not None and normalise_query(query) in scalar_results:
+        return scalar_results[normalise_query(query)]
+    return list(run_query(query, connection)[column])[0]
@@ -1,9 +1,14 @@
 # The code base for defining functions for data validation of client dashboards --
 
 # import required packages
-from pyathena import connect
-import pandas as pd
 import itertools
+from .execution import run_checks, run_query, run_scalar_queries, scalar_result, is_null
+from .backends import as_backend
+from .catalog import shared_schema_cache
+from .key_diff import stream_key_diff, bucket_key_diff, key_hash_sql
+from .watermarks import watermark_key
+from .instrumentation import instrumented
+from .history import record_outcome
 
 ## Defining node class for failures/warnings:
 # Creating node object for passing warnings, dependencies & failures
@@ -19,9 +24,80 @@ class node:
 ## DEFINING STAGE ONE CHECK FUNCTIONS
 
 
+############################# Incremental slices - checking only the rows past a stored watermark & combining with the stored totals ###################################
+
+def incremental_slice(key, watermark_column, watermarks, watermark_table, count_queries, check_totals, connection):
+    """ Utility function for counting the rows of a check past its stored watermark, and combining these with the stored totals - in one query
+	Inputs:
+	  key - string watermark store key for the check slice (watermarks.watermark_key)
+	  watermark_column - string update time/partition column the slice is taken on
+	  watermarks - watermarks.watermark_store
+	  watermark_table - string "<database>.<table>" the new watermark (MAX of watermark_column past the old watermark) is taken from
+	  count_queries - dict total name -> single value sql query, with {slice} where the slice condition goes - e.g. "SELECT COUNT(*) FROM db.t WHERE {slice}"
+	  check_totals - function of the combined totals dict, giving True if the check passes - the watermark is only moved on when it passes
+    Output:
+	  dict - total name -> combined total (stored totals + slice, or the slice only on a full validation)
+    Comments:
+      1. the slice is the rows with watermark_column past the old watermark, up to the new watermark - MAX(watermark_column) of watermark_table - so rows
+         landing while the checks run are left for the next run
+      2. this is exact if rows are only ever added with a watermark_column value past the last watermark (e.g. a load time or a date partition):
+         updated, deleted or late rows (or rows with NULL watermark_column) are only picked up on a full validation - see watermark_store full_refresh
+    """
+    full = watermarks.needs_full_refresh(key, watermark_column)
+    lower_condition = watermarks.condition(key, watermark_column)
+    upper_condition = "1 = 1" if full else "{} <= (SELECT new_watermark FROM upper_watermark)".format(watermark_column)
+    slice_condition = "({}) AND ({})".format(lower_condition, upper_condition)
+
+    slice_query = run_query("""
+                            WITH upper_watermark AS (
+                                SELECT MAX({}) AS new_watermark FROM {} WHERE {}
+                            )
+                            SELECT
+                                (SELECT CAST(new_watermark AS VARCHAR) FROM upper_watermark) AS watermark,
+                                (SELECT typeof(new_watermark) FROM upper_watermark) AS watermark_type,
+                                {}
+                            """.format(watermark_column, watermark_table, lower_condition,
+                                       ",\n                                ".join("({}) AS {}".format(count_query.format(slice=slice_condition), name) for name, count_query in count_queries.items())), connection)
+
+    stored_totals = dict() if full else watermarks.totals(key)
+    totals = {name: stored_totals.get(name, 0) + int(list(slice_query[name])[0]) for name in count_queries}
+    if check_totals(totals):
+        watermark = list(slice_query["watermark"])[0]
+        watermark = None if is_null(watermark) else watermark
+        watermarks.update(key, watermark_column, watermark, list(slice_query["watermark_type"])[0], totals, full)
+    return totals
+
+
 ############################# Check 1.1 definition - Check prod (source) against target (corresponding union table) for each region ###################################
 
-def check_1_1(source, target, sourcedbs, targetdbs, region, connection):
+@instrumented(check="1.1 & 1.2", table_argument="target")
+def union_region_counts(target, targetdbs, connection):
+    """ Utility function for getting the row count of every region (including NULL regions) of a union table in a single GROUP BY region scan
+	Inputs:
+	  target - "<table-name>" string e.g.'fact_encounter'
+      targetdbs - "<database-name>" string e.g. 'jj_prod_union' <- corresponding union dbs in uk
+    Output:
+	  dict - region -> row count, with NULL region rows under the key None e.g. {'ap-southeast-1': 10, None: 0}
+    Comments:
+      1. can be passed to check 1.1 & 1.2 as union_counts so these do not each re-scan the union table
+    """
+    region_counts_query = run_query("""
+                            SELECT region, COUNT(*) AS COUNT
+                            FROM {}.{}
+                            GROUP BY region
+                            """.format(targetdbs, target), connection)
+
+    union_counts = dict()
+    for region, count in zip(region_counts_query["region"], region_counts_query["COUNT"]):
+        # NULL regions come back as None/NaN/NA depending on column type - store these under None
+        if is_null(region):
+            region = None
+        union_counts[region] = count
+    return union_counts
+
+
+@instrumented(check="1.1", table_argument="target")
+def check_1_1(source, target, sourcedbs, targetdbs, region, connection, union_counts=None, watermark_column=None, watermarks=None, row_counts=None):
     """ Utility function for undertaking check 1.1 for checking the count of regional prod data tables against their aggregated union tables 
 	Inputs:
 	  source - "<table-name>" string e.g.'fact_encounter"
@@ -29,70 +105,279 @@ def check_1_1(source, target, sourcedbs, targetdbs, region, connection):
       sourcedbs - "<database-name>" string e.g. 'jj_prod' <- regional prod dbs pushed to uk
       targetdbs - "<database-name>" string e.g. 'jj_prod_union' <- corresponding union dbs in uk
       region - "<region>" string e.g. "ap-southeast-1" (singapore) <- the original region for the prod table before being pushed to uk
+      union_counts - optional dict of region -> union row count from union_region_counts, if given the union table is not re-scanned for this region
+      watermark_column - optional string update time/partition column (in both prod & union tables) - with watermarks, only rows past the stored watermark
+                         are counted and added to the stored totals (see incremental_slice)
+      watermarks - optional watermarks.watermark_store the watermarks & totals are kept in
+      row_counts - optional table_statistics.glue_row_counts - the prod count (and the union count, if the union table is partitioned by region)
+                   are taken from exact & fresh table/partition statistics where there are any, otherwise counted by scan
     Output:
 	  bool - True/False - 1/0
     Comments:
-    """    # Run query of count against the region prod database
-    prod_query = """ 
-                 SELECT COUNT(*) AS COUNT 
-                 FROM {}.{} 
-                            """.format(sourcedbs, source)
-
-    prod_query = pd.read_sql(prod_query, connection)
-    # Get the count for that regions prod
-    region_count = list(prod_query["COUNT"])[0]
+    """
+    if watermark_column is not None and watermarks is not None:
+        key = watermark_key("1.1", targetdbs, target, region)
+        totals = incremental_slice(key, watermark_column, watermarks, "{}.{}".format(sourcedbs, source), {
+                                        "prod_count": "SELECT COUNT(*) FROM {}.{} WHERE {{slice}}".format(sourcedbs, source),
+                                        "union_count": "SELECT COUNT(*) FROM {}.{} WHERE region = '{}' AND {{slice}}".format(targetdbs, target, region)},
+                                    lambda totals: totals["prod_count"] == totals["union_count"], connection)
+        region_count, union_count = totals["prod_count"], totals["union_count"]
+        print("Check 1.1 (same regional row count): ", union_count== region_count, union_count, target, targetdbs, region_count, source, sourcedbs)
+        record_outcome(union_count== region_count, item=region, union_count=union_count, region_count=region_count)
+        return union_count== region_count, f"{union_count== region_count} {union_count} {target} {targetdbs} {region_count} {source} {sourcedbs}"
+
+    # prod & union counts from the table/partition statistics (None where these are missing or stale)
+    region_count = None
+    if row_counts is not None:
+        region_count = row_counts.table_count(sourcedbs, source)
+        if union_counts is None:
+            union_counts = row_counts.partition_counts(targetdbs, target, "region")
+
+    if region_count is None:
+        # Run query of count against the region prod database
+        prod_query = """ 
+                     SELECT COUNT(*) AS COUNT 
+                     FROM {}.{} 
+                                """.format(sourcedbs, source)
+
+        prod_query = run_query(prod_query, connection)
+        # Get the count for that regions prod
+        region_count = list(prod_query["COUNT"])[0]
     
-    # Run query of count against the region prod database
-    union_table_query = """
-                            SELECT COUNT(*) AS COUNT  
-                            FROM {}.{} 
-                            WHERE region = '{}'
-                            """.format(targetdbs, target, region)
+    if union_counts is not None:
+        # union counts already fetched for all regions in one scan - a region with no rows will not be in the group by output
+        union_count = union_counts.get(region, 0)
+    else:
+        # Run query of count against the region prod database
+        union_table_query = """
+                                SELECT COUNT(*) AS COUNT  
+                                FROM {}.{} 
+                                WHERE region = '{}'
+                                """.format(targetdbs, target, region)
 
-    union_table_query = pd.read_sql(union_table_query, connection)
+        union_table_query = run_query(union_table_query, connection)
 
-    union_count = list(union_table_query["COUNT"])[0]
+        union_count = list(union_table_query["COUNT"])[0]
 
     print("Check 1.1 (same regional row count): ", union_count== region_count, union_count, target, targetdbs, region_count, source, sourcedbs)
     # Check to see if count is the same for that regional prod table within the union table for that region
+    record_outcome(union_count== region_count, item=region, union_count=union_count, region_count=region_count)
     return union_count== region_count, f"{union_count== region_count} {union_count} {target} {targetdbs} {region_count} {source} {sourcedbs}"
 
 
 
 ######################### Check 1.2 definition - Check for union table, that there are no nulls in region column, so only regions to be tested   ######################
-def check_1_2(target, targetdbs, connection):
+@instrumented(check="1.2", table_argument="target")
+def check_1_2(target, targetdbs, connection, union_counts=None, watermark_column=None, watermarks=None, row_counts=None):
     """ Utility function for undertaking check 1.2 for checking that there are no nulls in region columns of union table
 	Inputs:
 	  target - "<table-name>" string e.g.'fact_encounter'
       targetdbs - "<database-name>" string e.g. 'jj_prod_union' <- corresponding union dbs in uk
+      union_counts - optional dict of region -> union row count from union_region_counts, if given the NULL region count is taken from this
+      watermark_column - optional string update time/partition column of the union table - with watermarks, only rows past the stored watermark are checked
+      watermarks - optional watermarks.watermark_store the watermarks & totals are kept in
+      row_counts - optional table_statistics.glue_row_counts - if the union table is partitioned by region with exact & fresh partition statistics,
+                   the NULL region count is taken from these (the __HIVE_DEFAULT_PARTITION__ partition), otherwise counted by scan
     Output:
 	  bool - True/False - 1/0    
   Comments:
   Review Comments:
     """
 #target=table, targetdbs=clients[validation_client].client + "_prod_union"
-    # Run query of count of NULLS against region table
-    union_table_query = """
-                            SELECT COUNT(*) AS COUNT  
-                            FROM {}.{} 
-                            WHERE region IS NULL
-                            """.format(targetdbs, target)
+    if union_counts is None and row_counts is not None and not (watermark_column is not None and watermarks is not None):
+        union_counts = row_counts.partition_counts(targetdbs, target, "region")
+    if watermark_column is not None and watermarks is not None:
+        totals = incremental_slice(watermark_key("1.2", targetdbs, target), watermark_column, watermarks, "{}.{}".format(targetdbs, target), {
+                                        "null_regions": "SELECT COUNT(*) FROM {}.{} WHERE region IS NULL AND {{slice}}".format(targetdbs, target)},
+                                    lambda totals: totals["null_regions"] == 0, connection)
+        union_count = totals["null_regions"]
+    elif union_counts is not None:
+        # NULL region count already fetched in the group by region scan
+        union_count = union_counts.get(None, 0)
+    else:
+        # Run query of count of NULLS against region table
+        union_table_query = """
+                                SELECT COUNT(*) AS COUNT  
+                                FROM {}.{} 
+                                WHERE region IS NULL
+                                """.format(targetdbs, target)
 
-    union_table_query = pd.read_sql(union_table_query, connection)
-    union_count = list(union_table_query["COUNT"])[0]
+        union_table_query = run_query(union_table_query, connection)
+        union_count = list(union_table_query["COUNT"])[0]
 
     print("Check 1.2 (null regions): ", union_count== 0, union_count)
     # there should be no nulls in region column for union table
+    record_outcome(union_count== 0, null_region_count=union_count)
     return union_count== 0, f"{ union_count== 0} {union_count} {target} {targetdbs}"
 
 
 
-## DEFINING STAGE ONE CHECK FUNCTIONS
+## DEFINING STAGE TWO CHECK FUNCTIONS
+
+# Utility functions for turning a primary key (string or list of columns for a composite PK) into sql:
+def pk_list(PK):
+    """ Joins a composite primary key list into a comma seperated column string - a single column string is returned as is """
+    if type(PK) == list:
+        return ','.join(PK)
+    return PK
+
+def pk_expression(PK):
+    """ Gives a single varchar sql expression for a primary key - composite primary keys are concatenated as in CONCAT('', col1, col2) """
+    if type(PK) == list:
+        return "CONCAT('', {})".format(', '.join("CAST({} AS VARCHAR)".format(column) for column in PK))
+    return "CAST({} AS VARCHAR)".format(PK)
+
+
+######################### Stage 2 table profile - primary key statistics for checks 2.1 & 2.3 from one scan of a base table ######################
+
+@instrumented(check="2.1 & 2.3", table_argument="target")
+def profile_2_table(target, targetdbs, target_PK, connection):
+    """ Utility function for getting the primary key statistics of a base table used by checks 2.1 and 2.3 in a single scan
+	Inputs:
+	  target -  string base table name  - e.g. fact_encounter
+      targetdbs - string base table database name - e.g. jj_base_tables
+      target_PK - the list or string of the primary key columns of table - e.g. encounter_id or if composite (pathway_name, region) as list
+	 Output:
+	  dict - {"total_rows": int, "distinct_pks": int (non-null keys, as COUNT(DISTINCT pk)), "duplicate_pks": int (keys on more than one row)}
+     Comments:
+          1. can be passed to check 2.1 & 2.3 as profile so these do not each re-scan the base table
+    """
+    PK_columns = target_PK if type(target_PK) == list else [target_PK]
+    # a key is only counted as distinct (as in COUNT(DISTINCT)) if none of its columns are null
+    not_null_key = " AND ".join("{} IS NOT NULL".format(column) for column in PK_columns)
+
+    profile_query = run_query("""
+                                SELECT
+                                    COALESCE(SUM(key_rows), 0) AS total_rows,
+                                    COALESCE(SUM(CASE WHEN {} THEN 1 ELSE 0 END), 0) AS distinct_pks,
+                                    COALESCE(SUM(CASE WHEN key_rows > 1 THEN 1 ELSE 0 END), 0) AS duplicate_pks
+                                FROM (
+                                    SELECT {}, COUNT(*) AS key_rows
+                                    FROM {}.{}
+                                    GROUP BY {}
+                                ) AS base_keys
+                            """.format(not_null_key, pk_list(target_PK), targetdbs, target, pk_list(target_PK)), connection)
+
+    return {column: int(list(profile_query[column])[0]) for column in ["total_rows", "distinct_pks", "duplicate_pks"]}
+
+
+######################### Stage 2 key fingerprint - cheap first pass for checks 2.1 & 2.2 ######################
+
+@instrumented(check="2.1 & 2.2", table_argument="target")
+def fingerprint_2_table(target, targetdbs, target_PK, parent_query, prod_ids, connection, with_profile=False):
+    """ Utility function for comparing approximate fingerprints of the primary keys of a base table & its union parent, in one query giving four values
+	Inputs:
+	  target -  string base table name  - e.g. fact_encounter
+      targetdbs - string base table database name - e.g. jj_base_tables
+      target_PK - the list or string of the primary key columns of table
+      parent_query - the corresponding FROM query for the corresponding prod union (as for check 2.1 & 2.2)
+      prod_ids - the list or string of the primary key columns of the union parent
+      with_profile - bool, if True the base table's profile (as profile_2_table) is taken in the same scan of the base table
+	 Output:
+	  dict - {"match": bool, "base_approx_keys", "union_approx_keys", "base_checksum", "union_checksum"}, and "profile" (as from profile_2_table) if with_profile
+     Comments:
+          1. each side's fingerprint is approx_distinct of its keys and an order independent checksum - the sum of the distinct xxhash64 key hashes
+          2. if the fingerprints match the key sets are (almost certainly) the same, so exact checks 2.1 & 2.2 can be skipped - if not, run the exact checks
+          3. with_profile groups the base table by key (as profile_2_table) & fingerprints the grouped keys, so checks 2.1 & 2.3 need no scan of their own
+    """
+    base_key = "COALESCE({}, '<NULL>')".format(pk_expression(target_PK))
+    union_key = "COALESCE(CONCAT('', {}), '<NULL>')".format(pk_list(prod_ids))
+    profile_columns = ["total_rows", "distinct_pks", "duplicate_pks"]
+
+    if with_profile == True:
+        PK_columns = target_PK if type(target_PK) == list else [target_PK]
+        # a key is only counted as distinct (as in COUNT(DISTINCT)) if none of its columns are null
+        not_null_key = " AND ".join("{} IS NOT NULL".format(column) for column in PK_columns)
+        base_fingerprint = """
+                            SELECT approx_distinct({key}) AS base_approx_keys, SUM(DISTINCT CAST({key_hash} AS DECIMAL(38, 0))) AS base_checksum,
+                                COALESCE(SUM(key_rows), 0) AS total_rows,
+                                COALESCE(SUM(CASE WHEN {not_null_key} THEN 1 ELSE 0 END), 0) AS distinct_pks,
+                                COALESCE(SUM(CASE WHEN key_rows > 1 THEN 1 ELSE 0 END), 0) AS duplicate_pks
+                            FROM (
+                                SELECT {pk_list}, COUNT(*) AS key_rows
+                                FROM {targetdbs}.{target}
+                                GROUP BY {pk_list}
+                            ) AS base_keys""".format(key=base_key, key_hash=key_hash_sql(base_key), not_null_key=not_null_key, pk_list=pk_list(target_PK), targetdbs=targetdbs, target=target)
+    else:
+        base_fingerprint = """
+                            SELECT approx_distinct({}) AS base_approx_keys, SUM(DISTINCT CAST({} AS DECIMAL(38, 0))) AS base_checksum
+                            FROM {}.{}""".format(base_key, key_hash_sql(base_key), targetdbs, target)
+
+    fingerprint_query = run_query("""
+                        SELECT
+                            *
+                        FROM ({}
+                        ) AS base_fingerprint
+                        CROSS JOIN (
+                            SELECT approx_distinct({}) AS union_approx_keys, SUM(DISTINCT CAST({} AS DECIMAL(38, 0))) AS union_checksum
+                            {}
+                        ) AS union_fingerprint
+                    """.format(base_fingerprint, union_key, key_hash_sql(union_key), parent_query), connection)
+
+    fingerprint = {column: list(fingerprint_query[column])[0] for column in ["base_approx_keys", "base_checksum", "union_approx_keys", "union_checksum"]}
+    # an empty table has a NULL checksum
+    for column in ["base_checksum", "union_checksum"]:
+        if is_null(fingerprint[column]):
+            fingerprint[column] = 0
+    fingerprint["match"] = bool(fingerprint["base_approx_keys"] == fingerprint["union_approx_keys"] and fingerprint["base_checksum"] == fingerprint["union_checksum"])
+    if with_profile == True:
+        fingerprint["profile"] = {column: int(list(fingerprint_query[column])[0]) for column in profile_columns}
+    return fingerprint
+
+
+######################### Stage 2 incremental checks - checks 2.1, 2.2 & 2.3 on the rows past a stored watermark ######################
+
+@instrumented(check="2.1 - 2.3", table_argument="target")
+def incremental_2_table(target, targetdbs, target_PK, parent_query, prod_ids, watermark_column, watermarks, connection):
+    """ Utility function for undertaking checks 2.1, 2.2 & 2.3 on only the rows of a base table & its union parent past the stored watermark, in one query
+	Inputs:
+	  target -  string base table name  - e.g. fact_encounter
+      targetdbs - string base table database name - e.g. jj_base_tables
+      target_PK - the list or string of the primary key columns of table
+      parent_query - the FROM query for the corresponding prod union (as for check 2.1 & 2.2)
+      prod_ids - the list or string of the primary key columns of the union parent
+      watermark_column - string load time/partition column, in both the base table & the output of parent_query
+      watermarks - watermarks.watermark_store the watermarks & totals are kept in
+	 Output:
+	  tuple - (check 2.1 output, check 2.2 output, check 2.3 output), each as from check_2_1, check_2_2 & check_2_3
+     Comments:
+          1. the slice is taken on the base table's watermark, so union rows not yet in the base table are left for the next run
+          2. as well as the incremental_slice assumptions, a primary key is assumed to only ever be in one slice (e.g. the watermark column is
+             the load time of a key's first row) - the key counts & duplicate counts of each slice are then added to the stored totals, and the keys of
+             the base & union slices compared
+          3. parent_query is wrapped as FROM (SELECT * <parent_query>), so prod_ids & watermark_column need to be unqualified columns of its output
+    """
+    base_key = "COALESCE({}, '<NULL>')".format(pk_expression(target_PK))
+    union_key = "COALESCE(CONCAT('', {}), '<NULL>')".format(pk_list(prod_ids))
+    parent_slice = "(SELECT * {}) AS parent_slice".format(parent_query)
+
+    totals = incremental_slice(watermark_key("2", targetdbs, target), watermark_column, watermarks, "{}.{}".format(targetdbs, target), {
+                                    "base_keys": "SELECT COUNT(DISTINCT {}) FROM {}.{} WHERE {{slice}}".format(pk_expression(target_PK), targetdbs, target),
+                                    "union_keys": "SELECT COUNT(DISTINCT CONCAT('', {})) FROM {} WHERE {{slice}}".format(pk_list(prod_ids), parent_slice),
+                                    "duplicate_pks": "SELECT COUNT(*) FROM (SELECT {} AS pk FROM {}.{} WHERE {{slice}} GROUP BY {} HAVING COUNT(*) > 1) AS duplicate_keys".format(base_key, targetdbs, target, base_key),
+                                    "missing_from_union": "SELECT COUNT(*) FROM (SELECT DISTINCT {} AS pk FROM {}.{} WHERE {{slice}}) AS base_slice_keys WHERE pk NOT IN (SELECT {} FROM {} WHERE {{slice}})".format(base_key, targetdbs, target, union_key, parent_slice),
+                                    "missing_from_base": "SELECT COUNT(*) FROM (SELECT DISTINCT {} AS pk FROM {} WHERE {{slice}}) AS union_slice_keys WHERE pk NOT IN (SELECT {} FROM {}.{} WHERE {{slice}})".format(union_key, parent_slice, base_key, targetdbs, target)},
+                                lambda totals: totals["base_keys"] == totals["union_keys"] and totals["missing_from_union"] == 0 and totals["missing_from_base"] == 0 and totals["duplicate_pks"] == 0,
+                                connection)
+
+    base_count, parent_count = totals["base_keys"], totals["union_keys"]
+    missing_from_union, missing_from_base = totals["missing_from_union"], totals["missing_from_base"]
+    dup_keys = totals["duplicate_pks"]
+    print("Check 2.1 (same PK count): ", parent_count== base_count, target, parent_count, base_count)
+    print("Check 2.2 (same distinct PKs): ", missing_from_union == 0 and missing_from_base == 0, target,  targetdbs, missing_from_union, missing_from_base)
+    print("Check 2.3 (unique PKs): ",dup_keys ==0, target, dup_keys)
+    record_outcome(parent_count== base_count, check="2.1", parent_count=parent_count, base_count=base_count)
+    record_outcome(missing_from_union == 0 and missing_from_base == 0, check="2.2", missing_from_union=missing_from_union, missing_from_base=missing_from_base)
+    record_outcome(dup_keys ==0, check="2.3", duplicate_pks=dup_keys)
+    return ((parent_count== base_count, f"{parent_count== base_count} {target} {parent_count} {base_count}"),
+            (missing_from_union == 0 and missing_from_base == 0, f"{missing_from_union == 0 and missing_from_base == 0} {target} {targetdbs} base PKs missing from union: {missing_from_union} union PKs missing from base: {missing_from_base} []"),
+            (dup_keys ==0, f"{dup_keys ==0} {target} {dup_keys} {pk_list(target_PK)} {targetdbs} {dup_keys}"))
 
 
 ######################### Check 2.1 definition - Check for base table, that the count of primary key is the same as the count of union primary keys & simiarly that all PKs are in both tables   ######################
 
-def check_2_1(target, targetdbs, target_PK, parent_query, prod_ids, connection):
+@instrumented(check="2.1", table_argument="target")
+def check_2_1(target, targetdbs, target_PK, parent_query, prod_ids, connection, profile=None):
     """ Utility function for undertaking check 2.1, checks that primary key or composite PK key count between union and base tables is the same 
 	Inputs:
 	  target -  string base table name  - e.g. fact_encounter
@@ -101,6 +386,7 @@ def check_2_1(target, targetdbs, target_PK, parent_query, prod_ids, connection):
                         note: this is derived from the index for the id/column to be counted in base table - col 0 (1) for jj_base_tables.fact_encounter
                               within the input section for each client          
           parent_query - the corresponding query for the corresponding prod union - jj_prod_union.menicon_encounters, col 0 (id)
+          profile - optional dict from profile_2_table, if given the base PK count is taken from this rather than re-scanning the base table
 	 Output:
 	  bool - True/False - 1/0
      Comments:
@@ -111,6 +397,7 @@ def check_2_1(target, targetdbs, target_PK, parent_query, prod_ids, connection):
     # will return true so does not appear in errors/warnings.
     if parent_query == []:
         print(f"Check 2.1 skipped for {target}--not appropriate")
+        record_outcome(True, skipped=True)
         return True, f"Check 2.1 skipped for {target}--not appropriate"
         
     # check if PK is a composite PK so a list, if so need to concat into correct format- otherwise leave as single column string:
@@ -123,15 +410,19 @@ def check_2_1(target, targetdbs, target_PK, parent_query, prod_ids, connection):
         # then need to concat into string of multiple PK columns:
         prod_ids = ','.join(prod_ids)
         
-    # Getting PK count query
-    base_query = pd.read_sql("""
-                            SELECT COUNT(DISTINCT {}) AS COUNT  FROM {}.{} 
-                            """.format(target_PK, targetdbs, target ), connection)
-    # actual count for base
-    base_count = list(base_query["COUNT"])[0]      
+    if profile is not None:
+        # base PK count already taken in the table profile scan
+        base_count = profile["distinct_pks"]
+    else:
+        # Getting PK count query
+        base_query = run_query("""
+                                SELECT COUNT(DISTINCT {}) AS COUNT  FROM {}.{} 
+                                """.format(target_PK, targetdbs, target ), connection)
+        # actual count for base
+        base_count = list(base_query["COUNT"])[0]      
 
     # Getting parent count athena query
-    parent_query = pd.read_sql("""
+    parent_query = run_query("""
                                     SELECT COUNT(DISTINCT {}) AS COUNT {}
     
                                 """.format(prod_ids, parent_query), connection)
@@ -142,13 +433,15 @@ def check_2_1(target, targetdbs, target_PK, parent_query, prod_ids, connection):
 
     print("Check 2.1 (same PK count): ", parent_count== base_count, target, parent_count, base_count)
     # check result
+    record_outcome(parent_count== base_count, parent_count=parent_count, base_count=base_count)
     return parent_count== base_count, f"{parent_count== base_count} {target} {parent_count} {base_count}"
 
 #check_dictionary["2.1"] = check_2_1
 
 ######################### Check 2.2 definition - Check for base table, that primary key of union primary keys & base primary keys are the same   ############################################################################
 
-def check_2_2(target,targetdbs, target_PK, parent_query, prod_ids, connection):
+@instrumented(check="2.2", table_argument="target")
+def check_2_2(target,targetdbs, target_PK, parent_query, prod_ids, connection, sample_size=10, mode="engine", parent_connection=None, memory_limit_bytes=512 * 1024 ** 2):
     """ Utility function for undertaking check 2.2, checks that primary key or composite PK key of base are all in primary key of union table
 	Inputs:
 	      target -  string base table name  - e.g. fact_encounter
@@ -157,53 +450,117 @@ def check_2_2(target,targetdbs, target_PK, parent_query, prod_ids, connection):
                         note: this is derived from the index for the id/column to be counted in base table - col 0 (1) for jj_base_tables.fact_encounter
                               within the input section for each client
           parent_query - the corresponding query for the corresponding prod union - jj_prod_union.menicon_encounters, col 0 (id)
+          sample_size - int max no. of mismatched primary keys brought back for the failure message (default 10)
+          mode - "engine" (default) compares the keys in athena, "stream" reads both key columns in chunks and compares them as hashed keys
+                 with bounded memory (key_diff.stream_key_diff) - for a parent_query which cannot be joined in athena (e.g. from another catalog)
+                 or "buckets" compares the keys in athena by hash buckets, drilling down only into buckets that differ (key_diff.bucket_key_diff)
+                 - a few small queries to find a handful of bad keys in a large table, falling back to "engine" if the keys differ in too many buckets
+          parent_connection - optional connection for the parent_query in stream mode (defaults to connection)
+          memory_limit_bytes - int max bytes of hashed keys held in memory in stream mode before being spilled to disk
 	 Output:
 	  bool - True/False - 1/0
      Comments:
           1. parent_query needs to provide the FROM section of query string only for prod table-if nested query then needs to be in format -> FROM ( <nested inner query>)
           with an id being needed in the output-as this will be counted
+          2. the key comparison is done in athena as a FULL OUTER JOIN of the distinct keys of both sides, so only the counts of missing keys 
+          (and a sample of them on failure) are brought back - memory use does not grow with table size
     """
     # for base tables where checking the count of the base table against the prod table does not make sense, will skip this check when requiried. e.g. dim_domain, dim-pathways
     # will return true so does not appear in errors/warnings.
     if parent_query == []:
         print(f"Check 2.2 skipped for {target}-not appropriate")
+        record_outcome(True, skipped=True)
         return True, f"Check 2.2 skipped for {target}-not appropriate"
 
-        # check if PK is a composite PK so a list, if so need to concat into correct format- otherwise leave as single column string:
-    if type(target_PK) == list:
-        # then need to concat into string of multiple PK columns:
-        target_PK = ','.join(target_PK)
-        
-    # check if PK is a composite PK so a list, if so need to concat into correct format- otherwise leave as single column string:
-    if type(prod_ids) == list:
-        # then need to concat into string of multiple PK columns:
-        prod_ids = ','.join(prod_ids)
-        
-    # Getting PK count query
-    base_query = pd.read_sql("""
-                            SELECT {} AS PK_base  FROM {}.{} 
-                            """.format(target_PK, targetdbs, target ), connection)
-    # actual count for base
-    base_set = set(base_query["PK_base"])   
-        
-    # Getting union count query
-    parent_query = pd.read_sql("""
-                                    SELECT DISTINCT CONCAT('', {}) AS union_PK {}
-    
-                                """.format(prod_ids, parent_query), connection)
-
-    # actual count for union source table
-    union_set = set(parent_query["union_PK"]) 
-    
-    print("Check 2.2 (same distinct PKs): ", (len(union_set.intersection(base_set)) == len(union_set)) and (len(base_set.intersection(union_set)) == len(base_set)), target,  targetdbs )
-    # check result: Logic - the intersection between base primary keys and union primary keys are the same - i.e. same primary keys in both base & union
-    return (len(union_set.intersection(base_set)) == len(union_set)) and (len(base_set.intersection(union_set)) == len(base_set)), f"{(len(union_set.intersection(base_set)) == len(union_set)) and (len(base_set.intersection(union_set)) == len(base_set))} {target} {targetdbs}"  
+    if mode == "stream":
+        # reading both key columns a chunk at a time, comparing as hashed keys - no samples of the keys are available in this mode
+        key_counts = stream_key_diff("""
+                                        SELECT COALESCE({}, '<NULL>') AS pk
+                                        FROM {}.{}
+                                    """.format(pk_expression(target_PK), targetdbs, target),
+                                    """
+                                        SELECT COALESCE(CONCAT('', {}), '<NULL>') AS pk
+                                        {}
+                                    """.format(pk_list(prod_ids), parent_query),
+                                    connection, union_connection=parent_connection, memory_limit_bytes=memory_limit_bytes)
+        missing_from_union = key_counts["missing_from_union"]
+        missing_from_base = key_counts["missing_from_base"]
+        check_bool = missing_from_union == 0 and missing_from_base == 0
+        print("Check 2.2 (same distinct PKs): ", check_bool, target,  targetdbs, missing_from_union, missing_from_base)
+        record_outcome(check_bool, missing_from_union=missing_from_union, missing_from_base=missing_from_base)
+        return check_bool, f"{check_bool} {target} {targetdbs} base PKs missing from union: {missing_from_union} union PKs missing from base: {missing_from_base} []"
+
+    if mode == "buckets":
+        key_counts = bucket_key_diff("""
+                                        SELECT COALESCE({}, '<NULL>') AS pk
+                                        FROM {}.{}
+                                    """.format(pk_expression(target_PK), targetdbs, target),
+                                    """
+                                        SELECT COALESCE(CONCAT('', {}), '<NULL>') AS pk
+                                        {}
+                                    """.format(pk_list(prod_ids), parent_query),
+                                    connection, sample_size=sample_size)
+        if key_counts is not None:
+            missing_from_union = key_counts["missing_from_union"]
+            missing_from_base = key_counts["missing_from_base"]
+            check_bool = missing_from_union == 0 and missing_from_base == 0
+            print("Check 2.2 (same distinct PKs): ", check_bool, target,  targetdbs, missing_from_union, missing_from_base)
+            record_outcome(check_bool, missing_from_union=missing_from_union, missing_from_base=missing_from_base)
+            return check_bool, f"{check_bool} {target} {targetdbs} base PKs missing from union: {missing_from_union} union PKs missing from base: {missing_from_base} {key_counts['sample']}"
+        print(f"Check 2.2 keys differ in too many hash buckets for {target} - comparing all keys")
+
+    # distinct base & union keys as strings (composite keys concatenated), with NULL keys matching each other as they would in a python set
+    key_comparison = """
+                        WITH base_keys AS (
+                            SELECT DISTINCT COALESCE({}, '<NULL>') AS pk
+                            FROM {}.{}
+                        ),
+                        union_keys AS (
+                            SELECT DISTINCT COALESCE(CONCAT('', {}), '<NULL>') AS pk
+                            {}
+                        ),
+                        compared_keys AS (
+                            SELECT base_keys.pk AS base_pk, union_keys.pk AS union_pk
+                            FROM base_keys
+                            FULL OUTER JOIN union_keys ON base_keys.pk = union_keys.pk
+                        )
+                    """.format(pk_expression(target_PK), targetdbs, target, pk_list(prod_ids), parent_query)
+
+    # Getting counts of keys missing from each side
+    missing_query = run_query(key_comparison + """
+                            SELECT
+                                COALESCE(SUM(CASE WHEN union_pk IS NULL THEN 1 ELSE 0 END), 0) AS missing_from_union,
+                                COALESCE(SUM(CASE WHEN base_pk IS NULL THEN 1 ELSE 0 END), 0) AS missing_from_base
+                            FROM compared_keys
+                            """, connection)
+    missing_from_union = int(list(missing_query["missing_from_union"])[0])
+    missing_from_base = int(list(missing_query["missing_from_base"])[0])
+
+    # check result: Logic - no primary keys in base which are not in union & vice versa - i.e. same primary keys in both base & union
+    check_bool = missing_from_union == 0 and missing_from_base == 0
+
+    # on failure, bring back a bounded sample of the offending keys for the failure message
+    missing_sample = list()
+    if check_bool == False and sample_size > 0:
+        sample_query = run_query(key_comparison + """
+                            SELECT base_pk, union_pk
+                            FROM compared_keys
+                            WHERE base_pk IS NULL OR union_pk IS NULL
+                            LIMIT {}
+                            """.format(sample_size), connection)
+        for base_pk, union_pk in zip(sample_query["base_pk"], sample_query["union_pk"]):
+            missing_sample.append(("not in union", base_pk) if is_null(union_pk) else ("not in base", union_pk))
+
+    print("Check 2.2 (same distinct PKs): ", check_bool, target,  targetdbs, missing_from_union, missing_from_base)
+    record_outcome(check_bool, missing_from_union=missing_from_union, missing_from_base=missing_from_base)
+    return check_bool, f"{check_bool} {target} {targetdbs} base PKs missing from union: {missing_from_union} union PKs missing from base: {missing_from_base} {missing_sample}"
 
 #check_dictionary["2.2"] = check_2_2
 
 ######################### Check 2.3 definition - Check that every primary key is unique within base tables ############################################################################
 
-def check_2_3(target, targetdbs, target_PK, connection):
+@instrumented(check="2.3", table_argument="target")
+def check_2_3(target, targetdbs, target_PK, connection, profile=None):
     """ Utility function for undertaking check 2.3, checks that every primary key is unique - for base tables this is only the primary id and not the update time	
      Inputs:
 	      target -  string base table name  - e.g. fact_encounter
@@ -211,6 +568,7 @@ def check_2_3(target, targetdbs, target_PK, connection):
           target_PK - the list or string of the primary key columns of table - e.g. encounter_id or if composite (pathway_name, region) as list
                         note: this is derived from the index for the id/column to be counted in base table - col 0 (1) for jj_base_tables.fact_encounter
                               within the input section for each client
+          profile - optional dict from profile_2_table, if given the duplicate key count is taken from this rather than re-scanning the base table
 	 Output:
 	       bool - True/False - 1/0
      Comments:
@@ -219,23 +577,29 @@ def check_2_3(target, targetdbs, target_PK, connection):
     if type(target_PK) == list:
         # then need to concat into string of multiple PK columns:
         target_PK = ','.join(target_PK)
-        
-    # Getting PK count query
-    base_query = pd.read_sql("""
-                                SELECT 
-                                    {} AS PK_base, COUNT(*) AS COUNTER 
-                                FROM {}.{} 
-                                GROUP BY {}
-                                HAVING COUNT(*) > 1
-                            """.format(target_PK, targetdbs, target, target_PK), connection)
-
-    # check if there are any primary keys within this table - indicating duplicate primary keys - count > 1 so length of column turned to set > 0
-    base_set = set(base_query["PK_base"])   
-    base_list = list(base_query["PK_base"])
-    dup_keys = len(base_set)
+
+    if profile is not None:
+        # duplicate keys already counted in the table profile scan
+        dup_keys = profile["duplicate_pks"]
+        base_list = range(dup_keys)
+    else:
+        # Getting PK count query
+        base_query = run_query("""
+                                    SELECT 
+                                        {} AS PK_base, COUNT(*) AS COUNTER 
+                                    FROM {}.{} 
+                                    GROUP BY {}
+                                    HAVING COUNT(*) > 1
+                                """.format(target_PK, targetdbs, target, target_PK), connection)
+
+        # check if there are any primary keys within this table - indicating duplicate primary keys - count > 1 so length of column turned to set > 0
+        base_set = set(base_query["PK_base"])   
+        base_list = list(base_query["PK_base"])
+        dup_keys = len(base_set)
     print("Check 2.3 (unique PKs): ",dup_keys ==0, target, dup_keys)
     
     # return whether this test is true - passed - or false - failed for not containing any duplicate primary keys/primary keys are unique
+    record_outcome(dup_keys ==0, duplicate_pks=dup_keys)
     return dup_keys ==0, f"{dup_keys ==0} {target} {dup_keys} {target_PK} {targetdbs} { len(base_list) }"
 
 #check_dictionary["2.3"] = check_2_3
@@ -243,6 +607,7 @@ def check_2_3(target, targetdbs, target_PK, connection):
 
 ######################### Check 2.4 definition - Check that for a base table which has a column which has an assumption based on a definition, that definition is up-to-date with all definition values - e.g. ecp roles   ############################################################################
 
+@instrumented(check="2.4", table_argument="definition")
 def check_2_4(definition, look_up_database, look_up_table, look_up_column, connection):
         """ Utility function for check 2.4, checking that defintion look-up tables are up-to-date - ie no new values in prod which are not in exclusion set & in look-up table
                 Inputs:
@@ -256,7 +621,7 @@ def check_2_4(definition, look_up_database, look_up_table, look_up_column, conne
         """
 
         # Getting the definition values for base look-up table:
-        base_query = pd.read_sql("""
+        base_query = run_query("""
                                     SELECT DISTINCT {}
                                     FROM {}.{}
                                     WHERE look_up_inclusion_flag IS NULL -- looking to see if any null look-up values
@@ -268,10 +633,12 @@ def check_2_4(definition, look_up_database, look_up_table, look_up_column, conne
         print("Check 2.4 (no missed/uncategorised look-up values): ", len(base_set)==0, f'- current missing/uncategorised ({definition}) definition values for column ({look_up_column}) in database ({look_up_table}) are:',base_set)
 
         # Checking that after excluding all definition values that do not fit the definition, that there are no news one which have been missed from the base defintion look-up table
+        record_outcome(len(base_set)==0, missing_values=len(base_set))
         return len(base_set)==0, f"{len(base_set)==0} - current missing/uncategorised ({definition}) definition values for column ({look_up_column}) in database ({look_up_table}) are: {base_set}"
 
 ######################### Check 2.5 definition - a warning check function for tracking the number of a particular object - e.g. no. null countries for orgs   ############################################################################
 
+@instrumented(check="2.5", table_argument="tracking_name")
 def check_2_5(tracking_name, tracking_query, expected_result, connection):
         """ Utility function for check 2.5, a function for tracking a query output on the base tables (though could be from any table/database) (e.g. number of null countries) whereby output should be none.
                 Inputs:
@@ -283,39 +650,111 @@ def check_2_5(tracking_name, tracking_query, expected_result, connection):
                     bool - True/False - 1/0
         """
         # run the tracking query - this needs to result in a count, with the final select being named as count
-        tracked_output = pd.read_sql(tracking_query ,connection)
+        tracked_output = run_query(tracking_query ,connection)
         # pulling out the count of tracked thing as an integer for comparison
         tracked_output = tracked_output['count'][0]
         
         # Checking tracked output against the expected output:
         check_bool = tracked_output == expected_result
         
+        record_outcome(check_bool, tracked_output=tracked_output, expected_result=expected_result)
         return check_bool, f"Check 2.5: {check_bool} | tracked object: {tracking_name} | tracked no. : {tracked_output} | expected no.: {expected_result} "
         
 
 ## DEFINING STAGE THREE FUNCTIONS:
+
+@instrumented(check="3.1, 3.2 & 3.4", table_argument="dash_table")
+def dashboard_table_sums(dash_table, dash_database, dashboard_statistics, connection, schemas=None):
+    """ Utility function for getting the sums of many dashboard statistics of one dashboard table in a single scan
+        Inputs:
+            dash_table - string dashboard table name - e.g. overview_weekly
+            dash_database - string dashboard database name - e.g. jj_dashboard_tables
+            dashboard_statistics - list of string statistic (column) names - e.g. ['no_patients', 'no_appointments']
+            connection - the athena aws connection object
+            schemas - optional catalog.schema_cache for checking if the table has a pathway_name column, defaults to the shared schema cache
+        Output:
+            DataFrame - one row per pathway_name with a SUM column per statistic, or a single row of SUMs (no pathway_name column) if the table has no pathways
+                        - this can be passed as pathways to check_3_2 & check_3_4
+    """
+    if schemas is None:
+        schemas = shared_schema_cache
+
+    statistic_sums = ", ".join("SUM({}) AS {}".format(statistic, statistic) for statistic in dict.fromkeys(dashboard_statistics))
+    if schemas.has_column(dash_database, dash_table, "pathway_name", connection):
+        return run_query("""
+            SELECT 
+                pathway_name, {} 
+            FROM {}.{} 
+            GROUP BY pathway_name
+        """.format(statistic_sums, dash_database, dash_table), connection)
+    return run_query("""
+            SELECT 
+                {} 
+            FROM {}.{} 
+        """.format(statistic_sums, dash_database, dash_table), connection)
+
+
 ######################### Check 3.1 definition - Check 1 for stage 3 Dashboard checks - check that if multiple pathways for a dashboard statistic, 
 #                                   then make sure select all == sum of individual pathways in dashboard table alone - e.g. menicon ############################################################################
 
-def check_3_1(pathway_set, pathways, dashboard_stat, base_PK_by_pathways, connection):
-    """ Utility function for undertaking check 3.2, checks that select all == individual pathway sums"""
+def pathway_overlap_counts(base_PK_by_pathways, connection):
+    """ Utility function for counting ids (e.g. patients) which are on more than one pathway, computed in athena so only two values come back
+        Inputs:
+            base_PK_by_pathways - string query giving (id, pathway_name) rows - id must be the first column
+            connection - the athena aws connection object
+        Output:
+            dict - {"pathway_id_sum": sum over pathways of distinct ids on each pathway, "distinct_ids": distinct ids over all pathways}
+                   - the no. of ids counted more than once when summing pathways is pathway_id_sum - distinct_ids (exact however many pathways an id is on)
+        Comments:
+            1. the query's columns are named positionally (pathway_ids (pathway_id, pathway_name)), so the id column's name is not needed - athena
+               needs the query to give exactly these two columns, otherwise (or if the query cannot be run as a CTE) the rows are fetched & counted here
+            2. only the engine's query errors (backends.sql_backend.query_errors) fall back to counting the rows - any other error is raised, and a
+               query the engine cannot run at all raises its error from the fallback
+    """
+    # the query is put on its own lines without any trailing semicolon, so it can be run as a CTE (a -- comment on its last line ends at the line end)
+    pathway_query = base_PK_by_pathways.strip().rstrip(";").rstrip()
+    try:
+        overlap_query = run_query("""
+                        WITH pathway_ids (pathway_id, pathway_name) AS (
+{}
+                        )
+                        SELECT
+                            (SELECT SUM(pathway_id_count)
+                             FROM (SELECT pathway_name, COUNT(DISTINCT pathway_id) AS pathway_id_count FROM pathway_ids GROUP BY pathway_name) AS per_pathway) AS pathway_id_sum,
+                            (SELECT COUNT(DISTINCT pathway_id) FROM pathway_ids) AS distinct_ids
+                    """.format(pathway_query), connection)
+    except as_backend(connection).query_errors() as error:
+        print("Pathway overlap could not be counted in the query engine, counting from the query rows: ", error)
+        pathway_ids = run_query(base_PK_by_pathways, connection)
+        base_id = pathway_ids.columns[0]
+        return {"pathway_id_sum": int(pathway_ids.groupby("pathway_name", dropna=False)[base_id].nunique().sum()), "distinct_ids": int(pathway_ids[base_id].nunique())}
+
+    pathway_id_sum = list(overlap_query["pathway_id_sum"])[0]
+    # no rows gives a NULL sum
+    if is_null(pathway_id_sum):
+        pathway_id_sum = 0
+    return {"pathway_id_sum": int(pathway_id_sum), "distinct_ids": int(list(overlap_query["distinct_ids"])[0])}
+
+
+@instrumented(check="3.1", table_argument="dashboard_stat")
+def check_3_1(pathway_set, pathways, dashboard_stat, base_PK_by_pathways, connection, overlap_in_engine=True):
+    """ Utility function for undertaking check 3.2, checks that select all == individual pathway sums
+        overlap_in_engine - bool, if True (default) ids on multiple pathways are counted in athena (pathway_overlap_counts) - exact for ids on any no. of pathways,
+                            if False the (id, pathway_name) rows are brought back and every pair of pathways intersected in python"""
+
+    # pathway sums indexed by pathway name, so all pathways are looked up at once rather than one boolean mask per pathway
+    pathway_sums = pathways.drop_duplicates("pathway_name").set_index("pathway_name")["{}".format(dashboard_stat)]
 
     # get the select all total:
-    select_all_total = list(pathways[pathways["pathway_name"] == "Select all"]["{}".format(dashboard_stat)])[0]
+    select_all_total = pathway_sums[["Select all"]].tolist()[0]
 
-    # sum variable for capturing aggregated sum of pathways
-    pathway_total = 0
-    pathway_counts = list()
-    pathway_counts.append( (list(pathways[pathways["pathway_name"] == "Select all"]["{}".format(dashboard_stat)])[0],  "Select all") )
     # remove select all from pathway_set, so only non-select all pathways:
     pathway_set.remove("Select all")
 
-    # getting sum of specific pathways (other than select all):
-    for pathway in pathway_set:
-        pathway_sum = list(pathways[pathways["pathway_name"] == pathway]["{}".format(dashboard_stat)])[0]
-        # Incrementing pathway total
-        pathway_total = pathway_total + pathway_sum
-        pathway_counts.append((pathway_sum, pathway))
+    # getting sum of specific pathways (other than select all) - a missing sum is kept as NaN so the check fails rather than being skipped:
+    specific_pathway_sums = pathway_sums[pathway_sums.index.isin(pathway_set)]
+    pathway_total = specific_pathway_sums.sum(skipna=False)
+    pathway_counts = [(select_all_total, "Select all")] + list(zip(specific_pathway_sums.tolist(), specific_pathway_sums.index.tolist()))
 
     # If for this dash statistic, there is a possibility of a single entity - e.g. patient - being over mutiple pathways and being counted twice
     # then we need to minus from the pathway total (pathways added together - not select all) - we do this by minusing the number of ids shared on a pair of pathways:
@@ -324,9 +763,18 @@ def check_3_1(pathway_set, pathways, dashboard_stat, base_PK_by_pathways, connec
     # record no intersections (e.g. same patients on diff pathways) to be minuses from select all at end
     no_intersections = 0
     
-    if base_PK_by_pathways != []:
+    if base_PK_by_pathways != [] and overlap_in_engine == True:
+        # then this is a statstic we need to account for multiple ids between pathways - to avoid being counted more than once against select all
+        # the extra counts of ids are the sum of each pathway's distinct ids less the distinct ids over all pathways
+        overlap_counts = pathway_overlap_counts(base_PK_by_pathways, connection)
+        no_intersections = overlap_counts["pathway_id_sum"] - overlap_counts["distinct_ids"]
+
+        # now we have number of extra counts of entities (e.g. patients) on multiple pathways we can factor this into our pathway total for comparison against select all
+        pathway_total = pathway_total - no_intersections
+
+    elif base_PK_by_pathways != []:
         # then read in base_PK_by_pathways and this is a statstic we need to account for multiple ids between pathways - to avoid being counted twice against select all
-        base_PK_by_pathways = pd.read_sql(base_PK_by_pathways,connection)
+        base_PK_by_pathways = run_query(base_PK_by_pathways,connection)
 
         # for each pathway get the set of unique base ids
         pathway_dict = dict()
@@ -345,6 +793,7 @@ def check_3_1(pathway_set, pathways, dashboard_stat, base_PK_by_pathways, connec
     # confirming that select all == (all pathway sums added together)
     print('Check 3.1 (select all == pathway sum):', select_all_total == pathway_total, dashboard_stat, select_all_total,  pathway_total)
     
+    record_outcome(select_all_total == pathway_total, select_all_total=select_all_total, pathway_total=pathway_total, overlap=no_intersections)
     return select_all_total == pathway_total, f" {select_all_total} == {pathway_total}, {select_all_total},  {pathway_total} {pathway_counts} {dashboard_stat} over multiple pathways accounted for {no_intersections}"
 
 ######################### Check 3.2 definition - Check 2 for stage 3 Dashboard checks - checking NON-cumulative & NON-onboard user dashboard statistics & check 3.1  ############################################################################
@@ -352,9 +801,13 @@ def check_3_1(pathway_set, pathways, dashboard_stat, base_PK_by_pathways, connec
 # in future, should add in method for inference of schema from each script for prod, union, base table, end-point tables
 # and matching of primary keys together
 
-def check_3_2(dashboard_statistic, base_statistic_query, dash_table, dash_database, base_PK_by_pathways, connection):
+@instrumented(check="3.2", table_argument="dash_table")
+def check_3_2(dashboard_statistic, base_statistic_query, dash_table, dash_database, base_PK_by_pathways, connection, schemas=None, scalar_results=None, pathways=None):
     """ Utility function for undertaking check 3.2, checks that a dashboard statistic in end-point dashboard table has the same sum as when calculated 
-    directly off the relevant base tables and checks that check 3.1 is true"""
+    directly off the relevant base tables and checks that check 3.1 is true
+    (whether the dashboard table has a pathway_name column is looked up in schemas - a catalog.schema_cache, defaulting to the shared schema cache,
+    the base statistic is taken from scalar_results - from execution.run_scalar_queries - if given, and the dashboard sums are taken from 
+    pathways - from dashboard_table_sums - if given, rather than querying the dashboard table)"""
     # Calculating the sum for the dashboard statistic
     dash_statistic_query = """
                                     SELECT SUM({}) 
@@ -366,21 +819,30 @@ def check_3_2(dashboard_statistic, base_statistic_query, dash_table, dash_databa
     # creating defaiult bool for check1
     check3_1 = True, f""
 
-    # checking if pathway_name column:
-    pathway_check = pd.read_sql(
-    """
-        SELECT *
-        FROM {}.{} 
-    """.format(dash_database, dash_table) ,connection).columns
+    # dashboard sums already fetched for all statistics of this dashboard table
+    table_sums = pathways
 
-    if "pathway_name" in set(pathway_check):
+    # checking if pathway_name column (from the catalog - no table data is read):
+    if schemas is None:
+        schemas = shared_schema_cache
 
-        pathways = pd.read_sql("""
-            SELECT 
-                pathway_name, SUM({}) as {} 
-            FROM {}.{} 
-            GROUP BY pathway_name
-        """.format(dashboard_statistic, dashboard_statistic, dash_database, dash_table) ,connection)
+    if table_sums is not None:
+        has_pathways = "pathway_name" in table_sums.columns
+    else:
+        has_pathways = schemas.has_column(dash_database, dash_table, "pathway_name", connection)
+
+    select_all = False
+    if has_pathways:
+
+        if table_sums is not None:
+            pathways = table_sums[["pathway_name", dashboard_statistic]]
+        else:
+            pathways = run_query("""
+                SELECT 
+                    pathway_name, SUM({}) as {} 
+                FROM {}.{} 
+                GROUP BY pathway_name
+            """.format(dashboard_statistic, dashboard_statistic, dash_database, dash_table) ,connection)
 
         # getting all distinct pathway name values
         pathway_set = set(pathways["pathway_name"])
@@ -391,38 +853,43 @@ def check_3_2(dashboard_statistic, base_statistic_query, dash_table, dash_databa
         if "Select all" in pathway_set:
             # then will need to compare select all against overall base table statistic - because sum over dashboard statistic would be wrong for check 3.1
             dash_statistic_query = dash_statistic_query + " WHERE pathway_name = 'Select all'"
+            select_all = True
 
             # furthermore, knowing that this is a multiple pathway, need to check that the pathways underlying the select all are also correct, so completeing a nested check for this
             check3_1 = check_3_1(pathway_set, pathways, dashboard_statistic, base_PK_by_pathways,connection) 
 
-    dash_statistic = pd.read_sql(dash_statistic_query, connection)
-    dash_statistic = list(dash_statistic["_col0"])[0]
+    if table_sums is None:
+        dash_statistic = run_query(dash_statistic_query, connection)
+        dash_statistic = list(dash_statistic["_col0"])[0]
+    elif select_all == True:
+        dash_statistic = list(pathways[pathways["pathway_name"] == "Select all"][dashboard_statistic])[0]
+    else:
+        # sum over all pathway rows (or the single row of a table without pathways) - NaN if every value is NULL, as SUM gives NULL
+        dash_statistic = table_sums[dashboard_statistic].sum(min_count=1)
 
     # Calculating the sum for base table query for the same statistic
-    base_statistic = pd.read_sql(base_statistic_query, connection)
-    base_statistic = list(base_statistic["_col0"])[0]
+    base_statistic = scalar_result(base_statistic_query, "_col0", connection, scalar_results)
 
     # check logic: both sums are equal
     print("Check 3.2 (base to dash same sum): ", base_statistic==dash_statistic, base_statistic,dash_statistic, dash_table, dashboard_statistic)
 
     # check that the base statistic query is equal to the sumed base dashboard statistic (check 3.2) 
     #    AND if is a multiple pathway that select all == sum of individual pathways in dashboard table alone (check 3.1)
+    record_outcome((base_statistic==dash_statistic) and (check3_1[0] == True), item=dashboard_statistic, base_statistic=base_statistic, dash_statistic=dash_statistic)
     return (base_statistic==dash_statistic) and (check3_1[0] == True), f" check3_1: {check3_1[0]} {check3_1[1]} | check3_2:  {base_statistic==dash_statistic} {base_statistic,dash_statistic} {dash_table} {dashboard_statistic} "
     
     ######################### Check 3.3 definition - Check 3 for stage 3 Dashboard checks - checking cumulative  statistics   ############################################################################
 
-def check_3_3(cumulative_dash_query, base_dash_query, regions, cumulative_dash_statistic, connection):
-    """ Utility function to test that for the cumulative table, if select all than this is equal the overall base statistic total - query should be by country summed   """
+@instrumented(check="3.3", table_argument="cumulative_dash_statistic")
+def check_3_3(cumulative_dash_query, base_dash_query, regions, cumulative_dash_statistic, connection, scalar_results=None):
+    """ Utility function to test that for the cumulative table, if select all than this is equal the overall base statistic total - query should be by country summed
+    (query results are taken from scalar_results - from execution.run_scalar_queries - if given)   """
     
     # read in the cumulative data table from athena for all regions, maxing for last cumulative total for each regions + pathway
-    cumulative_dash_query = pd.read_sql(cumulative_dash_query, connection)
+    cum_sum = scalar_result(cumulative_dash_query, "count", connection, scalar_results)
     
     # read in the base data table from athena for the overall count of the dash statistic over all regions
-    base_dash_read = pd.read_sql(base_dash_query, connection)
-    
-    # checking by country cumulative sum is equal to base stat
-    cum_sum = cumulative_dash_query['count'][0]
-    base_cnt = base_dash_read['count'][0]
+    base_cnt = scalar_result(base_dash_query, "count", connection, scalar_results)
     
     # checking result var
     check_bool = bool(cum_sum == base_cnt)
@@ -430,134 +897,188 @@ def check_3_3(cumulative_dash_query, base_dash_query, regions, cumulative_dash_s
     # completing check for 3.3, if any failures in pathway+region cumulative totals not adding up  or the overall select all not adding up to base query then inconsistency in cumualtive:
     print("Check 3.3 (select all == cumulative total): ", check_bool == 1,base_cnt, cum_sum, cumulative_dash_statistic)
 	
+    record_outcome(check_bool, base_count=base_cnt, cumulative_total=cum_sum)
     return check_bool, f"{check_bool == 1} {base_cnt} {cum_sum} {cumulative_dash_statistic}"
     
     
 
     ######################### Check 3.4 definition - Check 3 for stage 3 Dashboard checks - checking onboard (single-level pathway)  statistics  -where sum would not work over multiple pathways ############################################################################
-def check_3_4(dashboard_statistic, dash_database, dash_table, base_statistic_query, connection):
-    """ Utility function to test check 3.4, which computes if a dashboard statistic, which cannot be summed across pathways as same for all - e.g. onboarded users is the same as base    """
+@instrumented(check="3.4", table_argument="dash_table")
+def check_3_4(dashboard_statistic, dash_database, dash_table, base_statistic_query, connection, schemas=None, scalar_results=None, pathways=None):
+    """ Utility function to test check 3.4, which computes if a dashboard statistic, which cannot be summed across pathways as same for all - e.g. onboarded users is the same as base
+    (whether the dashboard table has a pathway_name column is looked up in schemas - a catalog.schema_cache, defaulting to the shared schema cache,
+    the base statistic is taken from scalar_results - from execution.run_scalar_queries - if given, and the dashboard sums are taken from 
+    pathways - from dashboard_table_sums - if given, rather than querying the dashboard table)    """
+    if schemas is None:
+        schemas = shared_schema_cache
+
     #  getting all pathways for  dashboard statistic:
-    pathways = pd.read_sql("""
-        SELECT 
-            pathway_name, SUM({}) as {} 
-        FROM {}.{} 
-        GROUP BY pathway_name
-    """.format(dashboard_statistic, dashboard_statistic, dash_database, dash_table) ,connection)
-
-    # getting all distinct pathway name values
-    pathway_set = set(pathways["pathway_name"])
-
-
-    pathway_sum_list = list()
-    # for all pathways add the sum to a list, then sum this list, then divide by number of pathways - this should end up at the same number if all are equal as they are supposed to be
-    for pathway in pathway_set:
-        path_total = list(pathways[pathways["pathway_name"] == pathway]["{}".format(dashboard_statistic)])[0]
-        pathway_sum_list.append(path_total)
-    # now summing that list for sum across all pathways (including select all if present)
-    pathway_total_sum = sum(pathway_sum_list)
+    if pathways is not None:
+        # dashboard sums already fetched for all statistics of this dashboard table
+        if "pathway_name" in pathways.columns:
+            pathways = pathways[["pathway_name", dashboard_statistic]]
+        else:
+            # no pathways in this dashboard table - so the whole table is a single level
+            pathways = pathways[[dashboard_statistic]].assign(pathway_name="Select all")
+    elif schemas.has_column(dash_database, dash_table, "pathway_name", connection):
+        pathways = run_query("""
+            SELECT 
+                pathway_name, SUM({}) as {} 
+            FROM {}.{} 
+            GROUP BY pathway_name
+        """.format(dashboard_statistic, dashboard_statistic, dash_database, dash_table) ,connection)
+    else:
+        # no pathways in this dashboard table - so the whole table is a single level
+        pathways = run_query("""
+            SELECT 
+                'Select all' AS pathway_name, SUM({}) as {} 
+            FROM {}.{} 
+        """.format(dashboard_statistic, dashboard_statistic, dash_database, dash_table) ,connection)
+
+    # sum for each distinct pathway name value
+    pathway_sums = pathways.drop_duplicates("pathway_name")[dashboard_statistic]
+
+    # for all pathways sum, then divide by number of pathways - this should end up at the same number if all are equal as they are supposed to be
+    # (sum across all pathways including select all if present)
+    pathway_total_sum = pathway_sums.sum(skipna=False)
     # no. of pathways
-    no_pathways = len(pathway_set)
-    # default bool for updating if a false level comparison with base statistic:
-    pathway_bool = True
+    no_pathways = len(pathway_sums)
         
     # now getting the base query total to make sure this is also the same 
-    base_statistic = pd.read_sql(base_statistic_query, connection)
-    base_statistic = list(base_statistic["_col0"])[0]
+    base_statistic = scalar_result(base_statistic_query, "_col0", connection, scalar_results)
     
-    # list for recording the counts of each level for later printing
-    random_pathway_counts = list()
+    # the counts of each level for later printing
+    random_pathway_counts = list(zip(pathways.drop_duplicates("pathway_name")["pathway_name"].tolist(), pathway_sums.tolist()))
     
-    # for each pathway, pop and make sure is same sum as the base: break if either there is a false or empty stack:
-    while len(pathway_set) > 0 and pathway_bool != False:
-        # taking a pathway name from the set and getting the count to compare against base statistic
-        popped_pathway = pathway_set.pop()
-        random_pathway_count = list(pathways[pathways["pathway_name"] == popped_pathway]["{}".format(dashboard_statistic)])[0]
-        # add count to list for later printing in check output
-        random_pathway_counts.append((popped_pathway, random_pathway_count))
-        # comparing against base statistic and updating the pathway_bool (if false then will update otherwise will remain true)
-        pathway_bool = (random_pathway_count == base_statistic)
+    # make sure every pathway is same sum as the base:
+    pathway_bool = bool((pathway_sums == base_statistic).all())
 
     # bool for checking if all pathways are equal value across pathways, including select all and equal to the base statistic
     paths_equal_bool = pathway_total_sum / no_pathways == base_statistic
     
-    print("Check 3.4 (onboard stat dash->base same): ", (base_statistic == random_pathway_count and paths_equal_bool == True), dashboard_statistic)
+    print("Check 3.4 (onboard stat dash->base same): ", (pathway_bool == True and paths_equal_bool == True), dashboard_statistic)
     
     # Now having confirmed that all pathway counts are the same for this statistic, making sure that one of them is equal to the base table query for this statistic
+    record_outcome(pathway_bool == True and paths_equal_bool == True, item=dashboard_statistic, base_statistic=base_statistic, mean_pathway_total=pathway_total_sum / no_pathways)
     return pathway_bool == True and paths_equal_bool == True, f"{pathway_bool == True and paths_equal_bool == True} {dashboard_statistic} {random_pathway_counts} {base_statistic} {pathway_total_sum / no_pathways}"
 
     ######################### Check 3.5 definition - Check 3 for stage 3 Dashboard checks - checking onboard (single-level pathway)  statistics  -where sum would not work over multiple pathways ############################################################################
 
-def check_3_5(business_logic_query, base_stat_query,business_logic_name, connection):
+@instrumented(check="3.5", table_argument="business_logic_name")
+def check_3_5(business_logic_query, base_stat_query,business_logic_name, connection, scalar_results=None):
     """     General utility function to compare if two queries are the same, generalised for testing business logic queries against base table queries  or could also check between dashboard queries   
-               NOTE: Needs to be queries resulting in single counts/ count comparison  """
+               NOTE: Needs to be queries resulting in single counts/ count comparison (results are taken from scalar_results - from execution.run_scalar_queries - if given)  """
     
     # running the result for business logic
-    business_logic_query = pd.read_sql(business_logic_query, connection)
-    business_logic_query_result = list(business_logic_query["_col0"])[0]
+    business_logic_query_result = scalar_result(business_logic_query, "_col0", connection, scalar_results)
     
     # running the result for base query comparison
-    base_stat_query = pd.read_sql(base_stat_query, connection)
-    base_stat_query_result = list(base_stat_query["_col0"])[0]
+    base_stat_query_result = scalar_result(base_stat_query, "_col0", connection, scalar_results)
 
     # outputting result of comparison
     print(f"Check 3.5 (business logic-{business_logic_name}): ", (base_stat_query_result == business_logic_query_result), base_stat_query_result, business_logic_query_result)
 
     # returning whether business logic check was passed:
+    record_outcome(base_stat_query_result == business_logic_query_result, base_statistic=base_stat_query_result, business_logic_statistic=business_logic_query_result)
     return base_stat_query_result == business_logic_query_result, f"business logic-{business_logic_name}: {base_stat_query_result == business_logic_query_result} {base_stat_query_result} {business_logic_query_result}"
 
     ######################### Check 3.6 definition - essentially same as above - Check 3 for stage 3 Dashboard checks - Checking between dashboard figures or business logic totals within the dashboard
 
-def check_3_6(dash_query_1, dash_query_2,dash_test_name, logical_comparion_operator, connection):
-    """     General utility function to compare if two queries are the same, used in this case for two generic dashboard figures or queries  """
+@instrumented(check="3.6", table_argument="dash_test_name")
+def check_3_6(dash_query_1, dash_query_2,dash_test_name, logical_comparion_operator, connection, scalar_results=None):
+    """     General utility function to compare if two queries are the same, used in this case for two generic dashboard figures or queries
+            (results are taken from scalar_results - from execution.run_scalar_queries - if given)  """
     
     # running the result for dash query 1 comparison
-    dash_query_1 = pd.read_sql(dash_query_1, connection)
-    #print(dash_query_1)
-    dash1_query_result = list(dash_query_1["_col0"])[0]
+    dash1_query_result = scalar_result(dash_query_1, "_col0", connection, scalar_results)
     
     # running the result for dash query 2 comparison
-    dash_query_2 = pd.read_sql(dash_query_2, connection)
-    #print(dash_query_2)
-    dash2_query_result = list(dash_query_2["_col0"])[0]
+    dash2_query_result = scalar_result(dash_query_2, "_col0", connection, scalar_results)
 
     # outputting result of comparison
     print(f"Check 3.6 (within-dash check-{dash_test_name}): ", eval("{} {} {}".format(dash1_query_result, logical_comparion_operator,dash2_query_result)), dash2_query_result, dash1_query_result)
     # returning whether dash comparison check was passed: NOTE: this will evaluate the string as a logical expression - allowing for the logic operator to be dynamic
     output = eval("{} {} {}".format(dash1_query_result, logical_comparion_operator,dash2_query_result))
-    return eval("{} {} {}".format(dash1_query_result, logical_comparion_operator,dash2_query_result)), f"{output} {dash1_query_result} {logical_comparion_operator} {dash2_query_result}"
+    record_outcome(output, dash_statistic_1=dash1_query_result, dash_statistic_2=dash2_query_result)
+    return output, f"{output} {dash1_query_result} {logical_comparion_operator} {dash2_query_result}"
 
 
 ## DEFINING DRIVER FUNCTIONS - STAGE ONE
 
-def stage_1_driver(clients, validation_client, connection):
+@instrumented(stage="1", client_argument="validation_client")
+def stage_1_driver(clients, validation_client, connection, max_concurrent_queries=1, group_by_region=False, schemas=None, watermark_columns=None, watermarks=None, tables=None, row_counts=None):
     """
     Driver function for running the stage 2 checks above for a client
     Inputs:
         clients: to-do
         validation_client: to-do
+        max_concurrent_queries: int no. of checks (athena queries) to run at once over a thread pool - 1 (default) runs serially
+        group_by_region: bool - if True, each union table is scanned once with a GROUP BY region (union_region_counts) for all regions & NULL regions,
+                         rather than once per region for check 1.1 and again for check 1.2
+        schemas: optional catalog.schema_cache for listing each region's prod tables - defaults to the shared schema cache
+        watermark_columns: optional dict of table -> update time/partition column - with watermarks, checks 1.1 & 1.2 of these tables only count
+                           the rows past the stored watermark, added to the stored totals (see incremental_slice for the assumptions)
+        watermarks: optional watermarks.watermark_store the watermarks & totals are kept in (full_refresh=True for a full re-validation)
+        tables: optional list of union table names to check (default all tables of the regional prod databases) - e.g. for scheduler.run_check_dag
+        row_counts: optional table_statistics.glue_row_counts - prod & union (region partition) counts are taken from exact & fresh glue statistics
+                    where there are any, so only tables without these are scanned
     
             """ 
     # Checks being undertaken:
     #      1.1 - Check that for a prod region, there is same amount of rows for that region in union table
     #      1.2 - Check that for union table there is no null values
 
-    # 5 a. Obtain all possible union tables from all regions of client:
+    # 5 a. Obtain all possible union tables from all regions of client (all of the client's databases are loaded into the catalog in one query):
+    if schemas is None:
+        schemas = shared_schema_cache
+    schemas.load_client(clients, validation_client, connection)
+
+    checked_tables = tables
     tables = dict()
     for index in range(0, len(clients[validation_client].regions)): 
         region_database = clients[validation_client].prod_databases[index]
         region = clients[validation_client].regions[index]
-        tables_query = """
-                        SELECT TABLE_NAME 
-                        FROM information_schema.TABLES 
-                        WHERE (TABLE_SCHEMA = '{}') ;""".format(region_database)
-        #print(tables_query)
-        region_tables = set(pd.read_sql(tables_query , connection)["TABLE_NAME"])
+        region_tables = schemas.tables(region_database, connection)
+        if checked_tables is not None:
+            region_tables = region_tables & set(checked_tables)
 
     #     print(region_tables)
         tables[region] = region_tables, region_database
 
-    # Loop through each table between union database & prod database & complete checks for stage 1:
+    # If grouping by region, first get all region counts for each union table in one scan per table:
+    union_counts = dict()
+    if group_by_region == True:
+        union_tables = set()
+        for region in tables:
+            union_tables.update(tables[region][0])
+        # incrementally checked tables are not scanned in full
+        if watermarks is not None and watermark_columns is not None:
+            union_tables = union_tables - set(watermark_columns)
+        # tables with region counts in their partition statistics are not scanned
+        if row_counts is not None:
+            union_tables = set(table for table in union_tables if row_counts.partition_counts(clients[validation_client].client + "_prod_union", table, "region") is None)
+        count_calls = [(table, union_region_counts, dict(target=table, targetdbs=clients[validation_client].client + "_prod_union", connection=connection)) for table in union_tables]
+        union_counts = run_checks(count_calls, max_concurrent_queries)
+
+    # Building up every check call for stage 1, so these can be submitted concurrently if max_concurrent_queries > 1:
+    if watermark_columns is None:
+        watermark_columns = dict()
+    check_calls = list()
+    null_checked_tables = set()
+    for region in tables:
+        for table in tables[region][0]:
+            prod_database = tables[region][1]
+            check_calls.append((("1.1", region, table), check_1_1, dict(source=table,target=table,sourcedbs=prod_database, targetdbs=clients[validation_client].client + "_prod_union", region=region, connection=connection, union_counts=union_counts.get(table),
+                                                                        watermark_column=watermark_columns.get(table), watermarks=watermarks, row_counts=row_counts)))
+            # check 1.2 does not depend on region, so only needs to be run once per union table
+            if table not in null_checked_tables:
+                null_checked_tables.add(table)
+                check_calls.append((("1.2", table), check_1_2, dict(target=table, targetdbs=clients[validation_client].client + "_prod_union", connection=connection, union_counts=union_counts.get(table),
+                                                                    watermark_column=watermark_columns.get(table), watermarks=watermarks, row_counts=row_counts)))
+
+    check_results = run_checks(check_calls, max_concurrent_queries)
+
+    # Loop through each table between union database & prod database & record checks for stage 1 (same order as a serial run):
     #for table in region_tables:
     for region in tables:
         for table in tables[region][0]:
@@ -566,7 +1087,7 @@ def stage_1_driver(clients, validation_client, connection):
             # Undertaking checks for stage 1:
 
             #################################### Check 1.1: Check count of each region is correctly represented in union table ###########################################################
-            check1 = check_1_1(source=table,target=table,sourcedbs=prod_database, targetdbs=clients[validation_client].client + "_prod_union", region=region, connection=connection)
+            check1 = check_results[("1.1", region, table)]
 
                     # Adding failures from checks of stage 1 to client object:
             if check1[0] == False:
@@ -584,8 +1105,8 @@ def stage_1_driver(clients, validation_client, connection):
 
 
             #################################### Check 1.2: Check that there are no NULLS in region column of union table ###########################################################   
-            # This will only be run once per table (is outside of the region loop)
-            check2 = check_1_2(target=table, targetdbs=clients[validation_client].client + "_prod_union", connection=connection)
+            # This is only run once per table (result shared over the region loop)
+            check2 = check_results[("1.2", table)]
 
             if check2[0] == False:
                 #Then Check 1.2 has failed for this union table - create a node (if not already created for this table) and add its failure
@@ -601,7 +1122,8 @@ def stage_1_driver(clients, validation_client, connection):
                     clients[validation_client].failures[table].failures["1.2"] = "FAILURE: Check 1.2 - Table {}: has null region values for region column in union table - values: {}\n".format(table, check2[0])
     return clients
 
-def stage_2_driver(primary_parents, clients, validation_client, definition_check_dictionary, track_check_dict, connection):
+@instrumented(stage="2", client_argument="validation_client")
+def stage_2_driver(primary_parents, clients, validation_client, definition_check_dictionary, track_check_dict, connection, fused_profile=True, schemas=None, fingerprint_first=False, watermark_columns=None, watermarks=None, tables=None):
     """
     Driver function for running the stage 2 checks above for a client
     Inputs:
@@ -609,24 +1131,28 @@ def stage_2_driver(primary_parents, clients, validation_client, definition_check
         clients: to-do
         definition_check_dictionary: to-do
         validation_client: to-do
+        fused_profile: bool - if True (default), checks 2.1 & 2.3 are evaluated from one profile_2_table scan of each base table, rather than a scan each
+        schemas: optional catalog.schema_cache for looking up base table columns - defaults to the shared schema cache
+        fingerprint_first: bool - if True, a cheap key fingerprint (fingerprint_2_table) of each base table & union parent is compared first,
+                           and the exact checks 2.1 & 2.2 are only run for tables whose fingerprints differ - with fused_profile, the profile is
+                           taken in the fingerprint's scan of the base table, so a table whose fingerprints match is checked (2.1 - 2.3) with one
+                           query scanning the base table & union parent once each
+        watermark_columns: optional dict of base table -> load time/partition column (in the base table & union parent) - with watermarks,
+                           checks 2.1, 2.2 & 2.3 of these tables only look at the rows past the stored watermark (see incremental_2_table for the assumptions)
+        watermarks: optional watermarks.watermark_store the watermarks & totals are kept in (full_refresh=True for a full re-validation)
+        tables: optional list of base table names to check (default all tables of the base tables database) - e.g. for scheduler.run_check_dag
     
         """ 
-    # Getting list of all base tables
-    base = set(pd.read_sql("""
-                            SELECT DISTINCT TABLE_NAME 
-                            FROM information_schema.TABLES 
-                            WHERE (TABLE_SCHEMA = '{}') ;
-                            """.format(clients[validation_client].client + "_base_tables"), connection)["TABLE_NAME"])
-
-    # Getting primary keys for all base tables:
+    # Getting list of all base tables (from the schema cache - all of the client's databases are loaded in one information_schema query):
+    if schemas is None:
+        schemas = shared_schema_cache
+    schemas.load_client(clients, validation_client, connection)
+    base = schemas.tables(clients[validation_client].client + "_base_tables", connection)
+    if tables is not None:
+        base = base & set(tables)
+
+    # Getting primary keys for all base tables (from the schema cache):
     # Assumes that ID is always in the first column
-
-    primary_key_table = """
-                        SELECT 
-                            table_name, column_name
-                        FROM information_schema.COLUMNS 
-                        WHERE (TABLE_SCHEMA = '{}' ) ;""".format(clients[validation_client].client + "_base_tables")
-    primary_key_table = pd.read_sql(primary_key_table , connection)
     
     # loop over each base table in base table database:
     for table in base:
@@ -638,26 +1164,53 @@ def stage_2_driver(primary_parents, clients, validation_client, definition_check
             # get the indexe in base table which reflects PK of base table or multiple columns if PK is composite keys (e.g col0, col1 make up PK for base table):
             base_PK_index = primary_parents[table][0]
              # getting primary key for base table:
+            base_columns = schemas.table_columns(clients[validation_client].client + "_base_tables", table, connection)
             if type(base_PK_index) == list and  len(base_PK_index) > 1: # i.e. is a composite primary key:
-                base_PK = list(primary_key_table[primary_key_table.table_name == table]["column_name"])[base_PK_index[0]:base_PK_index[1] + 1]
+                base_PK = base_columns[base_PK_index[0]:base_PK_index[1] + 1]
             else:
-                base_PK = list(primary_key_table[primary_key_table.table_name == table]["column_name"])[base_PK_index]   
+                base_PK = base_columns[base_PK_index]   
 
             source_query = primary_parents[table][1]
 
             # getting prod ids
             prod_ids = primary_parents[table][2]
 
-            #################################### Check 2.1: Check that PK count of union table is the same as the PK count of the base table & that all PKs are in both tables ###########################################################   - NOTE: this will be done twice in loop, would be good to imrpove on this
-            check1 = check_2_1(table, clients[validation_client].client + "_base_tables", base_PK, source_query, prod_ids, connection)
+            # incrementally checking tables with a watermark column, for the rows past the stored watermark only:
+            incremental = watermarks is not None and watermark_columns is not None and table in watermark_columns and source_query != []
+
+            # if fingerprinting first, only running the exact checks 2.1 & 2.2 when the base & union key fingerprints differ
+            # (with the fused profile, this is taken in the same scan of the base table as the fingerprint):
+            fingerprint = None
+            if fingerprint_first == True and source_query != [] and not incremental:
+                fingerprint = fingerprint_2_table(table, clients[validation_client].client + "_base_tables", base_PK, source_query, prod_ids, connection, with_profile=fused_profile)
+
+            # getting the primary key statistics for checks 2.1 & 2.3 from one scan of the base table:
+            profile = None
+            if fingerprint is not None and "profile" in fingerprint:
+                profile = fingerprint["profile"]
+            elif fused_profile == True and not incremental:
+                profile = profile_2_table(table, clients[validation_client].client + "_base_tables", base_PK, connection)
+
+            if incremental:
+                check1, check2, check3 = incremental_2_table(table, clients[validation_client].client + "_base_tables", base_PK, source_query, prod_ids, watermark_columns[table], watermarks, connection)
+            elif fingerprint is not None and fingerprint["match"] == True:
+                print(f"Check 2.1 & 2.2 passed on key fingerprint for {table}")
+                check1 = True, f"True {table} key fingerprint matched {fingerprint}"
+                check2 = True, f"True {table} key fingerprint matched {fingerprint}"
+                record_outcome(True, check="2.1", table=table, base_approx_keys=fingerprint["base_approx_keys"], union_approx_keys=fingerprint["union_approx_keys"])
+                record_outcome(True, check="2.2", table=table)
+            else:
+                #################################### Check 2.1: Check that PK count of union table is the same as the PK count of the base table & that all PKs are in both tables ###########################################################   - NOTE: this will be done twice in loop, would be good to imrpove on this
+                check1 = check_2_1(table, clients[validation_client].client + "_base_tables", base_PK, source_query, prod_ids, connection, profile=profile)
 
-            #################################### Check 2.2: Check that all primary keys in prod/union are in base table and vice versa ###########################################################   - NOTE: this will be done twice in loop, would be good to imrpove on this
+                #################################### Check 2.2: Check that all primary keys in prod/union are in base table and vice versa ###########################################################   - NOTE: this will be done twice in loop, would be good to imrpove on this
 
-            check2 = check_2_2(table, clients[validation_client].client + "_base_tables", base_PK, source_query, prod_ids, connection)
+                check2 = check_2_2(table, clients[validation_client].client + "_base_tables", base_PK, source_query, prod_ids, connection)
 
             #################################### Check 2.3: Check that all  primary keys are unique ###########################################################   - NOTE: this will be done twice in loop, would be good to imrpove on this
 
-            check3 = check_2_3(table, clients[validation_client].client + "_base_tables", base_PK, connection)    
+            if not incremental:
+                check3 = check_2_3(table, clients[validation_client].client + "_base_tables", base_PK, connection, profile=profile)    
 
             # Adding failures from checks of stage 1:
             if check1[0] == False:
@@ -762,7 +1315,17 @@ def stage_2_driver(primary_parents, clients, validation_client, definition_check
     return clients
 
 
-def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict, onboard_stat_dict, business_logic_dict, between_dash_comparison_dict, validation_client, connection):
+def stage_3_other_checks_table(dash_to_base_query_dictionary, dashboard_database):
+    """ Gives the table the stage 3 checks 3.3 - 3.5 are recorded under - the last statistic's dashboard table, or the dashboard database if there are no statistics
+        (check 3.6 failures are recorded under the dashboard table of each comparison)
+    """
+    if len(dash_to_base_query_dictionary) == 0:
+        return dashboard_database
+    return dash_to_base_query_dictionary[list(dash_to_base_query_dictionary)[-1]][0]
+
+
+@instrumented(stage="3", client_argument="validation_client")
+def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict, onboard_stat_dict, business_logic_dict, between_dash_comparison_dict, validation_client, connection, schemas=None, batch_scalar_queries=False, max_batch_size=50, group_by_dashboard_table=False, tables=None):
     """
     Driver function for running the stage 1 checks above for a client
     Inputs:
@@ -773,20 +1336,58 @@ def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict
         onboard_stat_dict: to-do
         business_logic_dict: to-do
         between_dash_comparison_dict: to-do
+        schemas: optional catalog.schema_cache for looking up dashboard table columns - defaults to the shared schema cache
+        batch_scalar_queries: bool - if True, all single value queries of the check dictionaries (base statistics, cumulative, onboard, business logic
+                              & between dashboard queries) are de-duplicated and run together in batches of max_batch_size (execution.run_scalar_queries)
+        group_by_dashboard_table: bool - if True, the sums of all statistics (checks 3.1, 3.2 & 3.4) of each dashboard table are fetched in one
+                                  dashboard_table_sums scan per table, rather than separate queries for each statistic
+        tables: optional list of dashboard tables - only the statistics of these tables are checked (checks 3.1 & 3.2), the other statistics are still
+                counted so failure keys are the same as in a full run - e.g. for the check graph of scheduler.py
     
     """
 
+    # loading all of the client's databases into the catalog in one query (skipped if already loaded by an earlier stage):
+    if schemas is None:
+        schemas = shared_schema_cache
+    schemas.load_client(clients, validation_client, connection)
+
+    # the statistics checked in this run:
+    checked_statistics = [statistic for statistic in dash_to_base_query_dictionary if tables is None or dash_to_base_query_dictionary[statistic][0] in tables]
+
+    # if batching, running all single value queries up front in as few round trips as possible:
+    scalar_results = None
+    if batch_scalar_queries == True:
+        scalar_queries = [dash_to_base_query_dictionary[statistic][1] for statistic in checked_statistics]
+        scalar_queries += [query for cumulative_statistic in cumulative_check_dict for query in cumulative_check_dict[cumulative_statistic][:2]]
+        scalar_queries += [onboard_stat_dict[onboard_statistic] for onboard_statistic in onboard_stat_dict]
+        scalar_queries += [query for business_logic_name in business_logic_dict for query in business_logic_dict[business_logic_name]]
+        scalar_queries += [query for dashboard_comparison_name in between_dash_comparison_dict for query in between_dash_comparison_dict[dashboard_comparison_name][1:3]]
+        scalar_results = run_scalar_queries(scalar_queries, connection, max_batch_size)
+
+    # if grouping by dashboard table, getting every statistic's sums for each dashboard table in one scan per table:
+    table_sums = dict()
+    if group_by_dashboard_table == True:
+        table_statistics = dict()
+        for statistic in checked_statistics:
+            table_statistics.setdefault(dash_to_base_query_dictionary[statistic][0], list()).append(statistic)
+        for onboard_statistic in onboard_stat_dict:
+            table_statistics.setdefault("overview_weekly", list()).append(onboard_statistic)
+        for dashboard_table in table_statistics:
+            table_sums[dashboard_table] = dashboard_table_sums(dashboard_table, clients[validation_client].client + "_dashboard_tables", table_statistics[dashboard_table], connection, schemas=schemas)
+
     # Creating counter for no. of test - this allows for many errors of the same check over different statsitics
     counter = 0
     # For each non-cumulative statistic in dashboard:
     for statistic in dash_to_base_query_dictionary:
 
         counter += 1
+        if statistic not in checked_statistics:
+            continue
         dashboard_table = dash_to_base_query_dictionary[statistic][0]
 
         #################################### Check 3.1: Check each statisic sum is same in base table ###########################################################
 
-        check1 = check_3_2(dashboard_statistic=statistic, base_statistic_query=dash_to_base_query_dictionary[statistic][1], dash_table=dashboard_table, dash_database=clients[validation_client].client + "_dashboard_tables", base_PK_by_pathways=dash_to_base_query_dictionary[statistic][2], connection=connection)
+        check1 = check_3_2(dashboard_statistic=statistic, base_statistic_query=dash_to_base_query_dictionary[statistic][1], dash_table=dashboard_table, dash_database=clients[validation_client].client + "_dashboard_tables", base_PK_by_pathways=dash_to_base_query_dictionary[statistic][2], connection=connection, schemas=schemas, scalar_results=scalar_results, pathways=table_sums.get(dashboard_table))
 
         # Adding failures from checks of stage 1 to client object:
         if check1[0] == False:
@@ -804,6 +1405,9 @@ def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict
                 clients[validation_client].failures[dashboard_table] = failed_table
                 clients[validation_client].failures[dashboard_table].failures["3.1 & 3.2" +  str(counter)] = "FAILURE: Check 3.1 and 3.2 - Dashboard Table {}: - Dashboard statistic {} sum is inconsistent with derived base table statistic sum - values: {} \n".format(dashboard_table, statistic, check1[1])
 
+    # checks 3.3 - 3.5 are recorded under the same table whichever statistics were checked (stage_3_other_checks_table)
+    dashboard_table = stage_3_other_checks_table(dash_to_base_query_dictionary, clients[validation_client].client + "_dashboard_tables")
+
     counter = 0
     # For each cumulative statistic in dashboard:
     for cumulative_statistic in cumulative_check_dict:
@@ -813,7 +1417,7 @@ def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict
         cumulative_dash_query = cumulative_check_dict[cumulative_statistic][0]
         base_dash_query = cumulative_check_dict[cumulative_statistic][1]
 
-        check3 = check_3_3(cumulative_dash_query, base_dash_query, clients[validation_client].regions, cumulative_statistic, connection=connection)
+        check3 = check_3_3(cumulative_dash_query, base_dash_query, clients[validation_client].regions, cumulative_statistic, connection=connection, scalar_results=scalar_results)
 
         # Adding failures from checks of stage 1 to client object:
         if check3[0] == False:
@@ -834,7 +1438,7 @@ def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict
     # evaluating dashboard statistic check for onboard stat (stat where each level should be the same):
     for onboard_statistic in onboard_stat_dict:
         counter += 1
-        check4 = check_3_4(onboard_statistic, clients[validation_client].client + "_dashboard_tables", "overview_weekly", onboard_stat_dict[onboard_statistic], connection)
+        check4 = check_3_4(onboard_statistic, clients[validation_client].client + "_dashboard_tables", "overview_weekly", onboard_stat_dict[onboard_statistic], connection, schemas=schemas, scalar_results=scalar_results, pathways=table_sums.get("overview_weekly"))
 
         # Adding failures from checks of stage 3 to client object:
         if check4[0] == False:
@@ -858,7 +1462,7 @@ def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict
         business_logic_query, base_stat_query = business_logic_dict[business_logic_name]
 
         #################################### Check 3.5: Check business logic queries against base tables for dashboard ###########################################################
-        check5 = check_3_5(business_logic_query, base_stat_query,business_logic_name, connection)
+        check5 = check_3_5(business_logic_query, base_stat_query,business_logic_name, connection, scalar_results=scalar_results)
 
         if check5[0] == False:
             if dashboard_table  in clients[validation_client].failures:
@@ -878,7 +1482,7 @@ def stage_3_driver(dash_to_base_query_dictionary, clients, cumulative_check_dict
         dashboard_table, dash_query_1, dash_query_2, logical_operator = between_dash_comparison_dict[dashboard_comparison_name]
 
     #     #################################### Check 3.6: Check in-dashboard comparions logic ###########################################################
-        check6 = check_3_6(dash_query_1, dash_query_2,dashboard_comparison_name, logical_operator, connection)
+        check6 = check_3_6(dash_query_1, dash_query_2,dashboard_comparison_name, logical_operator, connection, scalar_results=scalar_results)
         if check6[0] == False:
             if dashboard_table  in clients[validation_client].failures:
             #then already in clients  - add additional failure
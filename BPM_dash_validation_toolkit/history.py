@@ -0,0 +1,224 @@
+# The code base for keeping a history of validation runs - every check outcome (with the raw numbers the check computed, e.g. union_count &
+# region_count) persisted to a local SQLite store indexed by client, stage, check, table & run time, for diffing runs & pulling trends without athena --
+
+# import required packages
+import sqlite3
+import threading
+import time
+import uuid
+from .instrumentation import check_labels
+
+# history run (history_run) the check outcomes are recorded to - None (default) records nothing
+active_run = None
+
+history_schema = ["""CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, run_at REAL NOT NULL)""",
+                  """CREATE TABLE IF NOT EXISTS check_results (result_id INTEGER PRIMARY KEY, run_id TEXT NOT NULL, run_at REAL NOT NULL, client TEXT,
+                                                               stage TEXT, check_id TEXT, table_name TEXT, item TEXT, passed INTEGER NOT NULL,
+                                                               skipped INTEGER NOT NULL DEFAULT 0)""",
+                  """CREATE TABLE IF NOT EXISTS check_values (result_id INTEGER NOT NULL, name TEXT NOT NULL, value REAL)""",
+                  "CREATE INDEX IF NOT EXISTS check_results_lookup ON check_results (client, stage, check_id, table_name, run_at)",
+                  "CREATE INDEX IF NOT EXISTS check_results_run ON check_results (run_id)",
+                  "CREATE INDEX IF NOT EXISTS check_results_run_at ON check_results (run_at)",
+                  "CREATE INDEX IF NOT EXISTS check_values_result ON check_values (result_id, name)",
+                  "CREATE INDEX IF NOT EXISTS check_values_name ON check_values (name, result_id)"]
+
+# columns identifying the same check outcome in two runs
+outcome_key = ["client", "stage", "check_id", "table_name", "item"]
+
+
+def record_outcome(passed, check=None, table=None, item=None, skipped=False, **values):
+    """ Records a check outcome to the active history run (if there is one), labelled with the check labels of the current context
+        Inputs:
+            passed - bool check outcome
+            check, table - optional check id & table, overriding the check labels (e.g. for a function evaluating several checks)
+            item - optional string telling apart outcomes of the same check & table - e.g. the region of check 1.1, the statistic of check 3.2
+            skipped - bool, True for a check which was not run for the table (e.g. check 2.1 of a base table without a union parent) - recorded as
+                      passed (as the check reports it), and compared by diff_runs as "skipped" rather than "removed"
+            values - the raw numbers the check computed - e.g. union_count=10, region_count=10 (non-numeric values are not kept)
+    """
+    run = active_run
+    labels = check_labels.get()
+    # a dry run (planner.plan_checks) has no real outcomes
+    if run is None or labels.get("dry_run"):
+        return
+    run.record({"client": labels.get("client"), "stage": labels.get("stage"), "check_id": check if check is not None else labels.get("check"),
+                "table_name": table if table is not None else labels.get("table"), "item": None if item is None else str(item), "passed": outcome_passed(passed),
+                "skipped": bool(skipped)},
+               {name: numeric_value(value) for name, value in values.items() if numeric_value(value) is not None})
+
+
+def outcome_passed(passed):
+    """ Gives a check outcome as a bool - an outcome with no truth value (pd.NA, e.g. a comparison with a NULL query result) is recorded as a failure """
+    try:
+        return bool(passed)
+    except TypeError:
+        return False
+
+
+def numeric_value(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+# Creating history run class - the check outcomes of one validation run, written to the store when the run ends
+class history_run:
+    def __init__(self, store, run_id=None, run_at=None):
+        self.store = store
+        self.run_id = run_id if run_id is not None else uuid.uuid4().hex
+        self.run_at = run_at if run_at is not None else time.time()
+        self.outcomes = list()
+        self.lock = threading.Lock()
+
+    def record(self, outcome, values):
+        with self.lock:
+            self.outcomes.append((outcome, values))
+
+    def __enter__(self):
+        global active_run
+        self.previous_run = active_run
+        active_run = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global active_run
+        active_run = self.previous_run
+        self.store.write_run(self)
+        return False
+
+
+# Creating history store class for keeping the check outcomes of every run in a local SQLite database
+class history_store:
+    def __init__(self, path):
+        """ Inputs:
+                path - string SQLite database file path (created if missing) - e.g. "validation_history.sqlite"
+            Usage:
+                with history.run():
+                    clients = stage_1_driver(...)
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            for statement in history_schema:
+                self.connection.execute(statement)
+            # stores written before skipped outcomes were recorded
+            if "skipped" not in [column[1] for column in self.connection.execute("PRAGMA table_info(check_results)")]:
+                self.connection.execute("ALTER TABLE check_results ADD COLUMN skipped INTEGER NOT NULL DEFAULT 0")
+
+    def run(self, run_id=None, run_at=None):
+        """ Gives a history run - check outcomes within its with block (from any thread) are recorded, and written to the store at the end of the block
+            run_id - optional string run id (default a random id), run_at - optional unix time of the run (default now)
+        """
+        return history_run(self, run_id, run_at)
+
+    def write_run(self, run):
+        """ Writes the recorded outcomes of a run in one transaction (a run id already in the store gets the outcomes added) """
+        with run.lock:
+            outcomes = list(run.outcomes)
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO runs (run_id, run_at) VALUES (?, ?)", (run.run_id, run.run_at))
+            for outcome, values in outcomes:
+                cursor = self.connection.execute("""INSERT INTO check_results (run_id, run_at, client, stage, check_id, table_name, item, passed, skipped)
+                                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", (run.run_id, run.run_at, outcome["client"], outcome["stage"],
+                                                                                            outcome["check_id"], outcome["table_name"], outcome["item"],
+                                                                                            int(outcome["passed"]), int(outcome.get("skipped", False))))
+                self.connection.executemany("INSERT INTO check_values (result_id, name, value) VALUES (?, ?, ?)",
+                                            [(cursor.lastrowid, name, value) for name, value in values.items()])
+
+    def query(self, sql, parameters=()):
+        import pandas as pd
+        with self.lock:
+            return pd.read_sql_query(sql, self.connection, params=parameters)
+
+    def runs(self, client=None, limit=None):
+        """ Gives the runs in the store, latest first - DataFrame of run_id, run_at, checks, failures (of client only, if given) """
+        condition, parameters = filter_condition(client=client)
+        return self.query("""SELECT r.run_id, r.run_at, COUNT(c.result_id) AS checks, COALESCE(SUM(1 - c.passed), 0) AS failures
+                             FROM runs r LEFT JOIN check_results c ON c.run_id = r.run_id {}
+                             GROUP BY r.run_id, r.run_at ORDER BY r.run_at DESC {}""".format(condition.replace("WHERE", "AND", 1),
+                                                                                            "" if limit is None else "LIMIT {}".format(int(limit))), parameters)
+
+    def run_results(self, run_id, client=None):
+        """ Gives the check outcomes of a run - DataFrame of client, stage, check_id, table_name, item, passed, skipped & values (dict of the raw numbers) """
+        condition, parameters = filter_condition(client=client)
+        results = self.query("""SELECT c.result_id, c.client, c.stage, c.check_id, c.table_name, c.item, c.passed, c.skipped
+                                FROM check_results c WHERE c.run_id = ? {}""".format(condition.replace("WHERE", "AND", 1)), (run_id,) + parameters)
+        values = self.query("""SELECT v.result_id, v.name, v.value FROM check_values v JOIN check_results c ON c.result_id = v.result_id
+                               WHERE c.run_id = ? {}""".format(condition.replace("WHERE", "AND", 1)), (run_id,) + parameters)
+        result_values = dict()
+        for result_id, name, value in values.itertuples(index=False):
+            result_values.setdefault(result_id, dict())[name] = value
+        results["passed"] = results["passed"].astype(bool)
+        results["skipped"] = results["skipped"].astype(bool)
+        results["values"] = [result_values.get(result_id, dict()) for result_id in results["result_id"]]
+        return results.drop(columns="result_id")
+
+    def diff_runs(self, run_a, run_b, client=None, changed_only=True):
+        """ Compares the check outcomes of two runs (e.g. last week's & today's)
+            Output:
+                DataFrame of client, stage, check_id, table_name, item, passed_a, passed_b, skipped_a, skipped_b, values_a, values_b & change - "new failure",
+                "fixed", "still failing", "values changed", "skipped" (run in run_a, skipped in run_b), "no longer skipped", "added" (only in run_b),
+                "removed" (only in run_a) or "unchanged" (left out if changed_only)
+        """
+        results_a = self.run_results(run_a, client).drop_duplicates(outcome_key, keep="last")
+        results_b = self.run_results(run_b, client).drop_duplicates(outcome_key, keep="last")
+        diff = results_a.merge(results_b, on=outcome_key, how="outer", suffixes=("_a", "_b"), indicator=True)
+        diff["change"] = [outcome_change(row) for row in diff.to_dict("records")]
+        diff = diff.drop(columns="_merge")
+        if changed_only:
+            diff = diff[diff["change"] != "unchanged"]
+        return diff.reset_index(drop=True)
+
+    def trend(self, name=None, client=None, stage=None, check=None, table=None, since=None):
+        """ Gives the history of check outcomes & their raw numbers over runs, oldest first
+            Inputs:
+                name - optional raw number name (e.g. "union_count") - if None, the pass/fail outcomes are given (value 1 passed, 0 failed)
+                client, stage, check, table - optional filters
+                since - optional unix time, only runs from this time on
+            Output:
+                DataFrame of run_id, run_at, client, stage, check_id, table_name, item, passed, value
+        """
+        condition, parameters = filter_condition(client=client, stage=stage, check_id=check, table_name=table, since=since)
+        if name is None:
+            return self.query("""SELECT c.run_id, c.run_at, c.client, c.stage, c.check_id, c.table_name, c.item, c.passed, c.passed AS value
+                                 FROM check_results c {} ORDER BY c.run_at""".format(condition), parameters)
+        return self.query("""SELECT c.run_id, c.run_at, c.client, c.stage, c.check_id, c.table_name, c.item, c.passed, v.value
+                             FROM check_results c JOIN check_values v ON v.result_id = c.result_id AND v.name = ?
+                             {} ORDER BY c.run_at""".format(condition), (name,) + parameters)
+
+    def close(self):
+        self.connection.close()
+
+
+def filter_condition(since=None, **filters):
+    """ Gives a WHERE clause (on check_results c) & its parameters for the filters given (not None) """
+    conditions, parameters = list(), list()
+    for column, value in filters.items():
+        if value is not None:
+            conditions.append("c.{} = ?".format(column))
+            parameters.append(value)
+    if since is not None:
+        conditions.append("c.run_at >= ?")
+        parameters.append(since)
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", tuple(parameters)
+
+
+def outcome_change(row):
+    if row["_merge"] == "right_only":
+        return "added"
+    if row["_merge"] == "left_only":
+        return "removed"
+    if row["skipped_b"] and not row["skipped_a"]:
+        return "skipped"
+    if row["skipped_a"] and not row["skipped_b"]:
+        return "no longer skipped"
+    if row["passed_a"] and not row["passed_b"]:
+        return "new failure"
+    if not row["passed_a"] and row["passed_b"]:
+        return "fixed"
+    if row["values_a"] != row["values_b"]:
+        return "values changed"
+    return "unchanged" if row["passed_b"] else "still failing"
@@ -0,0 +1,170 @@
+# The code base for recording the cost of every query the toolkit runs - which client, stage, check & table it was for, its wall time and
+# (for pyathena connections) athena's engine execution time, queue time & data scanned --
+
+# import required packages
+import contextvars
+import csv
+import functools
+import inspect
+import json
+import threading
+import time
+
+# labels (client, stage, check, table) of the check currently running - set by the instrumented drivers & checks, read when a query is recorded
+check_labels = contextvars.ContextVar("check_labels", default=dict())
+
+# query recorder (query_recorder) used by run_query - None (default) records nothing
+active_recorder = None
+
+# record fields, in the order written to csv
+record_fields = ["client", "stage", "check", "table", "query", "started_at", "wall_time_seconds", "engine_execution_time_ms", "queue_time_ms",
+                 "data_scanned_bytes", "cache_hit", "query_id", "error"]
+
+
+def set_query_recorder(recorder):
+    """ Sets the query recorder for all toolkit queries - e.g. set_query_recorder(query_recorder()), or None to turn recording off """
+    global active_recorder
+    active_recorder = recorder
+    return recorder
+
+
+class check_scope:
+    """ Context manager labelling the queries run within it - e.g. with check_scope(check="2.1", table="fact_encounter"): ... """
+    def __init__(self, **labels):
+        self.labels = labels
+
+    def __enter__(self):
+        self.token = check_labels.set(dict(check_labels.get(), **self.labels))
+        return self
+
+    def __exit__(self, *exc_info):
+        check_labels.reset(self.token)
+        return False
+
+
+def instrumented(check=None, stage=None, table_argument=None, client_argument=None):
+    """ Decorator labelling the queries of a check/driver function with its check id or stage, and the table (or client) from one of its arguments
+        e.g. @instrumented(check="2.1", table_argument="target")
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            labels = dict()
+            if check is not None:
+                labels["check"] = check
+            if stage is not None:
+                labels["stage"] = stage
+            if table_argument is not None or client_argument is not None:
+                arguments = signature.bind_partial(*args, **kwargs).arguments
+                if table_argument is not None and table_argument in arguments:
+                    labels["table"] = str(arguments[table_argument])
+                if client_argument is not None and client_argument in arguments:
+                    labels["client"] = str(arguments[client_argument])
+            with check_scope(**labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cursor_statistics(cursor):
+    """ Gives the athena statistics of an executed cursor - pyathena cursors have these, other DB-API cursors give None """
+    return {"engine_execution_time_ms": getattr(cursor, "engine_execution_time_in_millis", None),
+            "queue_time_ms": getattr(cursor, "query_queue_time_in_millis", None),
+            "data_scanned_bytes": getattr(cursor, "data_scanned_in_bytes", None),
+            "query_id": getattr(cursor, "query_id", None)}
+
+
+# Creating query recorder class for keeping a record of every query run (with its check labels & statistics)
+class query_recorder:
+    def __init__(self, keep_query_text=True):
+        """ Inputs:
+                keep_query_text - bool, if False the sql of each query is not kept in the records (smaller output)
+        """
+        self.keep_query_text = keep_query_text
+        self.records = list()
+        self.lock = threading.Lock()
+
+    def record(self, query, started_at, wall_time_seconds, statistics=None, cache_hit=False, error=None):
+        """ Records one query, labelled with the check labels of the current context """
+        labels = check_labels.get()
+        statistics = statistics or dict()
+        query_record = {"client": labels.get("client"), "stage": labels.get("stage"), "check": labels.get("check"), "table": labels.get("table"),
+                        "query": query if self.keep_query_text else None, "started_at": started_at, "wall_time_seconds": wall_time_seconds,
+                        "engine_execution_time_ms": statistics.get("engine_execution_time_ms"), "queue_time_ms": statistics.get("queue_time_ms"),
+                        "data_scanned_bytes": statistics.get("data_scanned_bytes"), "cache_hit": cache_hit, "query_id": statistics.get("query_id"),
+                        "error": None if error is None else str(error)}
+        with self.lock:
+            self.records.append(query_record)
+
+    def write_json(self, path):
+        """ Writes every query record to a json file (a list of records) """
+        with self.lock:
+            records = list(self.records)
+        with open(path, "w", encoding="utf-8") as records_file:
+            json.dump(records, records_file, indent=1, default=str)
+
+    def write_csv(self, path):
+        """ Writes every query record to a csv file (one row per query) """
+        with self.lock:
+            records = list(self.records)
+        with open(path, "w", encoding="utf-8", newline="") as records_file:
+            writer = csv.DictWriter(records_file, fieldnames=record_fields)
+            writer.writeheader()
+            writer.writerows(records)
+
+    def check_totals(self):
+        """ Gives the totals of each check - (client, stage, check, table) -> {"queries", "wall_time_seconds", "engine_execution_time_ms", "queue_time_ms", "data_scanned_bytes"} """
+        with self.lock:
+            records = list(self.records)
+        totals = dict()
+        for query_record in records:
+            key = (query_record["client"], query_record["stage"], query_record["check"], query_record["table"])
+            check_total = totals.setdefault(key, {"queries": 0, "wall_time_seconds": 0.0, "engine_execution_time_ms": 0, "queue_time_ms": 0, "data_scanned_bytes": 0})
+            check_total["queries"] += 1
+            check_total["wall_time_seconds"] += query_record["wall_time_seconds"]
+            for statistic in ["engine_execution_time_ms", "queue_time_ms", "data_scanned_bytes"]:
+                check_total[statistic] += query_record[statistic] or 0
+        return totals
+
+    def report(self, top_n=10, price_per_tb_scanned=5.0):
+        """ Gives a text report of the top_n slowest & most expensive (most data scanned) checks of each client & stage
+            price_per_tb_scanned - athena price per TB of data scanned (USD), for the estimated cost of each check
+        """
+        totals = self.check_totals()
+        by_client_stage = dict()
+        for (client, stage, check, table), check_total in totals.items():
+            by_client_stage.setdefault((str(client), str(stage)), list()).append(((check, table), check_total))
+
+        report_string = ""
+        for client, stage in sorted(by_client_stage):
+            checks = by_client_stage[(client, stage)]
+            report_string += "------------------------------------------------------------Query report for client {} stage {}-----------------------------------------------------\n".format(client, stage)
+            report_string += "{} queries, {:.1f}s wall time, {:.3f} GB scanned\n".format(sum(check_total["queries"] for _, check_total in checks),
+                                                                                      sum(check_total["wall_time_seconds"] for _, check_total in checks),
+                                                                                      sum(check_total["data_scanned_bytes"] for _, check_total in checks) / 1024 ** 3)
+            for title, sort_key in [("Slowest checks (wall time)", "wall_time_seconds"), ("Most expensive checks (data scanned)", "data_scanned_bytes")]:
+                report_string += "{}:\n".format(title)
+                for (check, table), check_total in sorted(checks, key=lambda item: item[1][sort_key], reverse=True)[:top_n]:
+                    report_string += "    check {} {}: {} queries, {:.2f}s wall, {:.2f}s engine, {:.2f}s queued, {:.3f} GB scanned (~${:.4f})\n".format(
+                        check, table, check_total["queries"], check_total["wall_time_seconds"], check_total["engine_execution_time_ms"] / 1000,
+                        check_total["queue_time_ms"] / 1000, check_total["data_scanned_bytes"] / 1024 ** 3, check_total["data_scanned_bytes"] / 1024 ** 4 * price_per_tb_scanned)
+        return report_string
+
+
+def timed_query(run, query):
+    """ Runs run() (which runs query & gives (result, cursor statistics)), recording it to the active recorder if there is one - gives the result """
+    recorder = active_recorder
+    # the statements of a dry run (planner.plan_checks) are not run, so are not recorded
+    if recorder is None or check_labels.get().get("dry_run"):
+        return run()[0]
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        result, statistics = run()
+    except Exception as error:
+        recorder.record(query, started_at, time.perf_counter() - start, error=error)
+        raise
+    recorder.record(query, started_at, time.perf_counter() - start, statistics=statistics)
+    return result
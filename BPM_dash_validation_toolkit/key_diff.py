@@ -0,0 +1,238 @@
+# The code base for comparing primary key sets between a base table and its union parent without holding the keys in python sets --
+
+# import required packages
+import os
+import shutil
+import tempfile
+from .execution import iter_query, run_query
+
+
+def key_hash_sql(key_expression):
+    """ Gives the athena sql for a signed 64 bit hash (xxhash64) of a varchar key expression - used for key fingerprints & hash buckets in athena """
+    return "from_big_endian_64(xxhash64(to_utf8({})))".format(key_expression)
+
+
+def hash_keys(keys):
+    """ Hashes a column of keys (as strings, NULL keys as '<NULL>') into 64 bit unsigned integers - 8 bytes a key however long the key is """
+    import pandas as pd
+    keys = pd.Series(keys, dtype=object)
+    keys = keys.where(keys.notna(), "<NULL>").astype(str)
+    return pd.util.hash_array(keys.to_numpy(dtype=object))
+
+
+class partitioned_key_hashes:
+    """ Hashed keys of one side of a comparison, split by the top bits of the hash into partitions - kept in memory until a byte limit, then spilled to disk """
+    def __init__(self, name, partitions, spill_directory, memory_limit_bytes):
+        import numpy as np
+        self.name = name
+        self.partition_bits = int(np.log2(partitions))
+        self.partitions = 2 ** self.partition_bits
+        self.spill_directory = spill_directory
+        self.memory_limit_bytes = memory_limit_bytes
+        self.buffers = [list() for _ in range(self.partitions)]
+        self.buffered_bytes = 0
+        self.spilled = False
+        self.rows = 0
+
+    def partition_path(self, partition):
+        return os.path.join(self.spill_directory, "{}_{}.u64".format(self.name, partition))
+
+    def add(self, hashes):
+        import numpy as np
+        self.rows += len(hashes)
+        # partition from the top bits of the hash (0 bits -> one partition)
+        partition_ids = (hashes >> np.uint64(64 - self.partition_bits)).astype(np.int64) if self.partition_bits > 0 else np.zeros(len(hashes), dtype=np.int64)
+        order = np.argsort(partition_ids, kind="stable")
+        sorted_hashes = hashes[order]
+        boundaries = np.searchsorted(partition_ids[order], np.arange(self.partitions + 1))
+        for partition in range(self.partitions):
+            if boundaries[partition + 1] > boundaries[partition]:
+                self.buffers[partition].append(sorted_hashes[boundaries[partition]:boundaries[partition + 1]])
+        self.buffered_bytes += hashes.nbytes
+        if self.buffered_bytes > self.memory_limit_bytes:
+            self.spill()
+
+    def spill(self):
+        """ Appends all buffered hashes to their partition files on disk """
+        for partition in range(self.partitions):
+            if len(self.buffers[partition]) > 0:
+                with open(self.partition_path(partition), "ab") as partition_file:
+                    for hashes in self.buffers[partition]:
+                        partition_file.write(hashes.tobytes())
+                self.buffers[partition] = list()
+        self.buffered_bytes = 0
+        self.spilled = True
+
+    def partition(self, partition):
+        """ Gives the sorted, distinct hashes of a partition """
+        import numpy as np
+        parts = list(self.buffers[partition])
+        if self.spilled and os.path.exists(self.partition_path(partition)):
+            parts.append(np.fromfile(self.partition_path(partition), dtype=np.uint64))
+        if len(parts) == 0:
+            return np.zeros(0, dtype=np.uint64)
+        return np.unique(np.concatenate(parts))
+
+
+def stream_key_diff(base_query, union_query, connection, union_connection=None, memory_limit_bytes=512 * 1024 ** 2, chunksize=100000, partitions=256):
+    """ Utility function for comparing the keys of two queries in chunks, with bounded memory, as hashed 64 bit keys
+        Inputs:
+            base_query - string query giving one key column (the base table primary keys)
+            union_query - string query giving one key column (the union parent primary keys)
+            connection - the athena aws connection object for the base query
+            union_connection - optional connection for the union query, if in another catalog/account (defaults to connection)
+            memory_limit_bytes - int max bytes of hashed keys held in memory while reading - past this the hashes are spilled to partition files on disk
+            chunksize - int no. of rows read from a query at a time
+            partitions - int no. of hash partitions (rounded down to a power of 2) compared one at a time - more partitions, less memory for the comparison
+        Output:
+            dict - {"base_keys": distinct base keys, "union_keys": distinct union keys, "missing_from_union": base keys not in union,
+                    "missing_from_base": union keys not in base}
+        Comments:
+            1. keys are compared as 64 bit hashes, so (as for python sets of strings) the counts are exact barring a hash collision - ~1 in 10^10 for a billion keys
+    """
+    import numpy as np
+    if union_connection is None:
+        union_connection = connection
+
+    spill_directory = tempfile.mkdtemp(prefix="bpm_key_diff_")
+    try:
+        # half of the memory limit for each side's buffered hashes
+        sides = dict()
+        for side, query, side_connection in [("base", base_query, connection), ("union", union_query, union_connection)]:
+            sides[side] = partitioned_key_hashes(side, partitions, spill_directory, memory_limit_bytes // 2)
+            for chunk in iter_query(query, side_connection, chunksize):
+                sides[side].add(hash_keys(chunk.iloc[:, 0]))
+
+        # sort-merge comparison of each partition in turn - only one partition of each side is in memory at once
+        key_counts = {"base_keys": 0, "union_keys": 0, "missing_from_union": 0, "missing_from_base": 0}
+        for partition in range(sides["base"].partitions):
+            base_hashes = sides["base"].partition(partition)
+            union_hashes = sides["union"].partition(partition)
+            key_counts["base_keys"] += len(base_hashes)
+            key_counts["union_keys"] += len(union_hashes)
+            key_counts["missing_from_union"] += len(np.setdiff1d(base_hashes, union_hashes, assume_unique=True))
+            key_counts["missing_from_base"] += len(np.setdiff1d(union_hashes, base_hashes, assume_unique=True))
+        return key_counts
+    finally:
+        shutil.rmtree(spill_directory, ignore_errors=True)
+
+
+def bucket_condition(buckets):
+    """ Gives the sql condition for a key hash being in any of the given buckets - buckets is a dict of mask -> list of buckets """
+    return " OR ".join("bitwise_and(key_hash, {}) IN ({})".format(mask, ", ".join(str(bucket) for bucket in mask_buckets)) for mask, mask_buckets in buckets.items())
+
+
+def bucket_key_diff(base_query, union_query, connection, fanout_bits=4, max_leaf_keys=10000, max_buckets=1000, sample_size=10):
+    """ Utility function for comparing the keys of two queries in athena by hash buckets, drilling down (as a merkle tree) only into buckets that differ
+        Inputs:
+            base_query - string query giving one varchar key column named pk (the base table primary keys)
+            union_query - string query giving one varchar key column named pk (the union parent primary keys)
+            connection - the athena aws connection object
+            fanout_bits - int no. of hash bits added at each level - each differing bucket is split into 2 ** fanout_bits buckets at the next level
+            max_leaf_keys - int max no. of keys in the differing buckets before the keys of those buckets are brought back and compared directly
+                            - also the most keys ever brought back: if the differing buckets still hold more keys once every hash bit is used, the
+                            drill down is given up on rather than fetching them
+            max_buckets - int max no. of differing buckets drilled into at once - past this the drill down is given up on (the keys differ in too
+                          many places for it to be cheaper than a full comparison)
+                          note: every level is a full scan of both queries (only the rows grouped are filtered), so a drill down costs one scan of
+                          both sides per level - about log2(differing keys / max_leaf_keys) / fanout_bits + 1 levels - plus one for the leaf keys
+                          and one for the sample, compared with a single scan of both sides for the check_2_2 "engine" comparison
+            sample_size - int max no. of mismatched keys brought back
+        Output:
+            dict - {"base_keys", "union_keys", "missing_from_union", "missing_from_base", "sample": [("not in union"/"not in base", key)], "queries": no. of queries run}
+            or None if the keys differ in more than max_buckets buckets, or more than max_leaf_keys keys are left in the differing buckets at the last level
+        Comments:
+            1. each level is one query giving the distinct key count & sum of key hashes of each side per bucket - buckets with the same count & sum are
+               taken as the same (barring a hash collision), buckets with keys on one side only are counted without drilling further
+            2. a bucket at each level is the low (level x fanout_bits) bits of the key hash, so the child buckets of bucket b are those with the same low bits as b
+    """
+    hashed_keys = """
+                    WITH base_keys AS (
+                        SELECT pk, {hash} AS key_hash FROM (SELECT DISTINCT pk FROM ({base_query}) AS base_query) AS base_distinct
+                    ),
+                    union_keys AS (
+                        SELECT pk, {hash} AS key_hash FROM (SELECT DISTINCT pk FROM ({union_query}) AS union_query) AS union_distinct
+                    ),
+                    hashed_keys AS (
+                        SELECT 'base' AS side, pk, key_hash FROM base_keys
+                        UNION ALL
+                        SELECT 'union' AS side, pk, key_hash FROM union_keys
+                    )
+                """.format(hash=key_hash_sql("pk"), base_query=base_query, union_query=union_query)
+
+    key_counts = {"base_keys": 0, "union_keys": 0, "missing_from_union": 0, "missing_from_base": 0, "sample": list(), "queries": 0}
+    # buckets still to be resolved (at the current level), None for the whole key space
+    differing_buckets = None
+    # mask -> buckets (from any level) with keys on one side only
+    one_sided_buckets = dict()
+    bits = 0
+    while True:
+        parent_mask = 2 ** bits - 1
+        bits = min(bits + fanout_bits, 63)
+        mask = 2 ** bits - 1
+        bucket_filter = "" if differing_buckets is None else "WHERE " + bucket_condition({parent_mask: differing_buckets})
+        level_query = run_query(hashed_keys + """
+                            SELECT
+                                bitwise_and(key_hash, {}) AS bucket,
+                                SUM(CASE WHEN side = 'base' THEN 1 ELSE 0 END) AS base_keys,
+                                SUM(CASE WHEN side = 'union' THEN 1 ELSE 0 END) AS union_keys,
+                                SUM(CASE WHEN side = 'base' THEN CAST(key_hash AS DECIMAL(38, 0)) ELSE 0 END) AS base_checksum,
+                                SUM(CASE WHEN side = 'union' THEN CAST(key_hash AS DECIMAL(38, 0)) ELSE 0 END) AS union_checksum
+                            FROM hashed_keys
+                            {}
+                            GROUP BY bitwise_and(key_hash, {})
+                            """.format(mask, bucket_filter, mask), connection)
+        key_counts["queries"] += 1
+
+        next_buckets = list()
+        differing_keys = 0
+        for bucket, base_keys, union_keys, base_checksum, union_checksum in zip(level_query["bucket"], level_query["base_keys"], level_query["union_keys"], level_query["base_checksum"], level_query["union_checksum"]):
+            base_keys, union_keys = int(base_keys), int(union_keys)
+            if differing_buckets is None:
+                key_counts["base_keys"] += base_keys
+                key_counts["union_keys"] += union_keys
+            if base_keys == union_keys and base_checksum == union_checksum:
+                continue
+            if base_keys == 0 or union_keys == 0:
+                # keys on one side only - all missing from the other side
+                key_counts["missing_from_union"] += base_keys
+                key_counts["missing_from_base"] += union_keys
+                one_sided_buckets.setdefault(mask, list()).append(int(bucket))
+                continue
+            next_buckets.append(int(bucket))
+            differing_keys += base_keys + union_keys
+
+        differing_buckets = next_buckets
+        if len(differing_buckets) > max_buckets:
+            return None
+        if len(differing_buckets) == 0 or differing_keys <= max_leaf_keys:
+            break
+        if bits == 63:
+            # too many keys left to bring back, even with every hash bit used
+            return None
+
+    # bringing back the keys of the remaining differing buckets & comparing them directly
+    if len(differing_buckets) > 0:
+        leaf_query = run_query(hashed_keys + """
+                            SELECT side, pk
+                            FROM hashed_keys
+                            WHERE {}
+                            """.format(bucket_condition({mask: differing_buckets})), connection)
+        key_counts["queries"] += 1
+        base_set = set(pk for side, pk in zip(leaf_query["side"], leaf_query["pk"]) if side == "base")
+        union_set = set(pk for side, pk in zip(leaf_query["side"], leaf_query["pk"]) if side == "union")
+        key_counts["missing_from_union"] += len(base_set - union_set)
+        key_counts["missing_from_base"] += len(union_set - base_set)
+        key_counts["sample"] = ([("not in union", pk) for pk in sorted(base_set - union_set)] + [("not in base", pk) for pk in sorted(union_set - base_set)])[:sample_size]
+
+    # topping up the sample from the one sided buckets
+    if len(key_counts["sample"]) < sample_size and len(one_sided_buckets) > 0:
+        sample_query = run_query(hashed_keys + """
+                            SELECT side, pk
+                            FROM hashed_keys
+                            WHERE {}
+                            LIMIT {}
+                            """.format(bucket_condition(one_sided_buckets), sample_size - len(key_counts["sample"])), connection)
+        key_counts["queries"] += 1
+        key_counts["sample"] += [("not in union" if side == "base" else "not in base", pk) for side, pk in zip(sample_query["side"], sample_query["pk"])]
+    return key_counts
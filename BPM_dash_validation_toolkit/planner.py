@@ -0,0 +1,302 @@
+# The code base for planning a validation run before running it - a dry run of a client's checks which records every sql statement the checks
+# would run (without running them), estimates the data each would scan (athena EXPLAIN or table sizes) and, for a scan budget, picks the checks to run --
+
+# import required packages
+import itertools
+import json
+import math
+import os
+import re
+import threading
+# pandas is imported up front here (unlike the other modules) for the placeholder results - the planner is only loaded once plan_checks etc. are first used
+import pandas as pd
+from . import instrumentation
+from .backends import sql_backend, as_backend
+from .catalog import shared_schema_cache
+from .scheduler import build_check_dag, run_check_unit, run_check_dag
+
+# statements which only read metadata (not table data) - these are run for real in a dry run
+metadata_statement = re.compile(r"\binformation_schema\s*\.|^\s*(EXPLAIN|SHOW|DESCRIBE)\b", re.IGNORECASE)
+
+# athena charges at least 10MB for every query which scans data
+minimum_scan_bytes = 10 * 1024 ** 2
+
+
+def statement_tables(query):
+    """ Gives the database.table names read by a statement (FROM & JOIN) """
+    return sorted(set("{}.{}".format(database, table).lower() for database, table in re.findall(r'\b(?:FROM|JOIN)\s+"?(\w+)"?\s*\.\s*"?(\w+)"?', query, re.IGNORECASE)))
+
+
+def explain_scan_bytes(explain_output):
+    """ Gives the estimated input bytes from athena's EXPLAIN (TYPE IO, FORMAT JSON) output - None if the engine has no estimate (no table statistics) """
+    plan = json.loads(explain_output)
+    estimates = [table_input.get("estimate", dict()).get("outputSizeInBytes") for table_input in plan.get("inputTableColumnInfos", list())]
+    if len(estimates) == 0 or any(not isinstance(estimate, (int, float)) or math.isnan(estimate) for estimate in estimates):
+        return None
+    return int(sum(estimates))
+
+
+def parquet_export_bytes(root):
+    """ Gives the size on disk of each table of parquet exports laid out as <root>/<database>/<table> (as read by backends.duckdb_backend)
+        Output: dict - "database.table" -> bytes, for planning a run on a duckdb_backend (plan_checks table_bytes)
+    """
+    table_bytes = dict()
+    for database in sorted(os.listdir(root)):
+        database_path = os.path.join(root, database)
+        if not os.path.isdir(database_path):
+            continue
+        for export in sorted(os.listdir(database_path)):
+            export_path = os.path.join(database_path, export)
+            table = "{}.{}".format(database, export[:-len(".parquet")] if export.endswith(".parquet") else export).lower()
+            if os.path.isdir(export_path):
+                table_bytes[table] = sum(os.path.getsize(os.path.join(directory, file_name)) for directory, _, file_names in os.walk(export_path)
+                                         for file_name in file_names if file_name.endswith(".parquet"))
+            elif export.endswith(".parquet"):
+                table_bytes[table] = os.path.getsize(export_path)
+    return table_bytes
+
+
+# the values of placeholder results in a worst case plan - every value is different, so no two results compare equal & every check takes its failing path
+placeholder_values = itertools.count(1)
+
+
+def placeholder_value(worst_case):
+    return next(placeholder_values) if worst_case else 0
+
+
+class dry_run_frame(pd.DataFrame):
+    """ Placeholder result of a statement which was not run - a column which is not in it is given as a placeholder value, so the checks can carry on with any statement """
+    _metadata = ["worst_case"]
+    worst_case = False
+
+    @property
+    def _constructor(self):
+        return dry_run_frame
+
+    def __getitem__(self, key):
+        if isinstance(key, str) and key not in self.columns:
+            return pd.Series([placeholder_value(self.worst_case) for _ in range(len(self))], index=self.index, name=key, dtype=object)
+        if isinstance(key, list) and all(isinstance(column, str) for column in key):
+            return pd.DataFrame.__getitem__(self.assign(**{column: placeholder_value(self.worst_case) for column in key if column not in self.columns}), key)
+        return pd.DataFrame.__getitem__(self, key)
+
+
+def placeholder_columns(query):
+    """ Gives the column names of a placeholder result - the unnamed columns & every name aliased in the statement """
+    return list(dict.fromkeys(["_col0", "_col1", "_col2", "_col3"] + re.findall(r'\bAS\s+"?(\w+)"?', query, re.IGNORECASE)))
+
+
+def placeholder_result(query, worst_case=False):
+    """ Gives a stand-in result for a statement which was not run - one row, with a column for every name aliased in the statement
+        - zeros (so each check passes), or if worst_case a different number in every cell (so each check fails)
+    """
+    result = dry_run_frame({column: [placeholder_value(worst_case)] for column in placeholder_columns(query)})
+    result.worst_case = worst_case
+    return result
+
+
+# Creating planning backend class - a dry run backend recording the statements the checks would run, with their estimated scan
+class planning_backend(sql_backend):
+    cacheable = False
+
+    def __init__(self, connection, explain=True, table_bytes=None, worst_case=True):
+        """ Inputs:
+                connection - the athena aws connection object (or another backend) - only metadata statements & EXPLAINs are run on it
+                explain - bool, if True (default) each statement's scan is estimated with EXPLAIN (TYPE IO, FORMAT JSON) - athena does not scan
+                          any data for this, but only has an estimate for tables with statistics
+                table_bytes - optional dict of "database.table" -> bytes (or function (database, table) -> bytes or None), the estimate used when EXPLAIN
+                              gives none - the whole of every table read is counted (e.g. Glue table sizes, or parquet_export_bytes for a duckdb_backend)
+                worst_case - bool, if True (default) the placeholder results make every check fail, so the statements a check only runs on failure
+                             (e.g. the exact checks after a fingerprint mismatch, or the sample of missing keys of check 2.2) are recorded - if False
+                             every check passes, giving the statements of a clean run
+        """
+        self.connection = connection
+        self.backend = as_backend(connection)
+        self.explain = explain
+        self.table_bytes = table_bytes
+        self.worst_case = worst_case
+        self.statements = list()
+        self.lock = threading.Lock()
+
+    def estimate(self, query):
+        """ Gives (estimated bytes scanned, estimate source - "explain", "table size" or None if there is no estimate) """
+        if self.explain:
+            try:
+                explain_result, _ = self.backend.fetch("EXPLAIN (TYPE IO, FORMAT JSON) " + query, arrow=False)
+                scan_bytes = explain_scan_bytes(str(explain_result.iloc[0, 0]))
+                if scan_bytes is not None:
+                    return scan_bytes, "explain"
+            except Exception:
+                # no EXPLAIN (TYPE IO) on this engine, or the statement can not be explained - falling back to the table sizes
+                pass
+        if self.table_bytes is not None:
+            sizes = list()
+            for table in statement_tables(query):
+                if callable(self.table_bytes):
+                    sizes.append(self.table_bytes(*table.split(".", 1)))
+                else:
+                    sizes.append(self.table_bytes.get(table))
+            if len(sizes) > 0 and all(size is not None for size in sizes):
+                return int(sum(sizes)), "table size"
+        return None, None
+
+    def record(self, query):
+        scan_bytes, source = self.estimate(query)
+        labels = instrumentation.check_labels.get()
+        with self.lock:
+            self.statements.append({"unit": labels.get("unit"), "client": labels.get("client"), "stage": labels.get("stage"), "check": labels.get("check"),
+                                    "table": labels.get("table"), "query": query, "tables": statement_tables(query), "estimated_bytes": scan_bytes, "estimate_source": source})
+
+    def query_errors(self):
+        return self.backend.query_errors()
+
+    def fetch(self, query, arrow=True, unload=False):
+        if metadata_statement.search(query):
+            return self.backend.fetch(query, arrow, unload)
+        self.record(query)
+        return placeholder_result(query, self.worst_case), dict()
+
+    def cursor(self):
+        return planning_cursor(self)
+
+
+class planning_cursor:
+    """ DB-API cursor of a planning_backend - metadata statements are run, other statements are recorded and give no rows """
+    def __init__(self, backend):
+        self.backend = backend
+        self.cursor = None
+        self.description = None
+
+    def execute(self, query, *args):
+        if metadata_statement.search(query):
+            self.cursor = self.backend.backend.cursor()
+            self.cursor.execute(query)
+            self.description = self.cursor.description
+        else:
+            self.backend.record(query)
+            self.cursor = None
+            self.description = [(column,) for column in placeholder_columns(query)]
+        return self
+
+    def fetchall(self):
+        return self.cursor.fetchall() if self.cursor is not None else list()
+
+    def fetchmany(self, size=1):
+        return self.cursor.fetchmany(size) if self.cursor is not None else list()
+
+
+def plan_checks(clients, validation_client, connection, primary_parents, dash_to_base_query_dictionary, definition_check_dictionary=None, track_check_dict=None,
+                cumulative_check_dict=None, onboard_stat_dict=None, business_logic_dict=None, between_dash_comparison_dict=None, schemas=None,
+                stage_1=None, stage_2=None, stage_3=None, explain=True, table_bytes=None, price_per_tb_scanned=5.0, worst_case=True):
+    """ Driver function for a dry run of a client's three stages - every sql statement the checks would run is recorded (not run) with its estimated scan
+        Inputs:
+            clients, validation_client, connection, ... stage_3 - as for scheduler.run_check_dag
+            explain, table_bytes, worst_case - how each statement's scan is estimated & which path through the checks is planned (see planning_backend)
+            price_per_tb_scanned - athena price per TB of data scanned (USD), for the estimated cost
+        Output:
+            dict - {"statements": every statement, most expensive first - {"unit", "client", "stage", "check", "table", "query", "tables", "estimated_bytes", "estimate_source"},
+                    "units": the (stage, table) units of the check graph, most expensive first - {"unit", "estimated_bytes", "statements", "unestimated_statements", "error"},
+                    "estimated_bytes", "estimated_cost_usd", "unestimated_statements"}
+        Comments:
+            1. metadata (information_schema) queries are run as normal, so the statements are those of the tables in the catalog
+            2. every other statement gives a placeholder result - with worst_case (default) each check is followed as if it failed, so the plan has every
+               statement a check may run (e.g. the exact checks 2.1 & 2.2 after a fingerprint mismatch with stage_2=dict(fingerprint_first=True)) and the
+               estimate is an upper bound of the run (but for check 2.2's bucket drill down, whose depth depends on the data - one path through it is planned)
+               - with worst_case=False each check is followed as if it passed, and the estimate is a lower bound
+            3. each statement is counted at athena's 10MB minimum scan
+            4. checks over the budget are deferred, not sampled - athena bills the columns read whatever rows are kept, so a sample of an unpartitioned
+               table scans as much as the full check
+    """
+    if schemas is None:
+        schemas = shared_schema_cache
+    other_stage_3_dicts = [cumulative_check_dict or dict(), onboard_stat_dict or dict(), business_logic_dict or dict(), between_dash_comparison_dict or dict()]
+    has_other_stage_3_checks = any(len(check_dict) > 0 for check_dict in other_stage_3_dicts)
+    dag = build_check_dag(clients, validation_client, primary_parents, dash_to_base_query_dictionary, connection, other_stage_2_checks=True,
+                          other_stage_3_checks=other_stage_3_dicts if has_other_stage_3_checks else False, schemas=schemas)
+
+    planning = planning_backend(connection, explain=explain, table_bytes=table_bytes, worst_case=worst_case)
+    units = list()
+    for unit in sorted(dag, key=lambda unit: (unit[0], str(unit[1]))):
+        error = None
+        with instrumentation.check_scope(unit=unit, dry_run=True):
+            try:
+                run_check_unit(unit, clients, validation_client, planning, primary_parents, dash_to_base_query_dictionary, definition_check_dictionary or dict(),
+                               track_check_dict or dict(), other_stage_3_dicts, schemas=schemas, stage_1=stage_1, stage_2=stage_2, stage_3=stage_3)
+            except Exception as unit_error:
+                # the placeholder results could not be followed past this point - the unit's statements so far are still planned
+                error = str(unit_error)
+        unit_statements = [statement for statement in planning.statements if statement["unit"] == unit]
+        units.append({"unit": unit, "estimated_bytes": sum(max(statement["estimated_bytes"], minimum_scan_bytes) for statement in unit_statements if statement["estimated_bytes"] is not None),
+                      "statements": len(unit_statements), "unestimated_statements": sum(1 for statement in unit_statements if statement["estimated_bytes"] is None), "error": error})
+
+    estimated_bytes = sum(unit_plan["estimated_bytes"] for unit_plan in units)
+    return {"statements": sorted(planning.statements, key=lambda statement: -1 if statement["estimated_bytes"] is None else statement["estimated_bytes"], reverse=True),
+            "units": sorted(units, key=lambda unit_plan: unit_plan["estimated_bytes"], reverse=True),
+            "estimated_bytes": estimated_bytes, "estimated_cost_usd": estimated_bytes / 1024 ** 4 * price_per_tb_scanned,
+            "unestimated_statements": sum(unit_plan["unestimated_statements"] for unit_plan in units)}
+
+
+def format_plan(plan, top_n=20):
+    """ Gives a text report of a plan - the total estimated scan & cost, and the top_n most expensive units & statements """
+    report_string = "Estimated scan: {:.3f} GB (~${:.4f}) over {} statements ({} without an estimate)\n".format(
+        plan["estimated_bytes"] / 1024 ** 3, plan["estimated_cost_usd"], len(plan["statements"]), plan["unestimated_statements"])
+    report_string += "Most expensive checks:\n"
+    for unit_plan in plan["units"][:top_n]:
+        report_string += "    stage {} {}: {:.3f} GB, {} statements{}\n".format(unit_plan["unit"][0], unit_plan["unit"][1], unit_plan["estimated_bytes"] / 1024 ** 3, unit_plan["statements"],
+                                                                           "" if unit_plan["error"] is None else " (dry run stopped: {})".format(unit_plan["error"]))
+    report_string += "Most expensive statements:\n"
+    for statement in plan["statements"][:top_n]:
+        scan = "unknown" if statement["estimated_bytes"] is None else "{:.3f} GB ({})".format(statement["estimated_bytes"] / 1024 ** 3, statement["estimate_source"])
+        report_string += "    check {} {}: {} - {}\n".format(statement["check"], statement["table"], scan, " ".join(statement["query"].split())[:200])
+    return report_string
+
+
+def budget_plan(plan, budget_bytes, priorities=None, unestimated_bytes=None):
+    """ Utility function for picking the units of a plan to run within a scan budget
+        Inputs:
+            plan - from plan_checks
+            budget_bytes - int max bytes scanned
+            priorities - optional dict of (stage, table) unit or table name -> int priority (lower runs first, default 0 for unlisted units) - units of the
+                         same priority run stage 1 first, then the cheapest first, so as many checks as possible are run
+            unestimated_bytes - optional bytes assumed for each statement without an estimate - if None (default), a unit with such a statement is deferred
+        Output:
+            (set of units to run, list of deferred units) - the units to run can be passed as run_check_dag units
+    """
+    priorities = priorities or dict()
+
+    def unit_bytes(unit_plan):
+        if unit_plan["unestimated_statements"] == 0:
+            return unit_plan["estimated_bytes"]
+        if unestimated_bytes is None:
+            return None
+        return unit_plan["estimated_bytes"] + unit_plan["unestimated_statements"] * max(unestimated_bytes, minimum_scan_bytes)
+
+    def priority(unit_plan):
+        unit = unit_plan["unit"]
+        return (priorities.get(unit, priorities.get(unit[1], 0)), unit[0], unit_plan["estimated_bytes"], str(unit[1]))
+
+    selected, deferred = set(), list()
+    spent = 0
+    for unit_plan in sorted(plan["units"], key=priority):
+        scan_bytes = unit_bytes(unit_plan)
+        if scan_bytes is not None and spent + scan_bytes <= budget_bytes:
+            selected.add(unit_plan["unit"])
+            spent += scan_bytes
+        else:
+            deferred.append(unit_plan["unit"])
+    return selected, deferred
+
+
+def run_within_budget(clients, validation_client, connection, primary_parents, dash_to_base_query_dictionary, budget_bytes, priorities=None,
+                      unestimated_bytes=None, explain=True, table_bytes=None, worst_case=True, **run_inputs):
+    """ Driver function for planning a client's checks (plan_checks), then running (scheduler.run_check_dag) the highest priority checks within budget_bytes
+        run_inputs - the other run_check_dag inputs - e.g. definition_check_dictionary, max_concurrent_checks, stage_2=dict(fingerprint_first=True)
+        Output:
+            (clients, plan, deferred units) - the deferred units are recorded on clients as not checked (warnings)
+    """
+    plan_inputs = {name: value for name, value in run_inputs.items() if name not in ["max_concurrent_checks", "skip_on_failure"]}
+    plan = plan_checks(clients, validation_client, connection, primary_parents, dash_to_base_query_dictionary, explain=explain, table_bytes=table_bytes, worst_case=worst_case, **plan_inputs)
+    selected, deferred = budget_plan(plan, budget_bytes, priorities=priorities, unestimated_bytes=unestimated_bytes)
+    print("Running {} of {} checks within the scan budget - deferred: {}".format(len(selected), len(plan["units"]), deferred))
+    clients = run_check_dag(clients, validation_client, connection, primary_parents, dash_to_base_query_dictionary, units=selected, **run_inputs)
+    return clients, plan, deferred
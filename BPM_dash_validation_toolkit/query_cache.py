@@ -0,0 +1,170 @@
+# The code base for caching query results on local disk, so the same sql is not re-run against athena within a validation or on re-runs --
+
+# import required packages
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from .backends import arrow_frame
+
+
+def normalise_query(query):
+    """ Normalises sql text for use as a cache key - whitespace outside of string literals is collapsed & trailing semicolons removed """
+    # splitting out quoted string literals, so whitespace within these is kept as is
+    parts = re.split(r"('(?:[^']|'')*')", query)
+    normalised = "".join(part if part.startswith("'") else re.sub(r"\s+", " ", part) for part in parts)
+    return normalised.strip().rstrip(";").strip()
+
+
+def connection_scope(connection):
+    """ Gives a string scope for a connection, so the same sql on different athena set-ups (region, work group, schema, or a local backend's export root) is cached separately """
+    scope = [type(connection).__name__]
+    for attribute in ["region_name", "work_group", "catalog_name", "schema_name", "root"]:
+        value = getattr(connection, attribute, None)
+        if value is not None:
+            scope.append("{}={}".format(attribute, value))
+    return "|".join(scope)
+
+
+# Creating query cache class for keeping query results (as parquet files) in a local directory
+class query_cache:
+    def __init__(self, directory, max_bytes=1024 ** 3, max_entries=None, max_age_seconds=None, freshness_rules=None, fresh_since=None, scope=None):
+        """ Inputs:
+                directory - string local directory the cached results are kept in
+                max_bytes - int max total size of cached results on disk (default 1GB), least recently used results are evicted past this
+                max_entries - optional int max no. of cached results, least recently used results are evicted past this
+                max_age_seconds - optional no. of seconds a cached result is fresh for (None never expires)
+                freshness_rules - optional list of (regex pattern, max age seconds) - the first pattern found in the sql sets its max age instead of max_age_seconds
+                                  e.g. [("information_schema", 24 * 60 * 60), ("_dashboard_tables", 0)]
+                fresh_since - optional epoch time - results cached before this are stale, e.g. time.time() at the start of a run to only share results within the run
+                scope - optional string scope for all cached results, defaults to one derived from each connection (see connection_scope)
+        """
+        try:
+            import pyarrow  # noqa: F401 - results are kept as parquet
+        except ImportError:
+            raise ImportError("query_cache needs pyarrow for keeping results as parquet - pip install pyarrow (or BPM_dash_validation_toolkit[cache])")
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.freshness_rules = [(re.compile(pattern, re.IGNORECASE), max_age) for pattern, max_age in (freshness_rules or list())]
+        self.fresh_since = fresh_since
+        self.scope = scope
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_path = os.path.join(self.directory, "index.json")
+        # key -> {"created": epoch, "last_access": epoch, "bytes": int, "query": normalised sql}
+        self.index = dict()
+        # True when only the last access times of the index have changed since it was written - these are written with the next put, eviction or close
+        self.index_changed = False
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                self.index = json.load(index_file)
+
+    def key(self, query, connection):
+        """ Gives the cache key for a query - a hash of the normalised sql and the connection/database scope """
+        scope = self.scope if self.scope is not None else connection_scope(connection)
+        return hashlib.sha256("{}\n{}".format(scope, normalise_query(query)).encode("utf-8")).hexdigest()
+
+    def result_path(self, key):
+        return os.path.join(self.directory, key + ".parquet")
+
+    def max_age(self, query):
+        """ Gives the max age for a query from the first matching freshness rule, otherwise max_age_seconds """
+        for pattern, max_age in self.freshness_rules:
+            if pattern.search(query):
+                return max_age
+        return self.max_age_seconds
+
+    def is_fresh(self, entry, query):
+        if self.fresh_since is not None and entry["created"] < self.fresh_since:
+            return False
+        max_age = self.max_age(query)
+        return max_age is None or time.time() - entry["created"] <= max_age
+
+    def write_index(self):
+        self.index_changed = False
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump(self.index, index_file)
+        os.replace(temp_path, self.index_path)
+
+    def remove(self, key):
+        self.index.pop(key, None)
+        if os.path.exists(self.result_path(key)):
+            os.remove(self.result_path(key))
+
+    def get(self, query, connection, arrow=True):
+        """ Gives the cached result DataFrame for a query, or None if not cached/stale (counted as a hit or miss)
+            arrow - bool, if True the result is converted as an arrow fetch (backends.arrow_frame), otherwise with numpy types as a pandas fetch,
+                    so a check sees the same types whether its result is cached or not
+        """
+        import pyarrow.parquet as pq
+        key = self.key(query, connection)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is not None and self.is_fresh(entry, query) and os.path.exists(self.result_path(key)):
+                self.hits += 1
+                # the least recently used order is kept in memory - not worth re-writing the index for on every hit
+                entry["last_access"] = time.time()
+                self.index_changed = True
+                arrow_table = pq.read_table(self.result_path(key))
+                return arrow_frame(arrow_table) if arrow else arrow_table.to_pandas()
+            if entry is not None:
+                # stale or missing result file
+                self.remove(key)
+                self.write_index()
+            self.misses += 1
+            return None
+
+    def put(self, query, connection, result):
+        """ Caches a query result DataFrame, then evicts least recently used results past max_bytes/max_entries """
+        key = self.key(query, connection)
+        with self.lock:
+            try:
+                result.to_parquet(self.result_path(key), index=False)
+            except Exception as error:
+                # results which cannot be written as parquet (e.g. mixed type columns) are just not cached
+                print("Query result not cached: ", error)
+                return
+            now = time.time()
+            self.index[key] = {"created": now, "last_access": now, "bytes": os.path.getsize(self.result_path(key)), "query": normalise_query(query)}
+            self.evict()
+            self.write_index()
+
+    def evict(self):
+        """ Removes least recently used results until within max_bytes & max_entries """
+        with self.lock:
+            by_last_access = sorted(self.index, key=lambda key: self.index[key]["last_access"])
+            total_bytes = sum(entry["bytes"] for entry in self.index.values())
+            while len(by_last_access) > 0 and ((self.max_bytes is not None and total_bytes > self.max_bytes) or (self.max_entries is not None and len(self.index) > self.max_entries)):
+                key = by_last_access.pop(0)
+                total_bytes -= self.index[key]["bytes"]
+                self.remove(key)
+                self.evictions += 1
+
+    def invalidate(self, pattern=None):
+        """ Removes all cached results, or only those whose sql matches a regex pattern - e.g. invalidate("jj_dashboard_tables") """
+        with self.lock:
+            for key in list(self.index):
+                if pattern is None or re.search(pattern, self.index[key]["query"], re.IGNORECASE):
+                    self.remove(key)
+            self.write_index()
+
+    def close(self):
+        """ Writes the last access times of cache hits to the index, so the least recently used order is kept for the next run """
+        with self.lock:
+            if self.index_changed:
+                self.write_index()
+
+    def stats(self):
+        """ Gives the hit/miss counters & current size of the cache """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.index), "bytes": sum(entry["bytes"] for entry in self.index.values())}
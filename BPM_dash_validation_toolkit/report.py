@@ -0,0 +1,145 @@
+# The code base for reporting validation results - structured records of each client's failures, rendered as text, JSON or Markdown, and a
+# slack sink delivering reports in the background (split to fit slack's message size, over a pooled session with timeouts & retries) --
+
+# import required packages
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+# slack truncates message text past 40000 characters & advises keeping messages under 4000 - reports are split into messages of at most this
+max_slack_characters = 3900
+
+client_banners = {"text": ("------------------------------------------------------------Beginning Failures Output for {client}-----------------------------------------------------\n"
+                           "For client {client}, the failures are:\n",
+                           "------------------------------------------------------------End of Failures output for {client}-----------------------------------------------------\n\n"),
+                  "markdown": ("### Failures for {client}\n", "\n")}
+
+
+def report_records(clients):
+    """ Utility function for collecting the validation results of clients as structured records
+        Inputs:
+            clients - dict of client name -> client object (as from set_up_client, after the stage drivers)
+        Output:
+            dict - client name -> list of records, one per failed check - {"client", "table", "check", "message", "downstream_tables"}
+    """
+    records = dict()
+    for bpmclient in clients:
+        records[bpmclient] = list()
+        for failed_table, failed_node in clients[bpmclient].failures.items():
+            for check, message in failed_node.failures.items():
+                records[bpmclient].append({"client": bpmclient, "table": failed_table, "check": check, "message": message,
+                                           "downstream_tables": list(failed_node.dependencies)})
+    return records
+
+
+def render_report(records, format="text"):
+    """ Utility function for rendering report_records output in one pass
+        Inputs:
+            records - dict of client name -> list of records (from report_records)
+            format - "text" (default - as printed/sent to slack before), "markdown" or "json"
+        Output:
+            string report
+    """
+    if format == "json":
+        return json.dumps(records, indent=1, default=str)
+    if format not in client_banners:
+        raise ValueError("report format must be one of text, markdown or json - not {}".format(format))
+
+    header, footer = client_banners[format]
+    parts = list()
+    for bpmclient, client_records in records.items():
+        parts.append(header.format(client=bpmclient))
+        for record in client_records:
+            if format == "text":
+                parts.append(record["message"])
+            else:
+                parts.append("- **{}** `{}`: {}\n".format(record["check"], record["table"], record["message"].strip()))
+            for child in record["downstream_tables"]:
+                warning = "WARNING: Check {} failed for {} - this may affect the downstream table {}\n".format(record["check"], record["table"], child)
+                parts.append(warning if format == "text" else "    - " + warning)
+        parts.append(footer.format(client=bpmclient))
+    return "".join(parts)
+
+
+def split_message(text, max_characters=max_slack_characters):
+    """ Splits text into messages of at most max_characters, at line ends where possible (a longer line is split across messages) """
+    messages = list()
+    current = list()
+    current_length = 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_characters:
+            line_part, line = line[:max_characters], line[max_characters:]
+            if current:
+                messages.append("".join(current))
+                current, current_length = list(), 0
+            messages.append(line_part)
+        if current_length + len(line) > max_characters:
+            messages.append("".join(current))
+            current, current_length = list(), 0
+        current.append(line)
+        current_length += len(line)
+    if current:
+        messages.append("".join(current))
+    return messages
+
+
+def retrying_session(retries=3, backoff_seconds=1.0):
+    """ Gives a requests session retrying posts slack has not taken - with exponential backoff, respecting slack's Retry-After
+        Comments:
+            1. webhook posts are not idempotent, so only posts slack can not have processed are retried - connection errors (nothing was sent) and
+               429 (rate limited) & 503 (unavailable) responses - a read timeout or other 5xx may come after slack has posted the message, so these are
+               not retried (the post gives the error) rather than risking a duplicate message
+    """
+    # requests is only imported when a report is first sent
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    retry = Retry(total=retries, connect=retries, read=0, other=0, status=retries, backoff_factor=backoff_seconds, status_forcelist=[429, 503],
+                  allowed_methods=None, raise_on_status=False)
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.mount("http://", HTTPAdapter(max_retries=retry))
+    return session
+
+
+# Creating slack sink class for delivering reports to a slack webhook in the background
+class slack_sink:
+    def __init__(self, slack_webhook, timeout=10, retries=3, backoff_seconds=1.0, max_characters=max_slack_characters):
+        """ Inputs:
+                slack_webhook - string slack webhook url
+                timeout - seconds to wait for slack to connect & respond to each post
+                retries - int no. of retries of a post slack has not taken (see retrying_session), with backoff_seconds exponential backoff
+                max_characters - int max characters of each slack message, longer reports are sent as several messages (in order)
+        """
+        self.slack_webhook = slack_webhook
+        self.timeout = timeout
+        self.max_characters = max_characters
+        self.session = retrying_session(retries, backoff_seconds)
+        # one worker, so messages are delivered in order - its thread is joined when python exits, so queued messages are still sent
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = list()
+
+    def post(self, message):
+        import requests
+        try:
+            response = self.session.post(self.slack_webhook, json={"text": message}, timeout=self.timeout)
+            print(response.text)
+            return response
+        except requests.RequestException as error:
+            print("Failed to send validation results to slack: ", error)
+            return error
+
+    def send(self, text):
+        """ Queues text to be sent (split into messages of at most max_characters) - gives the futures of the posts, each giving the response (or error) """
+        futures = [self.executor.submit(self.post, message) for message in split_message(text, self.max_characters)]
+        self.futures.extend(futures)
+        return futures
+
+    def flush(self, timeout=None):
+        """ Waits for every queued message to be sent - gives the responses (or errors) """
+        futures, self.futures = self.futures, list()
+        return [future.result(timeout=timeout) for future in futures]
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown()
+        self.session.close()
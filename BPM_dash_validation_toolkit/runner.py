@@ -0,0 +1,96 @@
+# The code base for running the stage pipelines of several clients at once, each client keeping its own failure state --
+
+# import required packages
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import contextvars
+import traceback
+from . import execution
+from .functions import node, stage_1_driver, stage_2_driver, stage_3_driver
+
+# stage name -> driver function, in the order the stages are run for a client
+stage_drivers = [("stage_1", stage_1_driver), ("stage_2", stage_2_driver), ("stage_3", stage_3_driver)]
+
+
+def run_client(client_config, connection):
+    """ Utility function for running the stage pipeline (stage 1, then 2, then 3) of one client
+        Inputs:
+            client_config - dict for the client, see run_clients
+            connection - the athena aws connection object (used if the client_config has no connection of its own)
+        Output:
+            clients dict (from set_up_client) of the client, with its failures
+        Comments:
+            1. if a stage raises an error, the error is recorded as a failure of the client (under "runner") and its later stages are skipped,
+               so one client's error does not stop the other clients
+    """
+    clients = client_config["clients"]
+    validation_client = client_config["validation_client"]
+    client_connection = client_config.get("connection", connection)
+
+    for stage, stage_driver in stage_drivers:
+        if stage not in client_config:
+            continue
+        try:
+            clients = stage_driver(clients=clients, validation_client=validation_client, connection=client_connection, **client_config[stage])
+        except Exception as error:
+            print("Client {} {} failed: ".format(validation_client, stage), error)
+            traceback.print_exc()
+            if "runner" not in clients[validation_client].failures:
+                clients[validation_client].failures["runner"] = node("runner", clients[validation_client].client, None, [])
+            clients[validation_client].failures["runner"].failures[stage] = "FAILURE: {} for client {} did not complete - error: {}\n".format(stage, validation_client, error)
+            break
+    return clients
+
+
+def run_clients(client_configs, connection, max_concurrent_clients=None, max_in_flight_queries=None, max_workers=None):
+    """ Utility function for running the stage pipelines of several clients concurrently on one shared thread pool
+        Inputs:
+            client_configs - list of dicts, one per client, of:
+                                "clients" - clients dict from set_up_client
+                                "validation_client" - string client name - e.g. 'jj'
+                                "stage_1", "stage_2", "stage_3" - dicts of the other inputs for that stage's driver (a stage left out is not run)
+                                                                  e.g. "stage_2": dict(primary_parents=..., definition_check_dictionary=..., track_check_dict=...)
+                                "connection" - optional athena connection for the client, otherwise connection is used
+            connection - the athena aws connection object
+            max_concurrent_clients - int no. of clients run at once (default all of them)
+            max_in_flight_queries - optional int cap on athena queries running at once over all clients (and their concurrent checks) - None keeps
+                                    the cap set by execution.set_max_in_flight_queries (no cap by default)
+            max_workers - int size of the worker pool shared by every client's stage pipeline & concurrent checks (e.g. stage 1 with max_concurrent_queries)
+                          (default max_concurrent_clients + 4)
+        Output:
+            dict - client name -> client object (as from set_up_client), each with its own failures - can be passed to output_client_validation_results
+        Comments:
+            1. each client's stages are run in order, so a client's run takes as long as a serial run of that client - the whole run takes about as long
+               as the slowest client, bounded by max_workers & max_in_flight_queries
+            2. every client's work runs on the one shared pool (execution.set_check_pool for the run) - a client's pipeline runs its checks not yet
+               started by a worker itself (execution.run_checks), so the pool can not be filled by pipelines waiting on their own checks
+    """
+    if max_concurrent_clients is None:
+        max_concurrent_clients = max(len(client_configs), 1)
+    if max_workers is None:
+        max_workers = max_concurrent_clients + 4
+
+    # capping in flight queries for this run only (a cap set before with set_max_in_flight_queries is put back after)
+    previous_in_flight_queries = execution.in_flight_queries
+    previous_check_pool = execution.check_pool
+    if max_in_flight_queries is not None:
+        execution.set_max_in_flight_queries(max_in_flight_queries)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            execution.set_check_pool(executor)
+            # starting max_concurrent_clients pipelines, then the next client's as each one finishes
+            futures = list()
+            running = set()
+            for client_config in client_configs:
+                if len(running) >= max_concurrent_clients:
+                    _, running = wait(running, return_when=FIRST_COMPLETED)
+                future = executor.submit(contextvars.copy_context().run, run_client, client_config, connection)
+                futures.append((client_config["validation_client"], future))
+                running.add(future)
+            # collecting in submission order, so the output order is the same as running the clients one after another
+            results = dict()
+            for validation_client, future in futures:
+                results[validation_client] = future.result()[validation_client]
+    finally:
+        execution.in_flight_queries = previous_in_flight_queries
+        execution.check_pool = previous_check_pool
+    return results
@@ -0,0 +1,201 @@
+# The code base for running a client's checks as a dependency graph (DAG) - prod/union tables (stage 1) -> base tables (stage 2) -> dashboard tables (stage 3),
+# running independent tables in parallel and (optionally) skipping the checks of tables downstream of a failure --
+
+# import required packages
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import contextvars
+import re
+import threading
+from .catalog import shared_schema_cache
+from .functions import node, stage_1_driver, stage_2_driver, stage_3_driver, stage_3_other_checks_table
+from .utility import set_up_client
+
+
+def referenced_tables(database, query):
+    """ Gives the set of tables of a database referenced in sql (or any object holding sql, e.g. a list of queries) - e.g. jj_base_tables.fact_encounter """
+    return set(table.lower() for table in re.findall(r'"?{}"?\s*\.\s*"?(\w+)"?'.format(re.escape(database)), str(query), re.IGNORECASE))
+
+
+def build_check_dag(clients, validation_client, primary_parents, dash_to_base_query_dictionary, connection, other_stage_2_checks=False, other_stage_3_checks=False, schemas=None):
+    """ Utility function for building the check graph of a client - each unit of checks (a stage & table) -> the set of units it depends on
+        Inputs:
+            clients - clients dict from set_up_client
+            validation_client - string client name - e.g. 'jj'
+            primary_parents - stage 2 primary parents dictionary (base table -> [PK index, parent query, prod ids])
+            dash_to_base_query_dictionary - stage 3 statistic dictionary (statistic -> [dashboard table, base statistic query, base PK by pathways query])
+            connection - the athena aws connection object
+            other_stage_2_checks - bool, if True a ("2", None) unit is added for the base tables not in primary_parents & checks 2.4/2.5
+            other_stage_3_checks - bool or sql (e.g. the stage 3 check dictionaries) - if not False a ("3", None) unit is added for checks 3.3 - 3.6,
+                                   depending on the base tables referenced in it
+            schemas - optional catalog.schema_cache (defaults to the shared schema cache)
+        Output:
+            dict - (stage, table) -> set of (stage, table) parents, e.g. ("2", "fact_encounter") -> {("1", "encounters")}
+        Comments:
+            1. union tables (stage 1) have no parents, base tables (stage 2) depend on the union tables referenced in their parent query and
+               dashboard tables (stage 3) on the base tables referenced in their statistics' queries
+    """
+    if schemas is None:
+        schemas = shared_schema_cache
+    schemas.load_client(clients, validation_client, connection)
+    client_str = clients[validation_client].client
+
+    dag = dict()
+    # stage 1 - every table of the regional prod databases, checked against the union table of the same name:
+    for prod_database in clients[validation_client].prod_databases:
+        for table in schemas.tables(prod_database, connection):
+            dag[("1", table)] = set()
+
+    # stage 2 - base tables with a primary parent, depending on the union tables in the parent query:
+    base_tables = schemas.tables(client_str + "_base_tables", connection)
+    for table in base_tables:
+        if table in primary_parents:
+            dag[("2", table)] = set(("1", parent) for parent in referenced_tables(client_str + "_prod_union", primary_parents[table][1]) if ("1", parent) in dag)
+    if other_stage_2_checks:
+        dag[("2", None)] = set()
+
+    # stage 3 - dashboard tables, depending on the base tables in their statistics' queries:
+    for statistic in dash_to_base_query_dictionary:
+        dashboard_table = dash_to_base_query_dictionary[statistic][0]
+        parents = set(("2", base_table) for base_table in referenced_tables(client_str + "_base_tables", dash_to_base_query_dictionary[statistic][1:]) if ("2", base_table) in dag)
+        dag[("3", dashboard_table)] = dag.get(("3", dashboard_table), set()) | parents
+    if other_stage_3_checks is not False:
+        dag[("3", None)] = set(("2", base_table) for base_table in referenced_tables(client_str + "_base_tables", other_stage_3_checks) if ("2", base_table) in dag)
+    return dag
+
+
+def downstream_tables(dag, unit):
+    """ Gives the sorted list of table names downstream (children, grandchildren ...) of a unit of the check graph """
+    children = dict()
+    for child, parents in dag.items():
+        for parent in parents:
+            children.setdefault(parent, set()).add(child)
+    downstream = set()
+    to_visit = list(children.get(unit, set()))
+    while len(to_visit) > 0:
+        child = to_visit.pop()
+        if child not in downstream:
+            downstream.add(child)
+            to_visit += list(children.get(child, set()))
+    return sorted(set(table for stage, table in downstream if table is not None))
+
+
+def run_check_unit(unit, clients, validation_client, connection, primary_parents, dash_to_base_query_dictionary, definition_check_dictionary, track_check_dict,
+                   other_stage_3_dicts, schemas=None, stage_1=None, stage_2=None, stage_3=None):
+    """ Runs the checks of one unit of the check graph (a stage & table) on its own client object, giving the unit's failures
+        other_stage_3_dicts - list of the cumulative, onboard, business logic & between dashboard check dictionaries (for the ("3", None) unit)
+        Comments:
+            1. stage 3 units are given every statistic (with tables - the statistics of the unit's table, or none for the ("3", None) unit), so failure keys
+               and the table checks 3.3 - 3.5 are recorded under are the same as in a serial stage_3_driver run
+    """
+    if schemas is None:
+        schemas = shared_schema_cache
+    stage, table = unit
+    client_str = clients[validation_client].client
+    unit_clients = set_up_client(client_str, clients[validation_client].regions, clients[validation_client].prod_databases)
+    if stage == "1":
+        stage_1_driver(unit_clients, client_str, connection, schemas=schemas, tables=[table], **(stage_1 or dict()))
+    elif stage == "2" and table is not None:
+        stage_2_driver(primary_parents, unit_clients, client_str, dict(), dict(), connection, schemas=schemas, tables=[table], **(stage_2 or dict()))
+    elif stage == "2":
+        # base tables without a primary parent (recorded as not checked) & the definition/tracking checks
+        unchecked_tables = [base_table for base_table in schemas.tables(client_str + "_base_tables", connection) if base_table not in primary_parents]
+        stage_2_driver(primary_parents, unit_clients, client_str, definition_check_dictionary, track_check_dict, connection, schemas=schemas, tables=unchecked_tables, **(stage_2 or dict()))
+    elif table is not None:
+        stage_3_driver(dash_to_base_query_dictionary, unit_clients, dict(), dict(), dict(), dict(), client_str, connection, schemas=schemas, tables=[table], **(stage_3 or dict()))
+    else:
+        stage_3_driver(dash_to_base_query_dictionary, unit_clients, *other_stage_3_dicts, client_str, connection, schemas=schemas, tables=[], **(stage_3 or dict()))
+    return unit_clients[client_str].failures
+
+
+def run_check_dag(clients, validation_client, connection, primary_parents, dash_to_base_query_dictionary, definition_check_dictionary=None, track_check_dict=None,
+                  cumulative_check_dict=None, onboard_stat_dict=None, business_logic_dict=None, between_dash_comparison_dict=None,
+                  max_concurrent_checks=4, skip_on_failure=False, schemas=None, stage_1=None, stage_2=None, stage_3=None, units=None):
+    """ Driver function for running all three stages of a client's checks as a dependency graph (build_check_dag)
+        Inputs:
+            clients, validation_client, connection - as for the stage drivers
+            primary_parents, definition_check_dictionary, track_check_dict - the stage 2 driver inputs
+            dash_to_base_query_dictionary, cumulative_check_dict, onboard_stat_dict, business_logic_dict, between_dash_comparison_dict - the stage 3 driver inputs
+            max_concurrent_checks - int no. of tables checked at once - tables are checked as soon as all the tables they depend on have been checked
+            skip_on_failure - bool, if True a table's checks are skipped (with a warning) when a table it depends on has failed or was skipped
+            schemas - optional catalog.schema_cache (defaults to the shared schema cache)
+            stage_1, stage_2, stage_3 - optional dicts of other inputs for each stage driver - e.g. stage_2=dict(fingerprint_first=True)
+            units - optional set of the (stage, table) units to check (e.g. from planner.budget_plan) - the other units are not checked, with a warning
+        Output:
+            clients - with the failures of every table, and each failed table's node.dependencies set to the tables downstream of it
+    """
+    definition_check_dictionary = definition_check_dictionary or dict()
+    track_check_dict = track_check_dict or dict()
+    other_stage_3_dicts = [cumulative_check_dict or dict(), onboard_stat_dict or dict(), business_logic_dict or dict(), between_dash_comparison_dict or dict()]
+    has_other_stage_3_checks = any(len(check_dict) > 0 for check_dict in other_stage_3_dicts)
+    if schemas is None:
+        schemas = shared_schema_cache
+    client_str = clients[validation_client].client
+    # the table the ("3", None) unit's checks are recorded under, as in stage_3_driver
+    other_checks_table = stage_3_other_checks_table(dash_to_base_query_dictionary, client_str + "_dashboard_tables")
+
+    dag = build_check_dag(clients, validation_client, primary_parents, dash_to_base_query_dictionary, connection, other_stage_2_checks=True,
+                          other_stage_3_checks=other_stage_3_dicts if has_other_stage_3_checks else False, schemas=schemas)
+
+    def run_unit(unit):
+        """ Runs the checks of one unit on its own client object, giving the unit's failures """
+        return run_check_unit(unit, clients, validation_client, connection, primary_parents, dash_to_base_query_dictionary, definition_check_dictionary,
+                              track_check_dict, other_stage_3_dicts, schemas=schemas, stage_1=stage_1, stage_2=stage_2, stage_3=stage_3)
+
+    failures_lock = threading.Lock()
+
+    def record_failures(unit_failures):
+        """ Adds a unit's failures to the client's failures (tables checked in more than one stage share a node) """
+        with failures_lock:
+            for failed_table in unit_failures:
+                if failed_table in clients[validation_client].failures:
+                    clients[validation_client].failures[failed_table].failures.update(unit_failures[failed_table].failures)
+                else:
+                    clients[validation_client].failures[failed_table] = unit_failures[failed_table]
+
+    # failed or skipped units - the units downstream of these are skipped if skip_on_failure
+    failed_units = set()
+    done_units = set()
+    running = dict()
+    with ThreadPoolExecutor(max_workers=max_concurrent_checks) as executor:
+        while len(done_units) < len(dag):
+            # submitting every unit whose parents have all been checked (in a fixed order, so runs are repeatable)
+            ready_units = sorted((unit for unit in dag if unit not in done_units and unit not in running.values() and dag[unit] <= done_units), key=lambda unit: (unit[0], str(unit[1])))
+            for unit in ready_units:
+                if units is not None and unit not in units:
+                    deferred_table = unit[1] if unit[1] is not None else other_checks_table
+                    deferred = node(deferred_table, client_str, None, [])
+                    deferred.failures["{} deferred".format(unit[0])] = "WARNING: Stage {} checks - Table {} has not been checked in this run (deferred)\n".format(unit[0], deferred_table)
+                    record_failures({deferred_table: deferred})
+                    done_units.add(unit)
+                    continue
+                failed_parents = sorted(str(parent[1]) for parent in dag[unit] if parent in failed_units)
+                if skip_on_failure and len(failed_parents) > 0:
+                    skipped_table = unit[1] if unit[1] is not None else other_checks_table
+                    print("Stage {} checks skipped for {} - upstream table(s) failed: {}".format(unit[0], skipped_table, failed_parents))
+                    skipped = node(skipped_table, client_str, None, [])
+                    skipped.failures["{} skipped".format(unit[0])] = "WARNING: Stage {} checks - Table {} has not been checked as upstream table(s) failed: {}\n".format(unit[0], skipped_table, ", ".join(failed_parents))
+                    record_failures({skipped_table: skipped})
+                    failed_units.add(unit)
+                    done_units.add(unit)
+                else:
+                    running[executor.submit(contextvars.copy_context().run, run_unit, unit)] = unit
+            if len(running) == 0:
+                if len(ready_units) == 0:
+                    raise ValueError("check graph has a cycle - units left unchecked: {}".format(sorted(str(unit) for unit in dag if unit not in done_units)))
+                continue
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                unit = running.pop(future)
+                unit_failures = future.result()
+                if any(message.startswith("FAILURE") for failed_table in unit_failures for message in unit_failures[failed_table].failures.values()):
+                    failed_units.add(unit)
+                record_failures(unit_failures)
+                done_units.add(unit)
+
+    # recording the downstream tables of each failed table, for the downstream warnings of output_client_validation_results
+    for unit in failed_units:
+        if unit[1] in clients[validation_client].failures:
+            failed_node = clients[validation_client].failures[unit[1]]
+            failed_node.dependencies = sorted((set(failed_node.dependencies) | set(downstream_tables(dag, unit))) - {unit[1]})
+    return clients
@@ -0,0 +1,114 @@
+# The code base for answering row counts from the glue data catalog's table & partition statistics rather than scanning the tables - counts are only
+# used when the statistics are marked exact (COLUMN_STATS_ACCURATE) and fresh (within a required max age / since a load), otherwise the checks fall
+# back to a COUNT(*) scan. Note: appends (new s3 files, INSERT INTO) do not update the statistics' time, so the loads need to refresh the statistics --
+
+# import required packages
+import json
+import threading
+import time
+
+# the partition value hive/glue give NULL partition values (e.g. rows of a union table with a NULL region)
+null_partition_value = "__HIVE_DEFAULT_PARTITION__"
+
+
+def exact_row_count(parameters, max_age_seconds=None, fresh_since=None):
+    """ Gives the row count of a table's or partition's glue parameters - None unless numRows is marked exact (COLUMN_STATS_ACCURATE BASIC_STATS)
+        and fresh (last updated, transient_lastDdlTime, within max_age_seconds & not before fresh_since)
+    """
+    try:
+        accurate = json.loads(parameters.get("COLUMN_STATS_ACCURATE", "{}"))
+        row_count = int(parameters["numRows"])
+        updated_at = int(parameters["transient_lastDdlTime"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not isinstance(accurate, dict) or str(accurate.get("BASIC_STATS")).lower() != "true" or row_count < 0:
+        return None
+    if max_age_seconds is not None and time.time() - updated_at > max_age_seconds:
+        return None
+    if fresh_since is not None and updated_at < fresh_since:
+        return None
+    return row_count
+
+
+# Creating glue row counts class for getting the row counts of tables (& of each value of a partition column) from glue statistics
+class glue_row_counts:
+    def __init__(self, glue_client=None, catalog_id=None, max_age_seconds=None, fresh_since=None, region_name=None):
+        """ Inputs:
+                glue_client - optional boto3 glue client (default a new client for region_name)
+                catalog_id - optional glue catalog id (aws account id) of the databases
+                max_age_seconds - max age of the statistics (since the table/partition definition was last updated) for them to be used
+                fresh_since - unix time the statistics need to be from (e.g. when the last load into the tables finished)
+                              note: at least one of max_age_seconds & fresh_since is needed - statistics of any age are never trusted
+                region_name - optional aws region of the glue catalog, if glue_client is not given
+            Comments:
+                1. statistics are read once per table for the life of this object - a new object is needed to pick up newer statistics
+                2. a partitioned table's count is the sum of its partitions', and is only used if every partition's statistics are exact & fresh
+                3. freshness is judged by transient_lastDdlTime, which glue/hive update when the table or partition definition (or its statistics) is
+                   altered - NOT when files are added to s3 or rows are appended by an INSERT INTO. So only use row_counts where each load also updates
+                   the statistics (e.g. ANALYZE or a glue job setting numRows), with fresh_since the end of the last load - otherwise counts of rows
+                   appended since the statistics were taken would be missed
+        """
+        if max_age_seconds is None and fresh_since is None:
+            raise ValueError("glue_row_counts needs a freshness bound - max_age_seconds and/or fresh_since (e.g. when the last load into the tables finished)")
+        if glue_client is None:
+            import boto3
+            glue_client = boto3.client("glue", region_name=region_name)
+        self.glue_client = glue_client
+        self.catalog_id = catalog_id
+        self.max_age_seconds = max_age_seconds
+        self.fresh_since = fresh_since
+        self.tables = dict()
+        self.lock = threading.Lock()
+
+    def catalog_arguments(self):
+        return dict() if self.catalog_id is None else {"CatalogId": self.catalog_id}
+
+    def table_statistics(self, database, table):
+        """ Gives (partition column names, table row count, list of (partition values, row count)) - counts are None where not exact & fresh """
+        key = (database.lower(), table.lower())
+        with self.lock:
+            if key in self.tables:
+                return self.tables[key]
+
+        try:
+            table_definition = self.glue_client.get_table(DatabaseName=database, Name=table, **self.catalog_arguments())["Table"]
+            partition_columns = [column["Name"].lower() for column in table_definition.get("PartitionKeys", list())]
+            table_count = exact_row_count(table_definition.get("Parameters", dict()), self.max_age_seconds, self.fresh_since)
+            partitions = list()
+            if len(partition_columns) > 0:
+                for page in self.glue_client.get_paginator("get_partitions").paginate(DatabaseName=database, TableName=table, **self.catalog_arguments()):
+                    for partition in page["Partitions"]:
+                        partitions.append((partition["Values"], exact_row_count(partition.get("Parameters", dict()), self.max_age_seconds, self.fresh_since)))
+        except Exception as error:
+            # no statistics available (e.g. no glue access) - the counts are left to a scan
+            print("Glue statistics not available for {}.{}, counting by scan: ".format(database, table), error)
+            partition_columns, table_count, partitions = list(), None, list()
+
+        with self.lock:
+            self.tables[key] = partition_columns, table_count, partitions
+        return self.tables[key]
+
+    def table_count(self, database, table):
+        """ Gives the exact row count of a table from its statistics - None if not known (missing or stale statistics) """
+        partition_columns, table_count, partitions = self.table_statistics(database, table)
+        if len(partition_columns) == 0:
+            return table_count
+        if any(count is None for _, count in partitions):
+            return None
+        return sum(count for _, count in partitions)
+
+    def partition_counts(self, database, table, partition_column):
+        """ Gives the exact row count of each value of a partition column (e.g. region of a union table) from the partition statistics
+            Output:
+                dict - value -> row count, with NULL values under the key None (as from functions.union_region_counts) - a value with no partition has no rows
+                None - if the table is not partitioned by partition_column or any partition's statistics are missing or stale
+        """
+        partition_columns, _, partitions = self.table_statistics(database, table)
+        if partition_column.lower() not in partition_columns or any(count is None for _, count in partitions):
+            return None
+        column_index = partition_columns.index(partition_column.lower())
+        counts = dict()
+        for values, count in partitions:
+            value = None if values[column_index] == null_partition_value else values[column_index]
+            counts[value] = counts.get(value, 0) + count
+        return counts
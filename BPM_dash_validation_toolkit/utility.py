@@ -15,36 +15,28 @@ def set_up_client(client_str, regions_list, prod_databases_list):
     return clients_dict
 
 # Function to be an import that will allow for sending validation output to analytics slack channel:
-import requests
-import json
-#send data to webhook
+from .report import report_records, render_report, slack_sink
+#send data to webhook (blocking - waits for every message to be delivered)
 def send_data(text, slack_webhook):
-    WEBHOOK = slack_webhook
-    data = {"text":text}
-    headers = {'content-type': 'application/json'}
-    res = requests.post(WEBHOOK, data=json.dumps(data), headers=headers)
-    print(res.text)
+    sink = slack_sink(slack_webhook)
+    sink.send(text)
+    sink.close()
     
 # Creating utility function for outputting all the client failures and warnings:
-def output_client_validation_results(clients, slack_webhook, send_to_slack=True):
+def output_client_validation_results(clients, slack_webhook, send_to_slack=True, format="text", sink=None):
     """
         Print out the warnings/errors from the validation, and if send to slack parameter is not false, then also send to analytics slack channel
+        format - "text" (default), "markdown" or "json" (see report.render_report)
+        sink - optional report.slack_sink to send with (e.g. with other timeout/retries) - by default a new slack_sink for slack_webhook
+        The report is sent in the background (split into messages that fit slack's limits) - the sink is returned, sink.flush() waits for delivery
+        (python also waits for queued messages before exiting)
     """
-    output_string = ""
-    # For a particular client:
-    for bpmclient in clients:
-        output_string += "------------------------------------------------------------Beginning Failures Output for {}-----------------------------------------------------\n".format(bpmclient)
-        output_string += "For client {}, the failures are:\n".format(bpmclient)
-        for failed_tables in clients[bpmclient].failures:
-            for failure in clients[bpmclient].failures[failed_tables].failures:
-                output_string += clients[bpmclient].failures[failed_tables].failures[failure]
-                for child in clients[bpmclient].failures[failed_tables].dependencies:
-                    output_string +="WARNING: Check {} failed for {} - this may affect the downstream table {}\n".format(failure, failed_tables, child)
-        output_string += "------------------------------------------------------------End of Failures output for {}-----------------------------------------------------\n\n".format(bpmclient)
+    output_string = render_report(report_records(clients), format)
+    # first print out
+    print(output_string)
     if send_to_slack == True:
-        # first print out
-        print(output_string)
         # then send to slack channel: 
-        send_data(output_string, slack_webhook)
-    else:
-        print(output_string)
+        sink = sink if sink is not None else slack_sink(slack_webhook)
+        sink.send(output_string)
+        return sink
+    return None
@@ -0,0 +1,87 @@
+# The code base for incremental validation - keeping a watermark (last value seen of an update time/partition column) & running totals per table,
+# so later runs only check the rows past the watermark and combine these with the stored totals --
+
+# import required packages
+import json
+import os
+import threading
+import time
+
+
+def watermark_key(*parts):
+    """ Gives the store key for a check slice - e.g. watermark_key("1.1", "jj_prod_union", "fact_encounter", "eu-west-2") """
+    return "|".join(str(part) for part in parts)
+
+
+# Creating watermark store class for keeping each table's watermark & totals (as json) between runs
+class watermark_store:
+    def __init__(self, path=None, full_refresh=False, full_refresh_after_seconds=None):
+        """ Inputs:
+                path - optional json file path the watermarks are kept in between runs (None keeps them in memory only)
+                full_refresh - bool, if True every table is fully re-validated this run (and its watermark & totals re-set)
+                full_refresh_after_seconds - optional no. of seconds after a table's last full validation that it is fully re-validated again
+                                             - e.g. 7 * 24 * 60 * 60 for a weekly full run, with incremental runs in between
+        """
+        # key -> {"column", "watermark", "watermark_type", "totals": dict, "validated_at": epoch, "full_validated_at": epoch}
+        self.entries = dict()
+        self.path = path
+        self.full_refresh = full_refresh
+        self.full_refresh_after_seconds = full_refresh_after_seconds
+        self.lock = threading.RLock()
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as store_file:
+                self.entries = json.load(store_file)
+
+    def write(self):
+        """ Writes the store to the json file (if a path was given) """
+        if self.path is None:
+            return
+        with self.lock:
+            store_directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(store_directory, exist_ok=True)
+            # write to a temp file and swap in, so a crashed run never leaves a half written store
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as store_file:
+                json.dump(self.entries, store_file)
+            os.replace(temp_path, self.path)
+
+    def needs_full_refresh(self, key, column):
+        """ Checks whether a slice needs a full validation - forced, no watermark yet, watermark column changed or last full validation too old """
+        with self.lock:
+            entry = self.entries.get(key)
+            if self.full_refresh or entry is None or entry["column"] != column or entry["watermark"] is None:
+                return True
+            return self.full_refresh_after_seconds is not None and time.time() - entry["full_validated_at"] > self.full_refresh_after_seconds
+
+    def totals(self, key):
+        """ Gives the stored totals of a slice (empty dict if there are none) """
+        with self.lock:
+            entry = self.entries.get(key)
+            return dict(entry["totals"]) if entry is not None else dict()
+
+    def condition(self, key, column):
+        """ Gives the sql condition for the rows past a slice's watermark - 1 = 1 (all rows) if the slice needs a full validation """
+        if self.needs_full_refresh(key, column):
+            return "1 = 1"
+        with self.lock:
+            entry = self.entries[key]
+            return "{} > CAST('{}' AS {})".format(column, str(entry["watermark"]).replace("'", "''"), entry["watermark_type"])
+
+    def update(self, key, column, watermark, watermark_type, totals, full):
+        """ Records a successful validation of a slice - the new watermark (kept as is if no new rows were seen) & the combined totals """
+        with self.lock:
+            now = time.time()
+            entry = self.entries.get(key, dict())
+            if watermark is None and not full:
+                watermark, watermark_type = entry.get("watermark"), entry.get("watermark_type")
+            self.entries[key] = {"column": column, "watermark": watermark, "watermark_type": watermark_type, "totals": totals,
+                                 "validated_at": now, "full_validated_at": now if full else entry.get("full_validated_at", now)}
+            self.write()
+
+    def invalidate(self, pattern=None):
+        """ Drops all watermarks, or those whose key contains pattern (e.g. a table name), so these are fully re-validated on the next run """
+        with self.lock:
+            for key in list(self.entries):
+                if pattern is None or pattern in key:
+                    self.entries.pop(key)
+            self.write()
@@ -0,0 +1,57 @@
+# Benchmarks the import time of the toolkit - each import is timed in a fresh python process (so nothing is already loaded), reporting the median
+# time & which of the heavy dependencies (pandas, pyathena, requests, numpy) each import loaded -- e.g.
+#     python benchmarks/import_time.py --repeat 5
+
+# import required packages
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+imports = ["import BPM_dash_validation_toolkit",
+           "from BPM_dash_validation_toolkit import set_up_client",
+           "from BPM_dash_validation_toolkit import output_client_validation_results",
+           "from BPM_dash_validation_toolkit import stage_1_driver",
+           "from BPM_dash_validation_toolkit import stage_1_driver, stage_2_driver, stage_3_driver, run_query; import pandas"]
+
+heavy_modules = ["pandas", "numpy", "pyathena", "requests", "pyarrow"]
+
+timing_script = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [module for module in {heavy_modules} if module in sys.modules]}}))
+"""
+
+
+def time_import(statement, repeat=5):
+    """ Times an import statement in repeat fresh python processes - gives {"statement", "seconds" (median), "runs", "loaded"} """
+    runs = list()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", timing_script.format(statement=statement, heavy_modules=heavy_modules)], cwd=repo_root,
+                                capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {"statement": statement, "seconds": statistics.median(run["seconds"] for run in runs), "runs": [run["seconds"] for run in runs], "loaded": runs[-1]["loaded"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the toolkit")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes each import is timed in (the median is reported)")
+    parser.add_argument("--output", default=None, help="json file the results are written to")
+    arguments = parser.parse_args(argv)
+
+    results = [time_import(statement, arguments.repeat) for statement in imports]
+    for result in results:
+        print("{:>8.1f} ms  {}  (loaded: {})".format(result["seconds"] * 1000, result["statement"], ", ".join(result["loaded"]) or "none"))
+    if arguments.output is not None:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# A local stand-in for athena, for benchmarking the toolkit without an aws account - the toolkit's duckdb backend (which emulates the athena
+# behaviour the toolkit relies on - information_schema casing, _colN names of unnamed columns & presto functions), counting the queries run --
+
+# import required packages
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BPM_dash_validation_toolkit.backends import duckdb_backend, duckdb_cursor  # noqa: E402
+
+
+# Creating local connection class - a duckdb backend counting the queries run
+class local_connection(duckdb_backend):
+    def __init__(self, database=":memory:"):
+        """ Inputs:
+                database - duckdb database file path, or ":memory:" (default) for an in memory database
+        """
+        duckdb_backend.__init__(self, database=database)
+        self.query_count = 0
+
+    def cursor(self, *args, **kwargs):
+        return local_cursor(self)
+
+
+class local_cursor(duckdb_cursor):
+    def execute(self, query, *args):
+        with self.backend.lock:
+            self.backend.query_count += 1
+        return duckdb_cursor.execute(self, query, *args)
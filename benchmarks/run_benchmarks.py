@@ -0,0 +1,122 @@
+# Benchmarks the stage drivers on a local athena stand-in (benchmarks/local_athena.py) with synthetic data (benchmarks/synthetic.py),
+# reporting wall time, query count & peak memory of each driver -- e.g.
+#     python benchmarks/run_benchmarks.py --regions 3 --tables 10 --rows 1000000 --repeat 3 --output results.json
+#     python benchmarks/run_benchmarks.py --stage-options '{"stage_1": {"group_by_region": true}, "stage_2": {"fingerprint_first": true}}'
+
+# import required packages
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+# the toolkit loads pandas lazily on the first query - loaded up front so its import is not timed in the first driver run
+import pandas  # noqa: F401
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BPM_dash_validation_toolkit import stage_1_driver, stage_2_driver, stage_3_driver, schema_cache  # noqa: E402
+from BPM_dash_validation_toolkit.utility import set_up_client  # noqa: E402
+from local_athena import local_connection  # noqa: E402
+from synthetic import generate  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+stage_drivers = [("stage_1", stage_1_driver), ("stage_2", stage_2_driver), ("stage_3", stage_3_driver)]
+
+
+def max_rss_mb():
+    """ Gives the peak resident memory of the process so far (MB) - None where not available """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux gives KB, macOS gives bytes
+    return max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def benchmark_driver(stage_driver, client_config, connection, stage_inputs):
+    """ Runs one stage driver on a fresh client object & schema cache, giving its wall time, query count & peak (python heap) memory """
+    clients = set_up_client(client_config["validation_client"], client_config["clients"][client_config["validation_client"]].regions,
+                            client_config["clients"][client_config["validation_client"]].prod_databases)
+    queries_before = connection.query_count
+    tracemalloc.start()
+    start = time.perf_counter()
+    # the drivers print every check - kept out of the benchmark output
+    with contextlib.redirect_stdout(io.StringIO()):
+        clients = stage_driver(clients=clients, validation_client=client_config["validation_client"], connection=connection, schemas=schema_cache(), **stage_inputs)
+    wall_time = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"wall_time_seconds": wall_time, "queries": connection.query_count - queries_before, "peak_memory_mb": peak_memory / 1024 ** 2,
+            "failures": sum(len(failed_table.failures) for failed_table in clients[client_config["validation_client"]].failures.values())}
+
+
+def run_benchmarks(scale, repeat=3, stage_options=None, database=":memory:"):
+    """ Generates a synthetic client at the given scale (generate inputs) & benchmarks each stage driver repeat times
+        Output:
+            dict - {"scale", "stage_options", "generate_seconds", "drivers": {stage: {"wall_time_seconds" (median), "wall_time_runs", "queries", "peak_memory_mb", "failures"}},
+                    "max_rss_mb"}
+    """
+    stage_options = stage_options or dict()
+    connection = local_connection(database)
+    start = time.perf_counter()
+    client_config = generate(connection, **scale)
+    generate_seconds = time.perf_counter() - start
+
+    results = {"scale": scale, "stage_options": stage_options, "generate_seconds": generate_seconds, "drivers": dict()}
+    for stage, stage_driver in stage_drivers:
+        runs = [benchmark_driver(stage_driver, client_config, connection, dict(client_config[stage], **stage_options.get(stage, dict()))) for _ in range(repeat)]
+        results["drivers"][stage] = {"wall_time_seconds": statistics.median(run["wall_time_seconds"] for run in runs),
+                                     "wall_time_runs": [run["wall_time_seconds"] for run in runs],
+                                     "queries": runs[-1]["queries"],
+                                     "peak_memory_mb": max(run["peak_memory_mb"] for run in runs),
+                                     "failures": runs[-1]["failures"]}
+    results["max_rss_mb"] = max_rss_mb()
+    connection.close()
+    return results
+
+
+def format_results(results):
+    """ Gives a text table of benchmark results """
+    output_string = "Scale: {} (generated in {:.1f}s), stage options: {}\n".format(results["scale"], results["generate_seconds"], results["stage_options"])
+    output_string += "{:<10}{:>14}{:>10}{:>18}{:>10}\n".format("driver", "wall time (s)", "queries", "peak memory (MB)", "failures")
+    for stage, driver_results in results["drivers"].items():
+        output_string += "{:<10}{:>14.3f}{:>10}{:>18.1f}{:>10}\n".format(stage, driver_results["wall_time_seconds"], driver_results["queries"],
+                                                                        driver_results["peak_memory_mb"], driver_results["failures"])
+    if results["max_rss_mb"] is not None:
+        output_string += "process peak resident memory: {:.1f} MB\n".format(results["max_rss_mb"])
+    return output_string
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stage drivers on a local athena stand-in with synthetic data")
+    parser.add_argument("--regions", type=int, default=3)
+    parser.add_argument("--tables", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=100000, help="rows of each table in each region")
+    parser.add_argument("--key-cardinality", type=int, default=None, help="distinct keys of each table in each region (default: every key unique)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="share of base table rows duplicated")
+    parser.add_argument("--pathways", type=int, default=4)
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--overlap-rate", type=float, default=0.1, help="share of patients on a second pathway")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each driver (the median wall time is reported)")
+    parser.add_argument("--stage-options", type=json.loads, default=None, help='json of other driver inputs by stage, e.g. {"stage_1": {"group_by_region": true}}')
+    parser.add_argument("--database", default=":memory:", help="duckdb database file (default in memory)")
+    parser.add_argument("--output", default=None, help="json file the results are written to")
+    arguments = parser.parse_args(argv)
+
+    scale = {"regions": arguments.regions, "tables": arguments.tables, "rows": arguments.rows, "key_cardinality": arguments.key_cardinality,
+             "duplicate_rate": arguments.duplicate_rate, "pathways": arguments.pathways, "patients": arguments.patients, "overlap_rate": arguments.overlap_rate}
+    results = run_benchmarks(scale, repeat=arguments.repeat, stage_options=arguments.stage_options, database=arguments.database)
+    print(format_results(results))
+    if arguments.output is not None:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
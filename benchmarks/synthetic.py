@@ -0,0 +1,75 @@
+# Synthetic client data for benchmarking - regional prod tables, their union & base tables, and a pathway dashboard table, at a chosen scale --
+
+# import required packages
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BPM_dash_validation_toolkit.utility import set_up_client  # noqa: E402
+
+
+def generate(connection, client="bench", regions=3, tables=5, rows=100000, key_cardinality=None, duplicate_rate=0.0, pathways=4, patients=10000, overlap_rate=0.1):
+    """ Creates a synthetic client on a local_athena.local_connection, giving the driver inputs for it
+        Inputs:
+            connection - local_athena.local_connection
+            client - string client name (database prefix) - e.g. 'bench'
+            regions - int no. of regions, each with a prod database of every table
+            tables - int no. of tables in each prod database (and the union & base tables databases)
+            rows - int no. of rows of each table in each region
+            key_cardinality - optional int no. of distinct primary keys of each table in each region (default rows - every key unique), keys repeat past this
+            duplicate_rate - float share of base table rows duplicated (so check 2.3 has duplicate keys to find)
+            pathways - int no. of pathways on the dashboard table (0 for a dashboard table without pathways)
+            patients - int no. of patients on the pathways of the dashboard table
+            overlap_rate - float share of patients on a second pathway (for the check 3.1 pathway overlap)
+        Output:
+            dict - {"clients", "validation_client", "stage_1", "stage_2", "stage_3"} - the driver inputs, as a runner.run_clients client config
+    """
+    key_cardinality = key_cardinality or rows
+    region_names = ["region-{}".format(region) for region in range(regions)]
+    prod_databases = ["{}_prod_{}".format(client, region) for region in range(regions)]
+    for database in prod_databases + [client + "_prod_union", client + "_base_tables", client + "_dashboard_tables"]:
+        connection.execute("CREATE SCHEMA IF NOT EXISTS {}".format(database))
+
+    primary_parents = dict()
+    for table_index in range(tables):
+        table = "fact_table_{}".format(table_index)
+        # regional prod tables - keys are offset by region so each region's keys are distinct
+        for region in range(regions):
+            connection.execute("""CREATE OR REPLACE TABLE {}.{} AS
+                                  SELECT CAST({} + row_number % {} AS VARCHAR) AS id, row_number % 97 AS value, DATE '2024-01-01' + CAST(row_number % 365 AS INTEGER) AS load_date
+                                  FROM (SELECT range AS row_number FROM range({}))""".format(prod_databases[region], table, region * key_cardinality, key_cardinality, rows))
+        # union table - all regions' rows with their region
+        connection.execute("CREATE OR REPLACE TABLE {}.{} AS {}".format(client + "_prod_union", table, " UNION ALL ".join(
+                           "SELECT *, '{}' AS region FROM {}.{}".format(region_names[region], prod_databases[region], table) for region in range(regions))))
+        # base table - union rows, with duplicate_rate of the rows duplicated
+        connection.execute("""CREATE OR REPLACE TABLE {base}.{table} AS
+                              SELECT id, value, load_date FROM {union}.{table}
+                              UNION ALL
+                              SELECT id, value, load_date FROM {union}.{table} WHERE hash(id || region) % 1000000 < {threshold}""".format(
+                              base=client + "_base_tables", union=client + "_prod_union", table=table, threshold=int(duplicate_rate * 1000000)))
+        primary_parents[table] = [0, "FROM {}_prod_union.{}".format(client, table), "id"]
+
+    # patients on pathways (some on a second pathway) & the dashboard table of patient counts per pathway, with a select all row
+    pathway_count = max(pathways, 1)
+    connection.execute("""CREATE OR REPLACE TABLE {base}.patient_pathways AS
+                          SELECT CAST(range AS VARCHAR) AS patient_id, 'pathway_' || CAST(range % {pathways} AS VARCHAR) AS pathway_name FROM range({patients})
+                          UNION ALL
+                          SELECT CAST(range AS VARCHAR), 'pathway_' || CAST((range + 1) % {pathways} AS VARCHAR) FROM range({patients})
+                          WHERE {pathways} > 1 AND hash(range) % 1000000 < {threshold}""".format(base=client + "_base_tables", pathways=pathway_count, patients=patients, threshold=int(overlap_rate * 1000000)))
+    if pathways > 0:
+        connection.execute("""CREATE OR REPLACE TABLE {dash}.overview_weekly AS
+                              SELECT pathway_name, COUNT(DISTINCT patient_id) AS patients FROM {base}.patient_pathways GROUP BY pathway_name
+                              UNION ALL
+                              SELECT 'Select all', COUNT(DISTINCT patient_id) FROM {base}.patient_pathways""".format(dash=client + "_dashboard_tables", base=client + "_base_tables"))
+    else:
+        connection.execute("CREATE OR REPLACE TABLE {}.overview_weekly AS SELECT COUNT(DISTINCT patient_id) AS patients FROM {}.patient_pathways".format(client + "_dashboard_tables", client + "_base_tables"))
+
+    dash_to_base_query_dictionary = {"patients": ["overview_weekly", "SELECT COUNT(DISTINCT patient_id) FROM {}_base_tables.patient_pathways".format(client),
+                                                  "SELECT patient_id, pathway_name FROM {}_base_tables.patient_pathways".format(client) if pathways > 1 else []]}
+
+    return {"clients": set_up_client(client, region_names, prod_databases),
+            "validation_client": client,
+            "stage_1": dict(),
+            "stage_2": dict(primary_parents=primary_parents, definition_check_dictionary=dict(), track_check_dict=dict()),
+            "stage_3": dict(dash_to_base_query_dictionary=dash_to_base_query_dictionary, cumulative_check_dict=dict(), onboard_stat_dict=dict(),
+                            business_logic_dict=dict(), between_dash_comparison_dict=dict())}
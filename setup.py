@@ -1,18 +1,19 @@
-import setuptools
-
-with open("README.md", "r", encoding="utf-8") as fh:
-    long_description = fh.read()
-
-setuptools.setup(
-    name='BPM_dash_validation_toolkit',
-    version='0.27.01',
-    author='Liam Ephraims',
-    author_email='liam.ephraims@bigpicturemedical.com',
-    description='Use driver functions and utility functions to run stage 1, 2 and 3 checks, can also run individual checks',
-    long_description=long_description,
-    long_description_content_type="text/markdown",
-    url='https://github.com/liamephraims-BPM/BPM_dash_validation_toolkit',
-    license='MIT',
-    packages=['BPM_dash_validation_toolkit'],
-    install_requires=['pyathena', 'pandas'] #, 
-)
+import setuptools
+
+with open("README.md", "r", encoding="utf-8") as fh:
+    long_description = fh.read()
+
+setuptools.setup(
+    name='BPM_dash_validation_toolkit',
+    version='0.27.01',
+    author='Liam Ephraims',
+    author_email='liam.ephraims@bigpicturemedical.com',
+    description='Use driver functions and utility functions to run stage 1, 2 and 3 checks, can also run individual checks',
+    long_description=long_description,
+    long_description_content_type="text/markdown",
+    url='https://github.com/liamephraims-BPM/BPM_dash_validation_toolkit',
+    license='MIT',
+    packages=['BPM_dash_validation_toolkit'],
+    install_requires=['pyathena', 'pandas', 'requests'], #, 
+    extras_require={'cache': ['pyarrow'], 'arrow': ['pyarrow'], 'duckdb': ['duckdb', 'pyarrow'], 'benchmark': ['duckdb', 'pyarrow'], 'test': ['pytest', 'duckdb', 'pyarrow'], 'glue': ['boto3']}
+)
@@ -0,0 +1,34 @@
+# Shared fixtures for the tests - a local duckdb stand-in for athena (benchmarks/local_athena.py) with a small synthetic client (benchmarks/synthetic.py) --
+
+# import required packages
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from local_athena import local_connection  # noqa: E402
+from synthetic import generate  # noqa: E402
+from BPM_dash_validation_toolkit import execution  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def default_settings():
+    """ Puts the module level settings (fetch mode, query cache, in flight cap, check pool) back to their defaults after each test """
+    yield
+    execution.set_fetch_mode()
+    execution.set_query_cache(None)
+    execution.set_max_in_flight_queries(None)
+    execution.set_check_pool(None)
+
+
+@pytest.fixture
+def connection():
+    connection = local_connection()
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def client(connection):
+    """ A small synthetic client - 2 regions, 2 tables of 200 rows - giving the driver inputs (synthetic.generate) """
+    return generate(connection, client="test", regions=2, tables=2, rows=200, pathways=3, patients=100)
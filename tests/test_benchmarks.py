@@ -0,0 +1,56 @@
+# Tests of the benchmark suite (benchmarks/) - the synthetic client generator & the driver benchmarks --
+
+# import required packages
+import json
+from synthetic import generate
+from run_benchmarks import run_benchmarks, format_results, main
+
+
+def scalar(connection, query):
+    return connection.database.execute(query).fetchone()[0]
+
+
+def test_generate_scale(connection):
+    client_config = generate(connection, client="scaled", regions=3, tables=2, rows=300, key_cardinality=50, duplicate_rate=0.2, pathways=4, patients=80, overlap_rate=0.5)
+    assert client_config["clients"]["scaled"].prod_databases == ["scaled_prod_0", "scaled_prod_1", "scaled_prod_2"]
+    assert sorted(client_config["stage_2"]["primary_parents"]) == ["fact_table_0", "fact_table_1"]
+    for region in range(3):
+        assert scalar(connection, "SELECT COUNT(*) FROM scaled_prod_{}.fact_table_1".format(region)) == 300
+        assert scalar(connection, "SELECT COUNT(DISTINCT id) FROM scaled_prod_{}.fact_table_1".format(region)) == 50
+    # each region's keys are distinct, and every union row has its region
+    assert scalar(connection, "SELECT COUNT(DISTINCT id) FROM scaled_prod_union.fact_table_1") == 150
+    assert connection.database.execute("SELECT region, COUNT(*) FROM scaled_prod_union.fact_table_1 GROUP BY region ORDER BY region").fetchall() == [
+        ("region-0", 300), ("region-1", 300), ("region-2", 300)]
+    assert 900 < scalar(connection, "SELECT COUNT(*) FROM scaled_base_tables.fact_table_1") < 900 * 1.4
+    # every patient on one of the pathways, some on a second - the select all row counts each patient once
+    assert scalar(connection, "SELECT COUNT(DISTINCT pathway_name) FROM scaled_base_tables.patient_pathways") == 4
+    assert 80 < scalar(connection, "SELECT COUNT(*) FROM scaled_base_tables.patient_pathways") < 160
+    assert scalar(connection, "SELECT patients FROM scaled_dashboard_tables.overview_weekly WHERE pathway_name = 'Select all'") == 80
+
+
+def test_generate_without_pathways(connection):
+    client_config = generate(connection, client="flat", regions=1, tables=1, rows=10, pathways=0, patients=20)
+    assert connection.database.execute("SELECT * FROM flat_dashboard_tables.overview_weekly").fetchall() == [(20,)]
+    assert client_config["stage_3"]["dash_to_base_query_dictionary"]["patients"][2] == []
+
+
+def test_run_benchmarks_reports_each_driver(tmp_path):
+    scale = dict(client="bench", regions=2, tables=2, rows=100, pathways=3, patients=50)
+    results = run_benchmarks(scale, repeat=2)
+    assert list(results["drivers"]) == ["stage_1", "stage_2", "stage_3"]
+    for driver_results in results["drivers"].values():
+        assert driver_results["queries"] > 0
+        assert len(driver_results["wall_time_runs"]) == 2 and driver_results["peak_memory_mb"] > 0
+    # clean data - only the warning that patient_pathways (no primary parent) is not checked by stage 2
+    assert [driver_results["failures"] for driver_results in results["drivers"].values()] == [0, 1, 0]
+    # grouping by region scans each union table once - fewer queries for the same (no) failures
+    grouped = run_benchmarks(scale, repeat=1, stage_options={"stage_1": {"group_by_region": True}})["drivers"]["stage_1"]
+    assert grouped["queries"] < results["drivers"]["stage_1"]["queries"] and grouped["failures"] == 0
+    # duplicated base rows are found by check 2.3
+    assert run_benchmarks(dict(scale, duplicate_rate=0.1), repeat=1)["drivers"]["stage_2"]["failures"] > 1
+
+    assert all(stage in format_results(results) for stage in results["drivers"])
+    output_path = str(tmp_path / "results.json")
+    main(["--regions", "1", "--tables", "1", "--rows", "10", "--patients", "10", "--repeat", "1", "--output", output_path])
+    with open(output_path, encoding="utf-8") as results_file:
+        assert sorted(json.load(results_file)["drivers"]) == ["stage_1", "stage_2", "stage_3"]
@@ -0,0 +1,63 @@
+# Tests of the cached athena catalog (catalog.py) --
+
+# import required packages
+from BPM_dash_validation_toolkit.catalog import schema_cache, shared_schema_cache, shared_schema_ttl_seconds, set_shared_schema_ttl
+from BPM_dash_validation_toolkit.functions import check_3_2, check_3_4, stage_2_driver
+from BPM_dash_validation_toolkit.instrumentation import query_recorder, set_query_recorder
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+def test_shared_cache_expires(connection, client):
+    assert shared_schema_cache.ttl_seconds is not None
+    schemas = schema_cache(ttl_seconds=shared_schema_cache.ttl_seconds)
+    assert "new_table" not in schemas.tables("test_base_tables", connection)
+    connection.execute("CREATE TABLE test_base_tables.new_table AS SELECT 1 AS id")
+    assert "new_table" not in schemas.tables("test_base_tables", connection)
+    # past the ttl, the database is re-read
+    schemas.loaded_at["test_base_tables"] -= shared_schema_cache.ttl_seconds + 1
+    assert schemas.table_columns("test_base_tables", "new_table", connection) == ["id"]
+
+
+def test_snapshot_shared_between_caches(connection, client, tmp_path):
+    snapshot_path = str(tmp_path / "catalog.json")
+    schema_cache(snapshot_path=snapshot_path).load_client(client["clients"], "test", connection)
+    queries_before = connection.query_count
+    assert schema_cache(snapshot_path=snapshot_path).has_column("test_prod_union", "fact_table_0", "REGION", connection)
+    assert connection.query_count == queries_before
+
+
+def test_tables_listed_without_visible_columns(connection, client):
+    # a table athena lists in information_schema.TABLES but gives no columns for in COLUMNS is still checked by stage 1
+    connection.execute("CREATE TABLE test_prod_0.hidden_table AS SELECT 1 AS id")
+    connection.execute("""CREATE OR REPLACE VIEW athena_information_schema.columns AS
+                          SELECT table_schema, table_name, column_name, ordinal_position, data_type FROM information_schema.columns WHERE table_name <> 'hidden_table'""")
+    schemas = schema_cache()
+    assert "hidden_table" in schemas.tables("test_prod_0", connection)
+    assert schemas.table_columns("test_prod_0", "hidden_table", connection) == []
+    assert schemas.table_columns("test_prod_0", "fact_table_0", connection) == ["id", "value", "load_date"]
+
+
+def test_set_shared_schema_ttl():
+    try:
+        assert set_shared_schema_ttl(60) == 60 and shared_schema_cache.ttl_seconds == 60
+    finally:
+        set_shared_schema_ttl()
+    assert shared_schema_cache.ttl_seconds == shared_schema_ttl_seconds
+
+
+def test_column_checks_never_download_table_data(connection, client):
+    # check 3.2 & 3.4 look up the pathway_name column, and stage 2 the base table columns, in the loaded cache - no SELECT * or catalog re-reads
+    connection.execute("CREATE TABLE test_dashboard_tables.overview_flat AS SELECT SUM(patients) AS patients FROM test_dashboard_tables.overview_weekly WHERE pathway_name = 'Select all'")
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    schemas = schema_cache()
+    schemas.load_client(clients, "test", connection)
+    base_query, base_PK_by_pathways = client["stage_3"]["dash_to_base_query_dictionary"]["patients"][1:]
+    recorder = set_query_recorder(query_recorder())
+    try:
+        assert check_3_2("patients", base_query, "overview_weekly", "test_dashboard_tables", base_PK_by_pathways, connection, schemas=schemas)[0]
+        assert check_3_4("patients", "test_dashboard_tables", "overview_flat", base_query, connection, schemas=schemas)[0]
+        stage_2_driver(clients=clients, validation_client="test", connection=connection, schemas=schemas, tables=["fact_table_0"], **client["stage_2"])
+    finally:
+        set_query_recorder(None)
+    queries = [record["query"].upper() for record in recorder.records]
+    assert queries and not [query for query in queries if "SELECT *" in query or "INFORMATION_SCHEMA" in query]
@@ -0,0 +1,68 @@
+# Tests of how query results are fetched (execution.py, backends.py) --
+
+# import required packages
+import pytest
+from BPM_dash_validation_toolkit import execution
+from BPM_dash_validation_toolkit.functions import check_3_5, check_3_6, stage_3_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+
+
+@pytest.mark.parametrize("mode", ["arrow", "pandas"])
+def test_null_values_as_read_sql(connection, mode):
+    execution.set_fetch_mode(mode)
+    connection.execute("CREATE TABLE t AS SELECT * FROM (VALUES (1, 'a'), (NULL, NULL)) AS v(x, y)")
+    assert execution.run_query("SELECT SUM(x) FROM t WHERE x > 5", connection)["_col0"][0] is None
+    result = execution.run_query("SELECT x, y FROM t", connection)
+    assert result["x"].isna().tolist() == [False, True]
+    assert result["y"].isna().tolist() == [False, True]
+
+
+def test_arrow_nulls_converted_as_read_sql(connection):
+    # integer, decimal, string, date & boolean columns with some NULLs, a column of only NULLs & one without NULLs - arrow & pandas fetches agree
+    connection.execute("""CREATE TABLE t AS SELECT * FROM (VALUES (1, 1.5, 'a', DATE '2024-01-01', true, NULL, 2), (NULL, NULL, NULL, NULL, NULL, NULL, 3))
+                          AS v(i, d, s, dt, b, n, k)""")
+    fetched = dict()
+    for mode in ["arrow", "pandas"]:
+        execution.set_fetch_mode(mode)
+        fetched[mode] = execution.run_query("SELECT * FROM t", connection)
+    for column in ["i", "d", "s", "dt", "b", "n"]:
+        assert fetched["arrow"][column].dtype == fetched["pandas"][column].dtype, column
+        assert fetched["arrow"][column].isna().tolist() == fetched["pandas"][column].isna().tolist() == [column == "n", True], column
+        assert [value for value in fetched["arrow"][column] if value is None] == [value for value in fetched["pandas"][column] if value is None], column
+    assert fetched["arrow"].iloc[0, :5].tolist() == fetched["pandas"].iloc[0, :5].tolist()
+    assert fetched["arrow"]["k"].tolist() == fetched["pandas"]["k"].tolist() == [2, 3]
+
+
+@pytest.mark.parametrize("mode", ["arrow", "pandas"])
+def test_null_stage_3_query_fails_check(connection, client, mode):
+    execution.set_fetch_mode(mode)
+    empty_sum = "SELECT SUM(value) FROM test_base_tables.fact_table_0 WHERE value > 1000"
+    count = "SELECT COUNT(*) FROM test_base_tables.fact_table_0"
+
+    assert check_3_5(empty_sum, count, "empty sum", connection)[0] is False
+    assert check_3_6(empty_sum, count, "empty sum", "==", connection)[0] is False
+
+    stage_3 = dict(client["stage_3"], business_logic_dict={"empty sum": [empty_sum, count]},
+                   between_dash_comparison_dict={"empty sum": ["overview_weekly", empty_sum, count, "=="]})
+    clients = stage_3_driver(clients=client["clients"], validation_client="test", connection=connection, schemas=schema_cache(), **stage_3)
+    assert set(clients["test"].failures["overview_weekly"].failures) == {"3.5.1", "3.6.1"}
+
+
+def test_scalar_queries_batched_with_comments_and_semicolons(connection, client):
+    queries = ["SELECT COUNT(*) FROM test_base_tables.fact_table_0 -- all rows\n;",
+               "SELECT MAX(value)\nFROM test_base_tables.fact_table_1;",
+               "SELECT COUNT(*) FROM test_base_tables.fact_table_0 -- all rows\n;"]
+    queries_before = connection.query_count
+    scalar_results = execution.run_scalar_queries(queries, connection)
+    assert connection.query_count - queries_before == 1
+    assert set(scalar_results) == {execution.normalise_query(query) for query in queries}
+    assert execution.scalar_result(queries[0], "_col0", connection, scalar_results) == 400
+    assert execution.scalar_result(queries[1], "_col0", connection, scalar_results) == 96
+
+
+def test_failed_scalar_batch_is_split(connection, client):
+    queries = ["SELECT COUNT(*) FROM test_base_tables.fact_table_{}".format(table) for table in range(2)]
+    queries += ["SELECT value FROM test_base_tables.fact_table_0", "SELECT COUNT(*) FROM test_base_tables.missing_table"]
+    scalar_results = execution.run_scalar_queries(queries, connection, max_batch_size=4)
+    assert set(scalar_results) == {execution.normalise_query(query) for query in queries[:2]}
+    assert all(value == 400 for value in scalar_results.values())
@@ -0,0 +1,79 @@
+# Tests of the check outcome history (history.py) - outcomes & raw numbers of each run, run diffs & trends --
+
+# import required packages
+import sqlite3
+import pandas as pd
+from BPM_dash_validation_toolkit.functions import stage_1_driver, stage_2_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.history import history_store, record_outcome
+from BPM_dash_validation_toolkit.instrumentation import check_scope
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+def run_stage_1(connection, client, store, run_id, run_at):
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    with store.run(run_id=run_id, run_at=run_at):
+        stage_1_driver(clients, "test", connection, schemas=schema_cache())
+
+
+def test_diff_runs_and_trend(connection, client, tmp_path):
+    store = history_store(str(tmp_path / "history.sqlite"))
+    run_stage_1(connection, client, store, "first", 1)
+    connection.execute("DELETE FROM test_prod_union.fact_table_0 WHERE region = 'region-1' AND CAST(id AS INTEGER) % 10 = 0")
+    run_stage_1(connection, client, store, "second", 2)
+
+    runs = store.runs()
+    assert runs["run_id"].tolist() == ["second", "first"]
+    assert runs["failures"].tolist() == [1, 0]
+
+    diff = store.diff_runs("first", "second")
+    assert len(diff) == 1
+    change = diff.iloc[0]
+    assert (change["check_id"], change["table_name"], change["item"], change["change"]) == ("1.1", "fact_table_0", "region-1", "new failure")
+    assert change["values_a"] == {"union_count": 200, "region_count": 200}
+    assert change["values_b"] == {"union_count": 180, "region_count": 200}
+
+    trend = store.trend("union_count", check="1.1", table="fact_table_0")
+    assert trend[trend["item"] == "region-1"]["value"].tolist() == [200, 180]
+    store.close()
+
+
+def test_outcome_without_truth_value_is_a_failure(tmp_path):
+    store = history_store(str(tmp_path / "history.sqlite"))
+    with store.run(run_id="run") as run:
+        with check_scope(client="test", stage="3", check="3.5", table="business logic"):
+            record_outcome(pd.NA, base_statistic=pd.NA, business_logic_statistic=5)
+    results = store.run_results("run")
+    assert results["passed"].tolist() == [False]
+    assert results["values"].tolist() == [{"business_logic_statistic": 5}]
+    assert len(run.outcomes) == 1
+    store.close()
+
+
+def test_skipped_check_is_diffed_as_skipped(connection, client, tmp_path):
+    # check 2.1 & 2.2 of a base table without a union parent are skipped - recorded as skipped, not left out of the run
+    store = history_store(str(tmp_path / "history.sqlite"))
+    primary_parents = client["stage_2"]["primary_parents"]
+    for run_id, parent_query in [("first", primary_parents["fact_table_0"][1]), ("second", [])]:
+        clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+        with store.run(run_id=run_id, run_at=len(run_id)):
+            stage_2_driver({"fact_table_0": [0, parent_query, "id"]}, clients, "test", dict(), dict(), connection, schemas=schema_cache(), tables=["fact_table_0"])
+
+    skipped = store.run_results("second").set_index("check_id")
+    assert skipped.loc["2.1", "skipped"] and skipped.loc["2.2", "skipped"] and not skipped.loc["2.3", "skipped"]
+    diff = store.diff_runs("first", "second")
+    assert dict(zip(diff["check_id"], diff["change"])) == {"2.1": "skipped", "2.2": "skipped"}
+    store.close()
+
+
+def test_store_written_before_skipped_outcomes(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    old_store = sqlite3.connect(path)
+    old_store.execute("""CREATE TABLE check_results (result_id INTEGER PRIMARY KEY, run_id TEXT NOT NULL, run_at REAL NOT NULL, client TEXT,
+                                                     stage TEXT, check_id TEXT, table_name TEXT, item TEXT, passed INTEGER NOT NULL)""")
+    old_store.execute("INSERT INTO check_results (run_id, run_at, client, stage, check_id, table_name, item, passed) VALUES ('old', 1, 'test', '1', '1.1', 't', NULL, 1)")
+    old_store.commit()
+    old_store.close()
+    store = history_store(path)
+    assert store.run_results("old")["skipped"].tolist() == [False]
+    store.close()
@@ -0,0 +1,72 @@
+# Tests of the query instrumentation (instrumentation.py) - check labels, totals, report & json/csv output --
+
+# import required packages
+import csv
+import json
+import pytest
+from BPM_dash_validation_toolkit.functions import stage_1_driver, run_query
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.instrumentation import query_recorder, set_query_recorder, check_scope, cursor_statistics, record_fields
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+@pytest.fixture
+def recorder():
+    recorder = set_query_recorder(query_recorder())
+    yield recorder
+    set_query_recorder(None)
+
+
+def test_queries_labelled_with_client_stage_check_and_table(connection, client, recorder):
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    schemas = schema_cache()
+    schemas.load_client(clients, "test", connection)
+    recorder.records.clear()
+    queries_before = connection.query_count
+    stage_1_driver(clients, "test", connection, schemas=schemas)
+    assert len(recorder.records) == connection.query_count - queries_before
+    assert {(record["client"], record["stage"]) for record in recorder.records} == {("test", "1")}
+    assert {(record["check"], record["table"]) for record in recorder.records} == {(check, table) for check in ["1.1", "1.2"] for table in ["fact_table_0", "fact_table_1"]}
+    assert all(record["wall_time_seconds"] >= 0 and record["error"] is None for record in recorder.records)
+    totals = recorder.check_totals()
+    assert sum(check_total["queries"] for check_total in totals.values()) == len(recorder.records)
+    assert totals[("test", "1", "1.2", "fact_table_0")]["queries"] == 1
+
+
+def test_failed_query_recorded_with_its_error(connection, client, recorder):
+    with check_scope(check="2.1", table="missing_table"):
+        with pytest.raises(Exception):
+            run_query("SELECT * FROM test_base_tables.missing_table", connection)
+    assert [(record["check"], record["table"]) for record in recorder.records] == [("2.1", "missing_table")]
+    assert "missing_table" in recorder.records[0]["error"]
+
+
+def test_athena_statistics_in_totals_report_and_files(tmp_path):
+    class athena_cursor:
+        engine_execution_time_in_millis, query_queue_time_in_millis, data_scanned_in_bytes, query_id = 1500, 200, 2 * 1024 ** 3, "query-1"
+
+    recorder = query_recorder(keep_query_text=False)
+    with check_scope(client="test", stage="2"):
+        with check_scope(check="2.1", table="fact_table_0"):
+            recorder.record("SELECT 1", 0.0, 2.0, statistics=cursor_statistics(athena_cursor()))
+            recorder.record("SELECT 2", 0.0, 1.0, statistics=cursor_statistics(athena_cursor()))
+        with check_scope(check="2.2", table="fact_table_1"):
+            recorder.record("SELECT 3", 0.0, 5.0, statistics=cursor_statistics(object()))
+    totals = recorder.check_totals()
+    assert totals[("test", "2", "2.1", "fact_table_0")] == {"queries": 2, "wall_time_seconds": 3.0, "engine_execution_time_ms": 3000, "queue_time_ms": 400,
+                                                            "data_scanned_bytes": 4 * 1024 ** 3}
+    assert totals[("test", "2", "2.2", "fact_table_1")]["data_scanned_bytes"] == 0
+
+    report = recorder.report(top_n=1)
+    slowest, most_expensive = report.split("Slowest checks (wall time):\n")[1].split("Most expensive checks (data scanned):\n")
+    assert "check 2.2 fact_table_1" in slowest and "check 2.1" not in slowest
+    assert "check 2.1 fact_table_0: 2 queries, 3.00s wall, 3.00s engine, 0.40s queued, 4.000 GB scanned" in most_expensive
+
+    recorder.write_json(str(tmp_path / "queries.json"))
+    recorder.write_csv(str(tmp_path / "queries.csv"))
+    with open(tmp_path / "queries.json", encoding="utf-8") as records_file:
+        assert json.load(records_file) == recorder.records
+    with open(tmp_path / "queries.csv", encoding="utf-8", newline="") as records_file:
+        rows = list(csv.DictReader(records_file))
+    assert list(rows[0]) == record_fields and [row["check"] for row in rows] == ["2.1", "2.1", "2.2"]
+    assert all(record["query"] is None for record in recorder.records)
@@ -0,0 +1,45 @@
+# Tests of the check 2.2 key comparison modes (functions.check_2_2, key_diff.py) - engine, stream & buckets give the same counts --
+
+# import required packages
+import pytest
+from BPM_dash_validation_toolkit.functions import check_2_2
+from BPM_dash_validation_toolkit.key_diff import bucket_key_diff, stream_key_diff
+
+base_keys = "SELECT COALESCE(CAST(id AS VARCHAR), '<NULL>') AS pk FROM test_base_tables.fact_table_0"
+union_keys = "SELECT COALESCE(CAST(id AS VARCHAR), '<NULL>') AS pk FROM test_prod_union.fact_table_0"
+
+
+def break_keys(connection):
+    """ 20 base keys removed & 3 keys added to the base table only """
+    connection.execute("DELETE FROM test_base_tables.fact_table_0 WHERE CAST(id AS INTEGER) % 20 = 0")
+    connection.execute("INSERT INTO test_base_tables.fact_table_0 SELECT CAST(1000000 + range AS VARCHAR), 0, DATE '2024-01-01' FROM range(3)")
+
+
+@pytest.mark.parametrize("mode", ["engine", "stream", "buckets"])
+def test_key_diff_modes_agree(connection, client, mode):
+    assert check_2_2("fact_table_0", "test_base_tables", "id", "FROM test_prod_union.fact_table_0", "id", connection, mode=mode)[0] is True
+    break_keys(connection)
+    check_bool, message = check_2_2("fact_table_0", "test_base_tables", "id", "FROM test_prod_union.fact_table_0", "id", connection, mode=mode)
+    assert check_bool is False
+    assert "base PKs missing from union: 3 union PKs missing from base: 20" in message
+
+
+def test_stream_counts_with_spills(connection, client):
+    break_keys(connection)
+    # a 1KB memory limit, so the hashed keys are spilled to disk between chunks
+    stream_counts = stream_key_diff(base_keys, union_keys, connection, memory_limit_bytes=1024, chunksize=50, partitions=4)
+    assert stream_counts == {"base_keys": 383, "union_keys": 400, "missing_from_union": 3, "missing_from_base": 20}
+
+
+def test_bucket_counts(connection, client):
+    break_keys(connection)
+    bucket_counts = bucket_key_diff(base_keys, union_keys, connection, max_leaf_keys=4, sample_size=30)
+    assert {key: bucket_counts[key] for key in ["base_keys", "union_keys", "missing_from_union", "missing_from_base"]} == \
+        {"base_keys": 383, "union_keys": 400, "missing_from_union": 3, "missing_from_base": 20}
+    assert sorted(key for side, key in bucket_counts["sample"] if side == "not in union") == ["1000000", "1000001", "1000002"]
+
+
+def test_buckets_give_up_past_limits(connection, client):
+    break_keys(connection)
+    # base only & union only keys in the same buckets - more differing buckets than max_buckets
+    assert bucket_key_diff(base_keys, union_keys, connection, fanout_bits=1, max_leaf_keys=0, max_buckets=1) is None
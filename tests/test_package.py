@@ -0,0 +1,28 @@
+# Tests of the package's lazy exports (__init__.py) - the same public names, with pandas, pyathena & requests only loaded when first needed --
+
+# import required packages
+import importlib
+import pytest
+import BPM_dash_validation_toolkit
+from import_time import time_import, heavy_modules
+
+
+def test_every_export_resolves_to_its_module():
+    for module, names in BPM_dash_validation_toolkit.exports.items():
+        for name in names:
+            assert getattr(BPM_dash_validation_toolkit, name) is getattr(importlib.import_module("BPM_dash_validation_toolkit." + module), name)
+    assert set(BPM_dash_validation_toolkit.__all__) <= set(dir(BPM_dash_validation_toolkit))
+    from BPM_dash_validation_toolkit import query_cache
+    assert isinstance(query_cache, type)
+    with pytest.raises(AttributeError):
+        BPM_dash_validation_toolkit.not_an_export
+
+
+@pytest.mark.parametrize("statement", ["import BPM_dash_validation_toolkit",
+                                       "from BPM_dash_validation_toolkit import set_up_client, output_client_validation_results",
+                                       "from BPM_dash_validation_toolkit import stage_1_driver, stage_2_driver, stage_3_driver, run_query, schema_cache",
+                                       "from BPM_dash_validation_toolkit import render_report, slack_sink, athena_backend"])
+def test_imports_load_no_heavy_modules(statement):
+    # each in a fresh python process - nothing already loaded by the other tests
+    assert set(heavy_modules) >= {"pandas", "pyathena", "requests"}
+    assert time_import(statement, repeat=1)["loaded"] == []
@@ -0,0 +1,59 @@
+# Tests of the dry run planner (planner.py) - statements recorded without running them, and units picked within a scan budget --
+
+# import required packages
+from BPM_dash_validation_toolkit.planner import plan_checks, budget_plan, run_within_budget, minimum_scan_bytes
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+megabyte = 1024 ** 2
+
+
+def unit_plan(unit, estimated_bytes, unestimated_statements=0):
+    return {"unit": unit, "estimated_bytes": estimated_bytes, "statements": 1, "unestimated_statements": unestimated_statements, "error": None}
+
+
+def test_budget_plan_cheapest_first_within_priority():
+    plan = {"units": [unit_plan(("2", "big"), 500 * megabyte), unit_plan(("1", "a"), 100 * megabyte), unit_plan(("2", "small"), 50 * megabyte),
+                      unit_plan(("3", None), 20 * megabyte, unestimated_statements=1)]}
+    # stage 1 first, then the cheapest - the unit without an estimate is deferred
+    assert budget_plan(plan, 200 * megabyte) == ({("1", "a"), ("2", "small")}, [("2", "big"), ("3", None)])
+    # a priority moves a unit ahead of the others
+    assert budget_plan(plan, 600 * megabyte, priorities={"big": -1}) == ({("2", "big"), ("1", "a")}, [("2", "small"), ("3", None)])
+    # an assumed size for statements without an estimate (at least athena's minimum scan)
+    assert budget_plan(plan, 200 * megabyte, unestimated_bytes=0)[0] == {("1", "a"), ("2", "small"), ("3", None)}
+    assert budget_plan(plan, 170 * megabyte + minimum_scan_bytes - 1, unestimated_bytes=0)[0] == {("1", "a"), ("2", "small")}
+
+
+def test_plan_checks_runs_no_data_queries(connection, client):
+    table_bytes = {"test_base_tables.fact_table_1": 1000 * megabyte}
+    schemas = schema_cache()
+    schemas.load_client(client["clients"], "test", connection)
+    queries_before = connection.query_count
+    plan = plan_checks(client["clients"], "test", connection, client["stage_2"]["primary_parents"], client["stage_3"]["dash_to_base_query_dictionary"],
+                       schemas=schemas, explain=False, table_bytes=lambda database, table: table_bytes.get("{}.{}".format(database, table), megabyte))
+    assert connection.query_count == queries_before
+    assert len(plan["statements"]) > 0 and all(unit_plan["error"] is None for unit_plan in plan["units"])
+    assert plan["units"][0]["unit"] == ("2", "fact_table_1")
+    assert plan["unestimated_statements"] == 0
+
+
+def test_run_within_budget_defers_units(connection, client):
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    clients, plan, deferred = run_within_budget(clients, "test", connection, client["stage_2"]["primary_parents"], client["stage_3"]["dash_to_base_query_dictionary"],
+                                                budget_bytes=5 * minimum_scan_bytes, explain=False, table_bytes=lambda database, table: megabyte, schemas=schema_cache())
+    assert len(deferred) > 0
+    deferred_tables = set(table for table, failed_table in clients["test"].failures.items() if any(check.endswith("deferred") for check in failed_table.failures))
+    assert deferred_tables == set(unit[1] if unit[1] is not None else "test_dashboard_tables" for unit in deferred)
+
+
+def test_plan_checks_worst_case_has_the_exact_checks(connection, client):
+    # with fingerprint_first, a passing plan skips the exact checks 2.1 & 2.2 - the worst case plan (default) has them, so it is never the smaller estimate
+    plans = dict()
+    for worst_case in [False, True]:
+        plans[worst_case] = plan_checks(client["clients"], "test", connection, client["stage_2"]["primary_parents"], client["stage_3"]["dash_to_base_query_dictionary"],
+                                        schemas=schema_cache(), explain=False, table_bytes=lambda database, table: megabyte, stage_2=dict(fingerprint_first=True), worst_case=worst_case)
+    passing_checks = set(statement["check"] for statement in plans[False]["statements"])
+    worst_case_checks = set(statement["check"] for statement in plans[True]["statements"])
+    assert "2.2" not in passing_checks and {"2.1", "2.2"} <= worst_case_checks
+    assert plans[True]["estimated_bytes"] > plans[False]["estimated_bytes"]
+    assert all(unit_plan["error"] is None for unit_plan in plans[True]["units"])
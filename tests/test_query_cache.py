@@ -0,0 +1,38 @@
+# Tests of the disk backed query result cache (query_cache.py) --
+
+# import required packages
+import os
+import pytest
+from BPM_dash_validation_toolkit import execution
+from BPM_dash_validation_toolkit.query_cache import query_cache
+
+
+@pytest.mark.parametrize("mode", ["arrow", "pandas"])
+def test_cached_result_types_match_live_fetch(connection, client, tmp_path, mode):
+    execution.set_fetch_mode(mode)
+    query = "SELECT id, value, CASE WHEN value > 50 THEN value END AS high, NULL AS nothing FROM test_base_tables.fact_table_0 ORDER BY id"
+    live = execution.run_query(query, connection)
+    cache = execution.set_query_cache(query_cache(str(tmp_path)))
+    execution.run_query(query, connection)
+    cached = execution.run_query(query, connection)
+    assert cache.stats()["hits"] == 1
+    assert cached.dtypes.tolist() == live.dtypes.tolist()
+    assert cached.equals(live)
+
+
+def test_hits_do_not_rewrite_index(connection, client, tmp_path):
+    cache = execution.set_query_cache(query_cache(str(tmp_path), max_entries=2))
+    queries = ["SELECT COUNT(*) FROM test_base_tables.fact_table_{}".format(table) for table in range(2)]
+    for query in queries:
+        execution.run_query(query, connection)
+    index_modified = os.stat(cache.index_path).st_mtime_ns
+    execution.run_query(queries[0], connection)
+    assert os.stat(cache.index_path).st_mtime_ns == index_modified
+    # the in memory order is used for eviction - the least recently used (fact_table_1) is evicted by a third result
+    execution.run_query("SELECT COUNT(*) FROM test_prod_union.fact_table_0", connection)
+    queries_before = connection.query_count
+    execution.run_query(queries[0], connection)
+    assert connection.query_count == queries_before
+    execution.run_query(queries[1], connection)
+    assert connection.query_count == queries_before + 1
+    cache.close()
@@ -0,0 +1,112 @@
+# Tests of the validation reports (report.py) - rendering, splitting into slack sized messages & sending in the background --
+
+# import required packages
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+import pytest
+from BPM_dash_validation_toolkit.functions import node
+from BPM_dash_validation_toolkit.report import report_records, render_report, split_message, slack_sink
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+def test_split_message_keeps_lines_in_order():
+    text = "".join("line {}\n".format(line) for line in range(200)) + "x" * 250 + "\nend"
+    messages = split_message(text, max_characters=100)
+    assert "".join(messages) == text
+    assert all(0 < len(message) <= 100 for message in messages)
+    # messages are split at line ends, except within a line longer than a message
+    assert all(message.endswith("\n") for message in messages[:-4])
+
+
+def test_render_report_formats():
+    clients = set_up_client("test", ["region-0"], ["test_prod_0"])
+    failed_table = node("fact_table_0", "test", "test_base_tables", ["dash_table"])
+    failed_table.failures["2.1"] = "FAILURE: Check 2.1 - Table fact_table_0\n"
+    clients["test"].failures["fact_table_0"] = failed_table
+    records = report_records(clients)
+    assert records == {"test": [{"client": "test", "table": "fact_table_0", "check": "2.1", "message": "FAILURE: Check 2.1 - Table fact_table_0\n",
+                                 "downstream_tables": ["dash_table"]}]}
+    text = render_report(records)
+    assert "FAILURE: Check 2.1 - Table fact_table_0\nWARNING: Check 2.1 failed for fact_table_0 - this may affect the downstream table dash_table\n" in text
+    assert "- **2.1** `fact_table_0`" in render_report(records, format="markdown")
+    assert json.loads(render_report(records, format="json")) == records
+    with pytest.raises(ValueError):
+        render_report(records, format="html")
+
+
+@pytest.fixture
+def webhook():
+    """ A local webhook recording the posted messages - the first post is answered 503, so it is retried """
+    received = list()
+
+    class handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            status = 200 if getattr(self.server, "failed_once", False) else 503
+            self.server.failed_once = True
+            if status == 200:
+                received.append(body["text"])
+            self.send_response(status)
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}/".format(server.server_port), received
+    server.shutdown()
+
+
+def test_slack_sink_sends_in_order_with_retries(webhook):
+    url, received = webhook
+    text = "".join("line {}\n".format(line) for line in range(100))
+    sink = slack_sink(url, backoff_seconds=0, max_characters=120)
+    sink.send(text)
+    responses = sink.flush(timeout=30)
+    sink.close()
+    assert all(response.status_code == 200 for response in responses)
+    assert "".join(received) == text
+    assert len(received) == len(split_message(text, 120))
+
+
+@pytest.fixture
+def slow_webhook():
+    """ A local webhook recording every post - each is answered 500, after sleeping past the sink's timeout if it is the first """
+    received = list()
+
+    class handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"])))["text"])
+            if len(received) == 1:
+                time.sleep(1)
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b"error")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}/".format(server.server_port), received
+    server.shutdown()
+
+
+def test_slack_sink_does_not_repost_taken_messages(slow_webhook):
+    # a read timeout & a 500 may come after slack has posted the message - neither is retried, so each message is received once
+    url, received = slow_webhook
+    sink = slack_sink(url, timeout=0.2, backoff_seconds=0)
+    sink.send("first\n")
+    timed_out = sink.flush(timeout=30)[0]
+    sink.send("second\n")
+    server_error = sink.flush(timeout=30)[0]
+    sink.close()
+    time.sleep(1)
+    assert isinstance(timed_out, Exception) and server_error.status_code == 500
+    assert received == ["first\n", "second\n"]
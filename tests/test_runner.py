@@ -0,0 +1,64 @@
+# Tests of the multi client runner (runner.py) - each client's failures are the same as running its stage drivers one after another --
+
+# import required packages
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from BPM_dash_validation_toolkit import execution
+from BPM_dash_validation_toolkit.functions import stage_1_driver, stage_2_driver, stage_3_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.runner import run_clients
+from BPM_dash_validation_toolkit.utility import set_up_client
+from synthetic import generate
+
+
+def fresh_clients(config):
+    validation_client = config["validation_client"]
+    return set_up_client(validation_client, config["clients"][validation_client].regions, config["clients"][validation_client].prod_databases)
+
+
+def failures(clients, validation_client):
+    return {table: dict(failed_table.failures) for table, failed_table in clients[validation_client].failures.items()}
+
+
+def test_run_clients_matches_serial_drivers(connection):
+    configs = [generate(connection, client=name, regions=2, tables=2, rows=100, pathways=3, patients=50, duplicate_rate=duplicate_rate)
+               for name, duplicate_rate in [("one", 0.0), ("two", 0.05)]]
+    connection.execute("DELETE FROM one_prod_union.fact_table_0 WHERE CAST(id AS INTEGER) % 10 = 0")
+
+    serial = dict()
+    for config in configs:
+        clients = fresh_clients(config)
+        for stage, stage_driver in [("stage_1", stage_1_driver), ("stage_2", stage_2_driver), ("stage_3", stage_3_driver)]:
+            clients = stage_driver(clients=clients, validation_client=config["validation_client"], connection=connection, schemas=schema_cache(), **config[stage])
+        serial[config["validation_client"]] = failures(clients, config["validation_client"])
+
+    run_configs = [dict(config, clients=fresh_clients(config), **{stage: dict(config[stage], schemas=schema_cache()) for stage in ["stage_1", "stage_2", "stage_3"]})
+                   for config in configs]
+    results = run_clients(run_configs, connection, max_in_flight_queries=2)
+    assert list(results) == ["one", "two"]
+    assert {client: {table: dict(failed_table.failures) for table, failed_table in results[client].failures.items()} for client in results} == serial
+    assert serial["one"] != dict() and serial["two"] != dict()
+
+
+def test_run_clients_shares_one_pool(connection):
+    # concurrent stage 1 checks of both clients run on the pool of their pipelines - with only a worker per client, the pipelines run their own checks
+    configs = [generate(connection, client=name, regions=2, tables=2, rows=100, pathways=3, patients=50) for name in ["one", "two"]]
+    run_configs = [dict(clients=fresh_clients(config), validation_client=config["validation_client"], stage_1=dict(max_concurrent_queries=4, schemas=schema_cache()))
+                   for config in configs]
+    results = run_clients(run_configs, connection, max_workers=2)
+    assert {client: failures(results, client) for client in results} == {"one": dict(), "two": dict()}
+    assert execution.check_pool is None
+
+
+def test_run_checks_on_the_shared_pool():
+    threads = list()
+
+    def check(value):
+        threads.append(threading.current_thread().name)
+        return value
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="shared") as executor:
+        execution.set_check_pool(executor)
+        results = execution.run_checks([(key, check, dict(value=key * 2)) for key in range(20)], max_concurrent_queries=4)
+    assert list(results.items()) == [(key, key * 2) for key in range(20)]
+    assert any(name.startswith("shared") for name in threads)
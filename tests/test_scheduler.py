@@ -0,0 +1,56 @@
+# Tests of the dependency aware check scheduler (scheduler.py) - the same failures as the serial stage drivers, with downstream tables filled in --
+
+# import required packages
+from BPM_dash_validation_toolkit.functions import stage_1_driver, stage_2_driver, stage_3_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.scheduler import run_check_dag
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+def fresh_clients(client):
+    return set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+
+
+def test_dag_matches_serial_drivers(connection, client):
+    connection.execute("DELETE FROM test_prod_union.fact_table_0 WHERE CAST(id AS INTEGER) % 10 = 0")
+    connection.execute("INSERT INTO test_base_tables.fact_table_1 SELECT * FROM test_base_tables.fact_table_1 LIMIT 1")
+
+    clients = fresh_clients(client)
+    for stage, stage_driver in [("stage_1", stage_1_driver), ("stage_2", stage_2_driver), ("stage_3", stage_3_driver)]:
+        clients = stage_driver(clients=clients, validation_client="test", connection=connection, schemas=schema_cache(), **client[stage])
+    serial = {table: dict(failed_table.failures) for table, failed_table in clients["test"].failures.items()}
+
+    for max_concurrent_checks in [1, 4]:
+        clients = run_check_dag(fresh_clients(client), "test", connection, client["stage_2"]["primary_parents"], client["stage_3"]["dash_to_base_query_dictionary"],
+                                max_concurrent_checks=max_concurrent_checks, schemas=schema_cache())
+        assert {table: dict(failed_table.failures) for table, failed_table in clients["test"].failures.items()} == serial
+
+
+def test_skip_on_failure_skips_downstream_units(connection, client):
+    # union fact_table_0 fails stage 1, so the checks of base fact_table_0 (built from it) are skipped with a warning
+    connection.execute("DELETE FROM test_prod_union.fact_table_0 WHERE CAST(id AS INTEGER) % 10 = 0")
+    clients = run_check_dag(fresh_clients(client), "test", connection, client["stage_2"]["primary_parents"], client["stage_3"]["dash_to_base_query_dictionary"],
+                            skip_on_failure=True, schemas=schema_cache())
+    failures = clients["test"].failures["fact_table_0"].failures
+    assert "1.1" in failures and "2 skipped" in failures and "2.2" not in failures
+    assert "fact_table_1" not in clients["test"].failures
+
+
+def test_dag_matches_serial_drivers_for_stage_3_failures(connection, client):
+    # a second dashboard table (last in the statistics) & failing checks 3.1/3.2 and 3.3 - 3.6, recorded under the same tables & keys by both paths
+    connection.execute("CREATE TABLE test_dashboard_tables.overview_monthly AS SELECT pathway_name, patients AS patients_monthly FROM test_dashboard_tables.overview_weekly UNION ALL SELECT 'pathway_0', 1")
+    statistics = dict(client["stage_3"]["dash_to_base_query_dictionary"])
+    statistics["patients_monthly"] = ["overview_monthly"] + statistics["patients"][1:]
+    other_checks = dict(cumulative_check_dict={"cumulative_patients": ["SELECT 5 AS count", "SELECT COUNT(DISTINCT patient_id) AS count FROM test_base_tables.patient_pathways"]},
+                        onboard_stat_dict=dict(),
+                        business_logic_dict={"patients_logic": ["SELECT 1", "SELECT COUNT(DISTINCT patient_id) FROM test_base_tables.patient_pathways"]},
+                        between_dash_comparison_dict={"weekly_vs_monthly": ["overview_weekly", "SELECT 1", "SELECT 2", ">"]})
+
+    clients = stage_3_driver(statistics, fresh_clients(client), validation_client="test", connection=connection, schemas=schema_cache(), **other_checks)
+    serial = {table: dict(failed_table.failures) for table, failed_table in clients["test"].failures.items()}
+    assert set(serial["overview_monthly"]) == {"3.1 & 3.22", "3.3.1", "3.5.1"} and set(serial["overview_weekly"]) == {"3.6.1"}
+
+    for max_concurrent_checks in [1, 4]:
+        clients = run_check_dag(fresh_clients(client), "test", connection, dict(), statistics, max_concurrent_checks=max_concurrent_checks, schemas=schema_cache(), **other_checks)
+        stage_3 = {table: dict(failed_table.failures) for table, failed_table in clients["test"].failures.items() if table.startswith("overview")}
+        assert stage_3 == serial
@@ -0,0 +1,35 @@
+# Tests of the stage 1 checks (functions.py) - per region & GROUP BY region union table counts --
+
+# import required packages
+from BPM_dash_validation_toolkit.functions import stage_1_driver, union_region_counts
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+def run_stage_1(connection, client, **stage_options):
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    schemas = schema_cache()
+    schemas.load_client(clients, "test", connection)
+    queries_before = connection.query_count
+    clients = stage_1_driver(clients, "test", connection, schemas=schemas, **stage_options)
+    return connection.query_count - queries_before, {table: dict(failed_table.failures) for table, failed_table in clients["test"].failures.items()}
+
+
+def test_union_region_counts_with_null_regions(connection, client):
+    connection.execute("INSERT INTO test_prod_union.fact_table_1 SELECT id, value, load_date, NULL FROM test_prod_union.fact_table_1 LIMIT 3")
+    assert union_region_counts("fact_table_1", "test_prod_union", connection) == {"region-0": 200, "region-1": 200, None: 3}
+    assert union_region_counts("fact_table_0", "test_prod_union", connection) == {"region-0": 200, "region-1": 200}
+
+
+def test_group_by_region_matches_per_region_checks(connection, client):
+    # region-1 rows missing from union fact_table_0 (check 1.1) & NULL region rows in union fact_table_1 (checks 1.1 & 1.2)
+    connection.execute("DELETE FROM test_prod_union.fact_table_0 WHERE region = 'region-1' AND CAST(id AS INTEGER) % 10 = 0")
+    connection.execute("INSERT INTO test_prod_union.fact_table_1 SELECT id, value, load_date, NULL FROM test_prod_union.fact_table_1 LIMIT 3")
+
+    per_region_queries, per_region_failures = run_stage_1(connection, client)
+    grouped_queries, grouped_failures = run_stage_1(connection, client, group_by_region=True)
+    assert set(per_region_failures["fact_table_0"]) == {"1.1"} and set(per_region_failures["fact_table_1"]) == {"1.2"}
+    assert grouped_failures == per_region_failures
+    # 2 tables of 2 regions - the union tables are scanned once each (not once per region & again for NULL regions)
+    assert (per_region_queries, grouped_queries) == (4 + 4 + 2, 4 + 2)
+    assert run_stage_1(connection, client, group_by_region=True, max_concurrent_queries=4) == (grouped_queries, grouped_failures)
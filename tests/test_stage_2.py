@@ -0,0 +1,33 @@
+# Tests of the stage 2 checks (functions.py) - fused profile & key fingerprint first pass --
+
+# import required packages
+from BPM_dash_validation_toolkit.functions import stage_2_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+def run_stage_2(connection, client, **stage_options):
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    schemas = schema_cache()
+    schemas.load_client(clients, "test", connection)
+    queries_before = connection.query_count
+    clients = stage_2_driver(clients=clients, validation_client="test", connection=connection, schemas=schemas, tables=["fact_table_0", "fact_table_1"],
+                           **dict(client["stage_2"], **stage_options))
+    return connection.query_count - queries_before, {table: sorted(failed_table.failures) for table, failed_table in clients["test"].failures.items()}
+
+
+def test_fingerprint_with_profile_is_one_query_per_matching_table(connection, client):
+    # a duplicated base row - the key sets still match, so only check 2.3 fails
+    connection.execute("INSERT INTO test_base_tables.fact_table_1 SELECT * FROM test_base_tables.fact_table_1 LIMIT 1")
+    exact_queries, exact_failures = run_stage_2(connection, client)
+    assert exact_failures == {"fact_table_1": ["2.3"]}
+    assert run_stage_2(connection, client, fingerprint_first=True) == (2, exact_failures)
+    assert run_stage_2(connection, client, fingerprint_first=True, fused_profile=False)[1] == exact_failures
+    assert exact_queries > 2
+
+
+def test_fingerprint_mismatch_runs_exact_checks(connection, client):
+    connection.execute("DELETE FROM test_base_tables.fact_table_0 WHERE CAST(id AS INTEGER) % 10 = 0")
+    exact_failures = run_stage_2(connection, client)[1]
+    assert exact_failures == {"fact_table_0": ["2.1", "2.2"]}
+    assert run_stage_2(connection, client, fingerprint_first=True)[1] == exact_failures
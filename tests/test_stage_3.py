@@ -0,0 +1,81 @@
+# Tests of the stage 3 checks (functions.py) - pathway overlap counted in the query engine --
+
+# import required packages
+import pytest
+from BPM_dash_validation_toolkit.functions import pathway_overlap_counts, check_3_1, dashboard_table_sums, stage_3_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.instrumentation import query_recorder, set_query_recorder
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+@pytest.mark.parametrize("query", ["SELECT patient_id, pathway_name FROM test_base_tables.patient_pathways",
+                                   "SELECT patient_id, pathway_name FROM test_base_tables.patient_pathways ORDER BY patient_id LIMIT 1000 -- all rows\n;",
+                                   "SELECT patient_id, pathway_name, 1 AS extra FROM test_base_tables.patient_pathways"])
+def test_pathway_overlap_counts_one_query(connection, client, query):
+    pathway_ids = connection.database.execute("SELECT * FROM test_base_tables.patient_pathways").df()
+    expected = {"pathway_id_sum": int(pathway_ids.groupby("pathway_name")["patient_id"].nunique().sum()), "distinct_ids": int(pathway_ids["patient_id"].nunique())}
+    queries_before = connection.query_count
+    assert pathway_overlap_counts(query, connection) == expected
+    assert connection.query_count == queries_before + 1
+
+
+def test_check_3_1_engine_matches_python(connection, client):
+    query = client["stage_3"]["dash_to_base_query_dictionary"]["patients"][2]
+    pathways = dashboard_table_sums("overview_weekly", "test_dashboard_tables", ["patients"], connection)
+    in_engine = check_3_1(set(pathways["pathway_name"]), pathways, "patients", query, connection)
+    in_python = check_3_1(set(pathways["pathway_name"]), pathways, "patients", query, connection, overlap_in_engine=False)
+    assert in_engine[0] is True and in_engine == in_python
+
+
+def test_pathway_overlap_counts_falls_back_on_query_errors_only(connection, client, monkeypatch):
+    import duckdb
+    from BPM_dash_validation_toolkit import functions
+    query = client["stage_3"]["dash_to_base_query_dictionary"]["patients"][2]
+    expected = pathway_overlap_counts(query, connection)
+
+    def failing_cte(error):
+        def run_query(sql, connection, **kwargs):
+            if "pathway_ids (pathway_id, pathway_name)" in sql:
+                raise error
+            return original_run_query(sql, connection, **kwargs)
+        return run_query
+
+    original_run_query = functions.run_query
+    # the engine rejecting the CTE - counted from the query rows
+    monkeypatch.setattr(functions, "run_query", failing_cte(duckdb.BinderException("positional column names")))
+    assert pathway_overlap_counts(query, connection) == expected
+    # any other error is raised, not hidden by the fallback
+    monkeypatch.setattr(functions, "run_query", failing_cte(KeyError("pathway_id_sum")))
+    with pytest.raises(KeyError):
+        pathway_overlap_counts(query, connection)
+    monkeypatch.undo()
+    # a query the engine can not run raises its error
+    with pytest.raises(duckdb.Error):
+        pathway_overlap_counts("SELEC patient_id, pathway_name FROM test_base_tables.patient_pathways", connection)
+
+
+def test_group_by_dashboard_table_matches_per_statistic_checks(connection, client):
+    # 3 statistics of one dashboard table, one failing checks 3.1/3.2 - the same failures, from one scan of the dashboard table
+    connection.execute("""CREATE OR REPLACE TABLE test_dashboard_tables.overview_weekly AS
+                          SELECT pathway_name, patients, patients AS patients_again, patients + CASE WHEN pathway_name = 'pathway_0' THEN 1 ELSE 0 END AS patients_wrong
+                          FROM test_dashboard_tables.overview_weekly""")
+    statistics = dict(client["stage_3"]["dash_to_base_query_dictionary"])
+    statistics["patients_again"] = statistics["patients_wrong"] = statistics["patients"]
+
+    def run_stage_3(**stage_options):
+        clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+        schemas = schema_cache()
+        schemas.load_client(clients, "test", connection)
+        recorder = set_query_recorder(query_recorder())
+        try:
+            clients = stage_3_driver(statistics, clients, dict(), dict(), dict(), dict(), "test", connection, schemas=schemas, **stage_options)
+        finally:
+            set_query_recorder(None)
+        dashboard_scans = len([record for record in recorder.records if "OVERVIEW_WEEKLY" in record["query"].upper()])
+        return dashboard_scans, {table: dict(failed_table.failures) for table, failed_table in clients["test"].failures.items()}
+
+    per_statistic_scans, per_statistic_failures = run_stage_3()
+    grouped_scans, grouped_failures = run_stage_3(group_by_dashboard_table=True)
+    assert set(per_statistic_failures["overview_weekly"]) == {"3.1 & 3.23"}
+    assert grouped_failures == per_statistic_failures
+    assert (per_statistic_scans, grouped_scans) == (2 * 3, 1)
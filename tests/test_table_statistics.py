@@ -0,0 +1,75 @@
+# Tests of stage 1 row counts answered from glue statistics (table_statistics.py), with a stand-in glue client over the local tables --
+
+# import required packages
+import time
+import pytest
+from BPM_dash_validation_toolkit.functions import stage_1_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.table_statistics import glue_row_counts, exact_row_count
+from BPM_dash_validation_toolkit.utility import set_up_client
+
+
+def statistics_parameters(row_count, updated_at, exact=True):
+    parameters = {"numRows": str(row_count), "transient_lastDdlTime": str(int(updated_at))}
+    if exact:
+        parameters["COLUMN_STATS_ACCURATE"] = '{"BASIC_STATS":"true"}'
+    return parameters
+
+
+class local_glue:
+    """ Glue client stand-in giving exact statistics of the local tables - union tables are partitioned by region """
+    def __init__(self, connection, updated_at=None, inexact_table=None):
+        self.connection = connection
+        self.updated_at = updated_at if updated_at is not None else time.time()
+        self.inexact_table = inexact_table
+
+    def get_table(self, DatabaseName, Name):
+        if DatabaseName.endswith("_prod_union"):
+            return {"Table": {"PartitionKeys": [{"Name": "region"}], "Parameters": dict()}}
+        row_count = self.connection.database.execute("SELECT COUNT(*) FROM {}.{}".format(DatabaseName, Name)).fetchone()[0]
+        return {"Table": {"PartitionKeys": list(), "Parameters": statistics_parameters(row_count, self.updated_at, Name != self.inexact_table)}}
+
+    def get_paginator(self, operation):
+        glue = self
+
+        class partitions:
+            def paginate(self, DatabaseName, TableName):
+                counts = glue.connection.database.execute("SELECT region, COUNT(*) FROM {}.{} GROUP BY region".format(DatabaseName, TableName)).fetchall()
+                yield {"Partitions": [{"Values": [region if region is not None else "__HIVE_DEFAULT_PARTITION__"],
+                                       "Parameters": statistics_parameters(row_count, glue.updated_at)} for region, row_count in counts]}
+        return partitions()
+
+
+def run_stage_1(connection, client, row_counts):
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    queries_before = connection.query_count
+    clients = stage_1_driver(clients, "test", connection, schemas=schema_cache(), group_by_region=True, row_counts=row_counts)
+    return connection.query_count - queries_before, {table: sorted(failed_table.failures) for table, failed_table in clients["test"].failures.items()}
+
+
+def test_freshness_bound_required(connection):
+    with pytest.raises(ValueError):
+        glue_row_counts(local_glue(connection))
+
+
+def test_exact_row_count():
+    now = time.time()
+    assert exact_row_count(statistics_parameters(10, now), max_age_seconds=60) == 10
+    assert exact_row_count(statistics_parameters(10, now, exact=False), max_age_seconds=60) is None
+    assert exact_row_count(statistics_parameters(10, now - 120), max_age_seconds=60) is None
+    assert exact_row_count(statistics_parameters(10, now), fresh_since=now + 10) is None
+
+
+def test_counts_from_statistics(connection, client):
+    scanned = run_stage_1(connection, client, None)
+    # only the catalog query is run when every count is in the statistics
+    assert run_stage_1(connection, client, glue_row_counts(local_glue(connection), max_age_seconds=60)) == (1, scanned[1])
+    # an inexact prod table is counted by scan (one query per region), stale statistics fall back to scans for every table
+    assert run_stage_1(connection, client, glue_row_counts(local_glue(connection, inexact_table="fact_table_0"), max_age_seconds=60)) == (3, scanned[1])
+    assert run_stage_1(connection, client, glue_row_counts(local_glue(connection, updated_at=time.time() - 120), max_age_seconds=60)) == scanned
+
+
+def test_null_region_partition_fails_check_1_2(connection, client):
+    connection.execute("INSERT INTO test_prod_union.fact_table_1 SELECT id, value, load_date, NULL FROM test_prod_0.fact_table_1 LIMIT 3")
+    _, failures = run_stage_1(connection, client, glue_row_counts(local_glue(connection), max_age_seconds=60))
+    assert "1.2" in failures["fact_table_1"]
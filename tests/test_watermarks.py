@@ -0,0 +1,51 @@
+# Tests of incremental stage 1 validation with persisted watermarks (watermarks.py) - watermarks hold on failure & advance on pass --
+
+# import required packages
+from BPM_dash_validation_toolkit.functions import stage_1_driver
+from BPM_dash_validation_toolkit.catalog import schema_cache
+from BPM_dash_validation_toolkit.utility import set_up_client
+from BPM_dash_validation_toolkit.watermarks import watermark_store, watermark_key
+
+region_0_key = watermark_key("1.1", "test_prod_union", "fact_table_0", "region-0")
+
+
+def run_stage_1(connection, client, watermarks):
+    clients = set_up_client("test", client["clients"]["test"].regions, client["clients"]["test"].prod_databases)
+    clients = stage_1_driver(clients, "test", connection, schemas=schema_cache(), watermark_columns={"fact_table_0": "load_date"}, watermarks=watermarks, tables=["fact_table_0"])
+    return {table: sorted(failed_table.failures) for table, failed_table in clients["test"].failures.items()}
+
+
+def add_rows(connection, database, rows, region=None):
+    connection.execute("""INSERT INTO {}.fact_table_0 SELECT CAST(5000 + range AS VARCHAR), 0, DATE '2024-08-01'{} FROM range({})""".format(
+                       database, "" if region is None else ", '{}'".format(region), rows))
+
+
+def test_watermark_holds_on_failure_and_advances_on_pass(connection, client, tmp_path):
+    path = str(tmp_path / "watermarks.json")
+    assert run_stage_1(connection, client, watermark_store(path)) == {}
+    assert watermark_store(path).entries[region_0_key]["watermark"] == "2024-07-18"
+    assert watermark_store(path).totals(region_0_key) == {"prod_count": 200, "union_count": 200}
+
+    # 5 new union rows for region-0, but only 3 of them in the prod table - the check fails & the watermark & totals are kept
+    add_rows(connection, "test_prod_union", 5, "region-0")
+    add_rows(connection, "test_prod_0", 3)
+    assert run_stage_1(connection, client, watermark_store(path)) == {"fact_table_0": ["1.1"]}
+    assert watermark_store(path).entries[region_0_key]["watermark"] == "2024-07-18"
+    assert watermark_store(path).totals(region_0_key) == {"prod_count": 200, "union_count": 200}
+
+    # the missing rows arrive - the slice past the held watermark passes, and the watermark & totals move on
+    connection.execute("DELETE FROM test_prod_0.fact_table_0 WHERE load_date = DATE '2024-08-01'")
+    add_rows(connection, "test_prod_0", 5)
+    assert run_stage_1(connection, client, watermark_store(path)) == {}
+    assert watermark_store(path).entries[region_0_key]["watermark"] == "2024-08-01"
+    assert watermark_store(path).totals(region_0_key) == {"prod_count": 205, "union_count": 205}
+
+
+def test_full_refresh_recounts(connection, client):
+    watermarks = watermark_store()
+    run_stage_1(connection, client, watermarks)
+    # a row changed below the watermark is only seen by a full refresh
+    connection.execute("DELETE FROM test_prod_0.fact_table_0 WHERE id = '0'")
+    assert run_stage_1(connection, client, watermarks) == {}
+    watermarks.full_refresh = True
+    assert run_stage_1(connection, client, watermarks) == {"fact_table_0": ["1.1"]}